@@ -0,0 +1,38 @@
+-- Миграция: Полнотекстовый и триграммный поиск аниме по названию
+-- Дата: 2026-10-17
+-- Описание: Поиск в базе строил AND из ILIKE '%слово%' по title и title_original,
+-- такие условия не используют btree индекс и читают всю таблицу. Поиск теперь
+-- идет по GIN индексам: tsvector по названиям и описанию (слова и префиксы)
+-- и pg_trgm по названиям (похожие названия и опечатки)
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Поисковый вектор: названия (вес A) и описание (вес D), "ё" приравнена к "е".
+-- Выражение совпадает с ANIME_SEARCH_VECTOR_SQL в src/models/anime.py
+ALTER TABLE anime
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', translate(lower(coalesce(title, '')), 'ё', 'е')), 'A') ||
+    setweight(to_tsvector('simple', translate(lower(coalesce(title_original, '')), 'ё', 'е')), 'A') ||
+    setweight(to_tsvector('simple', translate(lower(coalesce(description, '')), 'ё', 'е')), 'D')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_anime_search_vector
+ON anime USING gin (search_vector);
+
+CREATE INDEX IF NOT EXISTS ix_anime_title_trgm
+ON anime USING gin (title gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_anime_title_original_trgm
+ON anime USING gin (title_original gin_trgm_ops);
+
+ANALYZE anime;
+
+-- Проверка успешности создания индексов
+SELECT 
+    tablename,
+    indexname,
+    indexdef
+FROM pg_indexes
+WHERE tablename = 'anime'
+  AND indexname IN ('ix_anime_search_vector', 'ix_anime_title_trgm', 'ix_anime_title_original_trgm')
+ORDER BY indexname;
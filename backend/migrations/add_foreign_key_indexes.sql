@@ -0,0 +1,62 @@
+-- Миграция: Индексы внешних ключей и составные индексы частых запросов
+-- Дата: 2026-10-17
+-- Описание: Внешние ключи comments, favorites, ratings, watch_history,
+-- anime_players и др. были без индексов: выборки по пользователю или аниме
+-- и каскадные удаления читали таблицы целиком.
+-- Индексы строятся CONCURRENTLY (без блокировки записи), поэтому каждую
+-- команду нужно выполнять отдельно и вне транзакции - это делает
+-- run_foreign_key_indexes_migration.py
+
+-- Комментарии аниме от новых к старым (если не создан миграцией keyset пагинации)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_anime_id_created_at_id
+ON comments(anime_id, created_at DESC, id DESC);
+
+-- Комментарии пользователя: последний комментарий (антиспам), удаление
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_user_id_created_at
+ON comments(user_id, created_at DESC);
+
+-- Избранное: проверка "в избранном", избранное аниме
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_favorites_user_id_anime_id
+ON favorites(user_id, anime_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_favorites_anime_id
+ON favorites(anime_id);
+
+-- Оценки: оценка пользователя для аниме, оценки аниме
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ratings_user_id_anime_id
+ON ratings(user_id, anime_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ratings_anime_id
+ON ratings(anime_id);
+
+-- История просмотров
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_watch_history_user_id_anime_id
+ON watch_history(user_id, anime_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_watch_history_anime_id
+ON watch_history(anime_id);
+
+-- Плееры аниме
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_anime_players_anime_id
+ON anime_players(anime_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_anime_players_player_id
+ON anime_players(player_id);
+
+-- Топ-3 аниме пользователей (user_id покрыт уникальными ограничениями)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_best_user_anime_anime_id
+ON best_user_anime(anime_id);
+
+-- Эпизоды и сопоставление эпизодов плееров
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_episodes_anime_id
+ON episodes(anime_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_episode_mapping_anime_id
+ON episode_mapping(anime_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_episode_mapping_player_id
+ON episode_mapping(player_id);
+
+-- Аниме темы: первичный ключ (anime_id, theme_id) не подходит для поиска по theme_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_anime_themes_theme_id_anime_id
+ON anime_themes(theme_id, anime_id);
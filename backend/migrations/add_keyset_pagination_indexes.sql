@@ -0,0 +1,40 @@
+-- Миграция: Составные индексы для курсорной (keyset) пагинации
+-- Дата: 2026-10-17
+-- Описание: Страница списка выбирается условием "после ключа последнего элемента"
+-- ((score, id), (id) или (created_at, id)) и читается как диапазон индекса,
+-- поэтому дальние страницы стоят столько же, сколько первая
+
+-- Каталог по оценке: по возрастанию (NULL в конце - порядок индекса по умолчанию)
+CREATE INDEX IF NOT EXISTS ix_anime_score_id
+ON anime(score, id);
+
+-- Каталог по оценке: по убыванию, NULL в конце
+CREATE INDEX IF NOT EXISTS ix_anime_score_desc_id
+ON anime(score DESC NULLS LAST, id);
+
+-- Аниме студии (сравнение lower(studio) = lower(:studio)): по id и по оценке
+CREATE INDEX IF NOT EXISTS ix_anime_lower_studio_id
+ON anime(lower(studio), id);
+
+CREATE INDEX IF NOT EXISTS ix_anime_lower_studio_score_id
+ON anime(lower(studio), score, id);
+
+CREATE INDEX IF NOT EXISTS ix_anime_lower_studio_score_desc_id
+ON anime(lower(studio), score DESC NULLS LAST, id);
+
+-- Аниме жанра: первичный ключ (anime_id, genre_id) не подходит для поиска по genre_id
+CREATE INDEX IF NOT EXISTS ix_anime_genres_genre_id_anime_id
+ON anime_genres(genre_id, anime_id);
+
+-- Комментарии аниме от новых к старым
+CREATE INDEX IF NOT EXISTS ix_comments_anime_id_created_at_id
+ON comments(anime_id, created_at DESC, id DESC);
+
+-- Проверка успешности создания индексов
+SELECT 
+    tablename,
+    indexname,
+    indexdef
+FROM pg_indexes
+WHERE tablename IN ('anime', 'anime_genres', 'comments')
+ORDER BY tablename, indexname;
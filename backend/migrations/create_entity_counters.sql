@@ -0,0 +1,53 @@
+-- Миграция: Счетчики каталога (entity_counters)
+-- Дата: 2026-10-17
+-- Описание: Общее число аниме считалось SELECT count(anime.id) - полным проходом
+-- по таблице, число комментариев на странице аниме - COUNT по comments.
+-- Счетчики хранятся строками (name, entity_id) и обновляются в транзакциях
+-- записи (src/services/entity_counters.py):
+--   anime_total     - число аниме (entity_id = 0)
+--   anime_comments  - комментарии по anime_id
+--   anime_favorites - избранное по anime_id
+-- Повторный запуск пересчитывает все счетчики (сверка)
+
+CREATE TABLE IF NOT EXISTS "entity_counters" (
+    name VARCHAR(64) NOT NULL,
+    entity_id BIGINT NOT NULL DEFAULT 0,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (name, entity_id)
+);
+
+-- Заполнение и сверка счетчиков по исходным таблицам
+INSERT INTO "entity_counters" (name, entity_id, value, updated_at)
+SELECT 'anime_total', 0, COUNT(*), NOW() FROM anime
+ON CONFLICT (name, entity_id) DO UPDATE SET
+    value = EXCLUDED.value,
+    updated_at = EXCLUDED.updated_at;
+
+INSERT INTO "entity_counters" (name, entity_id, value, updated_at)
+SELECT 'anime_comments', anime_id, COUNT(*), NOW()
+FROM comments GROUP BY anime_id
+ON CONFLICT (name, entity_id) DO UPDATE SET
+    value = EXCLUDED.value,
+    updated_at = EXCLUDED.updated_at;
+
+INSERT INTO "entity_counters" (name, entity_id, value, updated_at)
+SELECT 'anime_favorites', anime_id, COUNT(*), NOW()
+FROM favorites GROUP BY anime_id
+ON CONFLICT (name, entity_id) DO UPDATE SET
+    value = EXCLUDED.value,
+    updated_at = EXCLUDED.updated_at;
+
+-- Аниме без комментариев/избранного: счетчик обнуляется
+UPDATE "entity_counters" ec
+SET value = 0, updated_at = NOW()
+WHERE ec.name = 'anime_comments' AND ec.value <> 0
+  AND NOT EXISTS (SELECT 1 FROM comments c WHERE c.anime_id = ec.entity_id);
+
+UPDATE "entity_counters" ec
+SET value = 0, updated_at = NOW()
+WHERE ec.name = 'anime_favorites' AND ec.value <> 0
+  AND NOT EXISTS (SELECT 1 FROM favorites f WHERE f.anime_id = ec.entity_id);
+
+-- Статистика планировщика для оценки числа аниме (/anime/count?exact=false)
+ANALYZE anime;
@@ -0,0 +1,58 @@
+-- Миграция: Денормализованные счетчики профиля пользователя
+-- Дата: 2026-10-17
+-- Описание: Профиль загружал все избранное, оценки, комментарии и историю
+-- просмотров пользователя только ради подсчета. Счетчики хранятся в user_stats
+-- и обновляются в транзакциях записи (src/services/user_stats.py).
+-- Повторный запуск пересчитывает счетчики всех пользователей (сверка)
+
+CREATE TABLE IF NOT EXISTS "user_stats" (
+    user_id BIGINT PRIMARY KEY,
+    favorites_count INTEGER NOT NULL DEFAULT 0,
+    ratings_count INTEGER NOT NULL DEFAULT 0,
+    comments_count INTEGER NOT NULL DEFAULT 0,
+    watch_history_count INTEGER NOT NULL DEFAULT 0,
+    unique_watched_anime INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    CONSTRAINT fk_user_stats_user
+        FOREIGN KEY (user_id)
+        REFERENCES "user"(id)
+        ON DELETE CASCADE
+);
+
+-- Избранное пользователя постранично (keyset по id)
+CREATE INDEX IF NOT EXISTS ix_favorites_user_id_id
+ON favorites(user_id, id);
+
+-- Заполнение и сверка счетчиков по исходным таблицам
+INSERT INTO "user_stats" (
+    user_id, favorites_count, ratings_count, comments_count,
+    watch_history_count, unique_watched_anime, updated_at
+)
+SELECT
+    u.id,
+    COALESCE(f.cnt, 0),
+    COALESCE(r.cnt, 0),
+    COALESCE(c.cnt, 0),
+    COALESCE(w.cnt, 0),
+    COALESCE(w.unique_anime, 0),
+    NOW()
+FROM "user" u
+LEFT JOIN (SELECT user_id, COUNT(*) AS cnt FROM favorites GROUP BY user_id) f ON f.user_id = u.id
+LEFT JOIN (SELECT user_id, COUNT(*) AS cnt FROM ratings GROUP BY user_id) r ON r.user_id = u.id
+LEFT JOIN (SELECT user_id, COUNT(*) AS cnt FROM comments GROUP BY user_id) c ON c.user_id = u.id
+LEFT JOIN (
+    SELECT user_id, COUNT(*) AS cnt, COUNT(DISTINCT anime_id) AS unique_anime
+    FROM watch_history GROUP BY user_id
+) w ON w.user_id = u.id
+ON CONFLICT (user_id) DO UPDATE SET
+    favorites_count = EXCLUDED.favorites_count,
+    ratings_count = EXCLUDED.ratings_count,
+    comments_count = EXCLUDED.comments_count,
+    watch_history_count = EXCLUDED.watch_history_count,
+    unique_watched_anime = EXCLUDED.unique_watched_anime,
+    updated_at = EXCLUDED.updated_at;
+
+-- Проверка: пользователи без строки счетчиков (должно быть 0)
+SELECT COUNT(*) AS users_without_stats
+FROM "user" u
+WHERE NOT EXISTS (SELECT 1 FROM "user_stats" s WHERE s.user_id = u.id);
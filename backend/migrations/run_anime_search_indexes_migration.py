@@ -0,0 +1,72 @@
+"""
+Скрипт для применения миграции поисковых индексов аниме
+"""
+import asyncio
+import asyncpg
+import os
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+
+async def run_migration():
+    """Применяет миграцию поисковых индексов аниме"""
+    
+    # Получаем DATABASE_URL из переменных окружения
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL не установлен в .env файле")
+        return
+    
+    # Преобразуем asyncpg URL
+    if database_url.startswith('postgresql+asyncpg://'):
+        database_url = database_url.replace('postgresql+asyncpg://', 'postgresql://')
+    
+    logger.info("🔄 Начало миграции: поиск аниме (pg_trgm, search_vector)")
+    
+    try:
+        # Подключаемся к базе данных
+        conn = await asyncpg.connect(database_url)
+        
+        # Читаем SQL файл
+        migration_path = os.path.join(
+            os.path.dirname(__file__), 
+            'add_anime_search_indexes.sql'
+        )
+        
+        with open(migration_path, 'r', encoding='utf-8') as f:
+            sql = f.read()
+        
+        # Выполняем миграцию
+        logger.info("📝 Применение SQL миграции...")
+        await conn.execute(sql)
+        
+        # Проверяем созданные индексы
+        logger.info("✅ Проверка созданных индексов...")
+        indexes = await conn.fetch("""
+            SELECT 
+                tablename,
+                indexname,
+                indexdef
+            FROM pg_indexes
+            WHERE tablename = 'anime'
+              AND indexname IN ('ix_anime_search_vector', 'ix_anime_title_trgm', 'ix_anime_title_original_trgm')
+            ORDER BY indexname;
+        """)
+        
+        logger.info("📊 Созданные индексы:")
+        for idx in indexes:
+            logger.info(f"  - {idx['indexname']}: {idx['indexdef']}")
+        
+        await conn.close()
+        
+        logger.info("✅ Миграция успешно применена!")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при применении миграции: {e}")
+        raise
+
+
+if __name__ == '__main__':
+    asyncio.run(run_migration())
@@ -0,0 +1,72 @@
+"""
+Скрипт для применения миграции счетчиков каталога (entity_counters)
+
+Повторный запуск пересчитывает все счетчики по исходным таблицам.
+"""
+import asyncio
+import asyncpg
+import os
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+
+async def run_migration():
+    """Применяет миграцию entity_counters и заполняет счетчики"""
+    
+    # Получаем DATABASE_URL из переменных окружения
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL не установлен в .env файле")
+        return
+    
+    # Преобразуем asyncpg URL
+    if database_url.startswith('postgresql+asyncpg://'):
+        database_url = database_url.replace('postgresql+asyncpg://', 'postgresql://')
+    
+    logger.info("🔄 Начало миграции: счетчики каталога (entity_counters)")
+    
+    try:
+        # Подключаемся к базе данных
+        conn = await asyncpg.connect(database_url)
+        
+        # Читаем SQL файл
+        migration_path = os.path.join(
+            os.path.dirname(__file__), 
+            'create_entity_counters.sql'
+        )
+        
+        with open(migration_path, 'r', encoding='utf-8') as f:
+            sql = f.read()
+        
+        # Выполняем миграцию
+        logger.info("📝 Применение SQL миграции...")
+        await conn.execute(sql)
+        
+        # Проверяем заполнение
+        logger.info("✅ Проверка счетчиков...")
+        stats = await conn.fetchrow("""
+            SELECT 
+                COALESCE(SUM(value) FILTER (WHERE name = 'anime_total'), 0) AS anime,
+                COALESCE(SUM(value) FILTER (WHERE name = 'anime_comments'), 0) AS comments,
+                COALESCE(SUM(value) FILTER (WHERE name = 'anime_favorites'), 0) AS favorites
+            FROM "entity_counters";
+        """)
+        
+        logger.info(
+            f"📊 entity_counters: аниме {stats['anime']}, "
+            f"комментарии {stats['comments']}, избранное {stats['favorites']}"
+        )
+        
+        await conn.close()
+        
+        logger.info("✅ Миграция успешно применена!")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при применении миграции: {e}")
+        raise
+
+
+if __name__ == '__main__':
+    asyncio.run(run_migration())
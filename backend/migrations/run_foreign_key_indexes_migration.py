@@ -0,0 +1,99 @@
+"""
+Скрипт для применения миграции индексов внешних ключей
+
+CREATE INDEX CONCURRENTLY нельзя выполнять в транзакции и несколькими
+командами в одном запросе, поэтому команды из SQL файла выполняются по одной.
+Индекс, оставшийся невалидным после прерванной сборки, удаляется и строится заново.
+"""
+import asyncio
+import asyncpg
+import os
+import re
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+_INDEX_NAME_RE = re.compile(r"IF NOT EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+def _read_statements(migration_path: str) -> list[str]:
+    """Команды SQL файла без комментариев"""
+    with open(migration_path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if not line.lstrip().startswith('--')]
+    return [statement.strip() for statement in ''.join(lines).split(';') if statement.strip()]
+
+
+async def run_migration():
+    """Применяет миграцию индексов внешних ключей"""
+    
+    # Получаем DATABASE_URL из переменных окружения
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL не установлен в .env файле")
+        return
+    
+    # Преобразуем asyncpg URL
+    if database_url.startswith('postgresql+asyncpg://'):
+        database_url = database_url.replace('postgresql+asyncpg://', 'postgresql://')
+    
+    logger.info("🔄 Начало миграции: индексы внешних ключей (CONCURRENTLY)")
+    
+    try:
+        # Подключаемся к базе данных
+        conn = await asyncpg.connect(database_url)
+        
+        migration_path = os.path.join(
+            os.path.dirname(__file__), 
+            'add_foreign_key_indexes.sql'
+        )
+        statements = _read_statements(migration_path)
+        index_names = [_INDEX_NAME_RE.search(statement).group(1) for statement in statements]
+        
+        # Невалидные индексы (прерванная сборка CONCURRENTLY) пропускаются IF NOT EXISTS
+        invalid = await conn.fetch("""
+            SELECT c.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY($1::text[]);
+        """, index_names)
+        for row in invalid:
+            logger.warning(f"⚠️ Индекс {row['relname']} невалиден, пересоздаем")
+            await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {row['relname']}")
+        
+        # Выполняем команды по одной (каждая - отдельная транзакция)
+        logger.info("📝 Применение SQL миграции...")
+        for index_name, statement in zip(index_names, statements):
+            logger.info(f"  - {index_name}")
+            await conn.execute(statement)
+        
+        # Проверяем созданные индексы
+        logger.info("✅ Проверка созданных индексов...")
+        indexes = await conn.fetch("""
+            SELECT 
+                t.relname AS tablename,
+                c.relname AS indexname,
+                i.indisvalid AS is_valid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_class t ON t.oid = i.indrelid
+            WHERE c.relname = ANY($1::text[])
+            ORDER BY t.relname, c.relname;
+        """, index_names)
+        
+        logger.info("📊 Созданные индексы:")
+        for idx in indexes:
+            status = "✅" if idx['is_valid'] else "❌ невалиден"
+            logger.info(f"  - {idx['tablename']}.{idx['indexname']} {status}")
+        
+        await conn.close()
+        
+        logger.info("✅ Миграция успешно применена!")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при применении миграции: {e}")
+        raise
+
+
+if __name__ == '__main__':
+    asyncio.run(run_migration())
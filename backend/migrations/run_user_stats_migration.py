@@ -0,0 +1,74 @@
+"""
+Скрипт для применения миграции счетчиков профиля (user_stats)
+
+Повторный запуск пересчитывает счетчики всех пользователей по исходным таблицам.
+"""
+import asyncio
+import asyncpg
+import os
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+
+async def run_migration():
+    """Применяет миграцию user_stats и заполняет счетчики"""
+    
+    # Получаем DATABASE_URL из переменных окружения
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL не установлен в .env файле")
+        return
+    
+    # Преобразуем asyncpg URL
+    if database_url.startswith('postgresql+asyncpg://'):
+        database_url = database_url.replace('postgresql+asyncpg://', 'postgresql://')
+    
+    logger.info("🔄 Начало миграции: счетчики профиля пользователя (user_stats)")
+    
+    try:
+        # Подключаемся к базе данных
+        conn = await asyncpg.connect(database_url)
+        
+        # Читаем SQL файл
+        migration_path = os.path.join(
+            os.path.dirname(__file__), 
+            'create_user_stats.sql'
+        )
+        
+        with open(migration_path, 'r', encoding='utf-8') as f:
+            sql = f.read()
+        
+        # Выполняем миграцию
+        logger.info("📝 Применение SQL миграции...")
+        await conn.execute(sql)
+        
+        # Проверяем заполнение
+        logger.info("✅ Проверка счетчиков...")
+        stats = await conn.fetchrow("""
+            SELECT 
+                COUNT(*) AS users,
+                COALESCE(SUM(favorites_count), 0) AS favorites,
+                COALESCE(SUM(ratings_count), 0) AS ratings,
+                COALESCE(SUM(comments_count), 0) AS comments,
+                COALESCE(SUM(watch_history_count), 0) AS watch_history
+            FROM "user_stats";
+        """)
+        
+        logger.info(
+            f"📊 user_stats: {stats['users']} пользователей, избранное {stats['favorites']}, "
+            f"оценки {stats['ratings']}, комментарии {stats['comments']}, история {stats['watch_history']}"
+        )
+        
+        await conn.close()
+        
+        logger.info("✅ Миграция успешно применена!")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при применении миграции: {e}")
+        raise
+
+
+if __name__ == '__main__':
+    asyncio.run(run_migration())
@@ -0,0 +1,151 @@
+"""
+Проверка планов основных запросов сервиса: ни один не должен читать большую таблицу целиком
+
+Запросы строятся теми же функциями сервисов (src/services/animes.py,
+src/services/users.py, src/services/anime_search.py), что и в приложении, и
+выполняются с теми же параметрами, что отправляет приложение. Для каждого
+выполняется EXPLAIN (FORMAT JSON) с обычными настройками планировщика: проверяется план,
+который база выберет, а не только наличие подходящего индекса.
+
+Планировщик выбирает Seq Scan для маленьких таблиц, даже если индекс есть,
+поэтому проверку нужно запускать на базе с объемом данных как в продакшене
+(копия продакшена или стенд) после применения миграций и ANALYZE. Для
+таблиц меньше QUERY_PLAN_MIN_ROWS строк скрипт предупреждает, что план может
+отличаться от продакшена.
+
+Запуск (из папки backend):
+    python scripts/check_query_plans.py
+
+Код возврата 1, если хотя бы один запрос читает большую таблицу целиком -
+скрипт можно использовать как проверку в CI.
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.db.database import new_session
+from src.services import animes, users
+from src.services.anime_search import _search_query, ANIME_SEARCH_COLUMNS, ANIME_SEARCH_LIMIT
+from src.services.entity_counters import estimate_table_rows
+
+# Таблицы, которые растут вместе с каталогом и аудиторией: Seq Scan по ним - ошибка
+LARGE_TABLES = ('anime', 'anime_genres', 'anime_players', 'comments', 'favorites', 'ratings', 'user')
+
+# Таблица меньше этого числа строк не показательна: план может отличаться от продакшена
+QUERY_PLAN_MIN_ROWS = int(os.getenv("QUERY_PLAN_MIN_ROWS", "10000"))
+
+PAGE_SIZE = 12
+
+
+def _queries() -> list[tuple[str, object]]:
+    """(название, select) - запросы, построенные функциями сервисов"""
+    list_query = animes._anime_list_query()
+    return [
+        ("каталог (keyset по id)",
+         animes._id_after_query(list_query, 1000).limit(PAGE_SIZE)),
+        ("каталог по оценке, по убыванию (keyset)",
+         animes._scored_after_query(list_query, 'desc', 8.0, 1000).limit(PAGE_SIZE)),
+        ("каталог по оценке, по возрастанию (keyset)",
+         animes._scored_after_query(list_query, 'asc', 8.0, 1000).limit(PAGE_SIZE)),
+        ("аниме без оценки (конец каталога)",
+         animes._unscored_after_query(list_query, None, 1000).limit(PAGE_SIZE)),
+        ("популярное (keyset)",
+         animes._popular_after_query(8.0, 1000).limit(PAGE_SIZE)),
+        ("аниме студии по оценке",
+         animes._order_by_score(animes._studio_query('MAPPA'), 'desc').limit(PAGE_SIZE)),
+        ("аниме студии (keyset)",
+         animes._scored_after_query(animes._studio_query('MAPPA'), 'desc', 8.0, 1000).limit(PAGE_SIZE)),
+        ("аниме жанра",
+         animes._order_by_score(animes._genre_query('Экшен'), 'none').limit(PAGE_SIZE)),
+        ("поиск по названию",
+         _search_query('наруто', *ANIME_SEARCH_COLUMNS).limit(ANIME_SEARCH_LIMIT)),
+        ("плееры аниме",
+         animes._anime_players_query(1)),
+        ("комментарии аниме (страница аниме)",
+         animes._anime_detail_comments_query(1)),
+        ("комментарии аниме (keyset)",
+         animes._comments_after_query(1, datetime.now(timezone.utc), 1000).limit(20)),
+        ("последний комментарий пользователя (антиспам)",
+         users._last_comment_query(1)),
+        ("аниме в избранном у пользователя",
+         users._favorite_query(1, 1)),
+        ("избранное пользователя постранично",
+         users._favorites_page_query(1, users.PROFILE_FAVORITES_LIMIT, 1000)),
+        ("оценка пользователя для аниме",
+         users._user_rating_query(1, 1)),
+        ("пользователь по имени",
+         users._user_by_username_query('test')),
+    ]
+
+
+def _compile(query, dialect) -> tuple[str, tuple]:
+    """
+    SQL и параметры запроса в том виде, в каком их отправляет приложение
+
+    Параметры передаются отдельно, а не подставляются в текст (literal_binds):
+    для части типов (например, REGCONFIG в to_tsquery) SQLAlchemy не умеет
+    рисовать литералы. База строит план с переданными значениями.
+    """
+    compiled = query.compile(dialect=dialect)
+    values = compiled.construct_params()
+    return str(compiled), tuple(values[name] for name in compiled.positiontup or ())
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    """Большие таблицы, которые план читает целиком (узлы Seq Scan)"""
+    tables = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        tables.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        tables.extend(_seq_scans(child))
+    return tables
+
+
+async def check_query_plans() -> list[tuple[str, list[str]]]:
+    """
+    Проверить планы всех запросов из _queries()
+
+    Returns:
+        list: [(название запроса, большие таблицы с Seq Scan)]
+    """
+    failures = []
+    async with new_session() as session:
+        for table in LARGE_TABLES:
+            rows = await estimate_table_rows(table, session)
+            if rows is None or rows < QUERY_PLAN_MIN_ROWS:
+                logger.warning(f"⚠️ В таблице {table} ~{rows or 0} строк: план может отличаться от продакшена")
+
+        connection = await session.connection()
+        dialect = connection.dialect
+        for name, query in _queries():
+            sql, params = _compile(query, dialect)
+            result = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", params)).scalar()
+            plan = (json.loads(result) if isinstance(result, str) else result)[0]["Plan"]
+            tables = _seq_scans(plan)
+            if tables:
+                logger.error(f"❌ {name}: Seq Scan по {', '.join(tables)}")
+                failures.append((name, tables))
+            else:
+                logger.info(f"✅ {name}")
+        await session.rollback()
+    return failures
+
+
+async def main():
+    failures = await check_query_plans()
+    total = len(_queries())
+    if failures:
+        logger.error(f"❌ Запросов с полным чтением большой таблицы: {len(failures)} из {total}")
+        sys.exit(1)
+    logger.info(f"✅ Все {total} запросов читают большие таблицы по индексам")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,6 @@
+import secrets
 from fastapi import APIRouter, Request, HTTPException, status, Depends, Query, Response
+from fastapi.responses import PlainTextResponse
 from typing import Annotated
 from src.models.users import UserModel
 from src.dependencies.all_dep import SessionDep, UserExistsDep
@@ -16,6 +18,10 @@ from src.services.admin import (admin_block_user, admin_unblock_user,
 from src.schemas.user import (CreateNewUser, CreateUserComment, 
                               CreateUserRating, LoginUser, 
                               CreateUserFavorite, UserName, ChangeUserPassword, CreateBestUserAnime)
+from src.services.redis_cache import get_cache_info
+from src.services.cache_metrics import render_prometheus_metrics
+from src.db.pool import render_pool_metrics
+from src.services.cache_warmup import warm_up_cache
 from src.auth.auth import get_token, delete_token
 from os import getenv
 
@@ -44,6 +50,21 @@ async def is_owner(request: Request):
 
 IsOwnerDep = Annotated[bool, Depends(is_owner)]
 
+async def can_scrape_metrics(request: Request):
+    '''Доступ к метрикам: Bearer METRICS_TOKEN (для Prometheus) или админская сессия'''
+    metrics_token = getenv('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if metrics_token and authorization.startswith('Bearer '):
+        if secrets.compare_digest(authorization[len('Bearer '):], metrics_token):
+            return True
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Неверный токен метрик')
+    return await is_admin(request)
+
+
+CanScrapeMetricsDep = Annotated[bool, Depends(can_scrape_metrics)]
+
 @admin_router.get('/all-users')
 async def get_all_users(is_admin: IsAdminDep, session: SessionDep, limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0)):
     '''Получить всех пользователей'''
@@ -159,6 +180,45 @@ async def clear_cache(is_admin: IsAdminDep):
     }
 
 
+@admin_router.get('/cache-stats')
+async def cache_stats(is_admin: IsAdminDep):
+    '''Получить статистику Redis кэша
+
+    Помимо общих данных Redis возвращает по префиксам ключей (в рамках
+    текущего воркера) счетчики hit/stale/miss, гистограммы времени пересчета
+    и размера значений, количество инвалидированных ключей - для подбора TTL.
+
+    Returns:
+        Информация о кэше и метрики по префиксам
+    '''
+    return await get_cache_info()
+
+
+@admin_router.get('/metrics', response_class=PlainTextResponse)
+async def cache_metrics(can_scrape: CanScrapeMetricsDep):
+    '''Метрики кэша по префиксам и пулов соединений с базой в текстовом формате Prometheus
+
+    Доступно админам или по заголовку Authorization: Bearer <METRICS_TOKEN>.
+    Метрики считаются в рамках воркера, обработавшего запрос.
+    '''
+    return PlainTextResponse(render_prometheus_metrics() + render_pool_metrics(),
+                             media_type='text/plain; version=0.0.4')
+
+
+@admin_router.post('/warm-up-cache')
+async def warm_up_cache_endpoint(is_admin: IsAdminDep):
+    '''Прогреть кэш главных лент
+
+    Заранее считает первые страницы популярного, сортировки по оценке,
+    количество аниме, топ жанров и студий и топ коллекционеров.
+    Полезно после очистки кэша или перезапуска Redis.
+
+    Returns:
+        Состояние прогрева (время, количество успешных и неудачных задач)
+    '''
+    return await warm_up_cache()
+
+
 @admin_router.get('/clear-frontend-data-commands')
 async def get_clear_frontend_data_commands(is_admin: IsAdminDep):
     '''Получить команды для очистки localStorage и куков в консоли браузера
@@ -1,19 +1,25 @@
 from loguru import logger
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 # 
-from src.dependencies.all_dep import (SessionDep, PaginatorAnimeDep, 
+from src.dependencies.all_dep import (SessionDep, ReadSessionDep, PaginatorAnimeDep, 
                                       CookieDataDep, OptionalCookieDataDep)
 from src.schemas.anime import PaginatorData
 from src.parsers.kodik import (get_id_and_players, get_anime_by_title)
 from src.parsers.shikimori import (shikimori_get_anime)
-from src.services.animes import (get_anime_in_db_by_id, pagination_get_anime, 
+from src.services.anime_search import search_anime_cards, ANIME_SEARCH_LIMIT, ANIME_SEARCH_MAX_LIMIT
+from src.services.animes import (get_anime_detail, pagination_get_anime, 
                                  get_popular_anime, get_random_anime, get_anime_total_count, 
                                  update_anime_data_from_shikimori, comments_paginator,
                                  sort_anime_by_rating, get_anime_sorted_by_score,
-                                 get_anime_sorted_by_studio, get_anime_sorted_by_genre)
+                                 get_anime_sorted_by_studio, get_anime_sorted_by_genre,
+                                 pagination_get_anime_after, get_popular_anime_after,
+                                 get_anime_sorted_by_score_after, get_anime_sorted_by_studio_after,
+                                 get_anime_sorted_by_genre_after, comments_paginator_after,
+                                 anime_cursor, comment_cursor, catalog_cursor_kind,
+                                 CATALOG_CURSOR, POPULAR_CURSOR)
 from src.schemas.anime import (PaginatorData, AnimeResponse, 
                                AnimeDetailResponse, GetAnimeByRating)
 from src.auth.auth import get_token
@@ -21,6 +27,21 @@ from src.auth.auth import get_token
 anime_router = APIRouter(prefix='/anime', tags=['AnimePanel'])
 
 
+def next_anime_cursor(animes: list, limit: int, kind: str) -> str | None:
+    """
+    Курсор следующей страницы списка аниме
+    
+    Списки принимают либо offset, либо cursor из предыдущего ответа (next_cursor).
+    С курсором страница выбирается по индексу и не дороже первой.
+    
+    Returns:
+        str | None: Курсор или None, если страница последняя
+    """
+    if not animes or len(animes) < limit:
+        return None
+    return anime_cursor(kind, animes[-1])
+
+
 def convert_anime_to_dict(anime):
     """
     Конвертировать аниме (объект SQLAlchemy или словарь) в словарь для API ответа
@@ -34,13 +55,6 @@ def convert_anime_to_dict(anime):
     if isinstance(anime, dict):
         # Если это уже словарь (из кэша), возвращаем его
         return anime
-    elif isinstance(anime, str):
-        # Если это строка (неправильная сериализация из старого кэша)
-        # Проверяем, не является ли это строковым представлением объекта
-        if 'object at 0x' in anime or 'AnimeModel' in anime:
-            return None
-        # Если это обычная строка (не объект), тоже пропускаем
-        return None
     elif hasattr(anime, '__table__'):
         # Если это объект SQLAlchemy, конвертируем в словарь
         return {
@@ -62,6 +76,18 @@ def convert_anime_to_dict(anime):
         return None
 
 
+@anime_router.get('/search')
+async def search_anime_in_db(q: str, session: ReadSessionDep,
+                             limit: int = ANIME_SEARCH_LIMIT, offset: int = 0):
+    '''Поиск аниме только в базе: страница карточек по релевантности
+    (без парсинга сайтов, next_offset - None на последней странице)'''
+
+    limit = max(1, min(limit, ANIME_SEARCH_MAX_LIMIT))
+    cards = await search_anime_cards(q, session, limit, offset)
+    next_offset = offset + len(cards) if cards and len(cards) == limit else None
+    return {'message': cards, 'next_offset': next_offset}
+
+
 @anime_router.get('/search/{anime_name}')
 async def get_anime_by_name(anime_name: str, session: SessionDep, background_tasks: BackgroundTasks):
     '''Поиск аниме по названию
@@ -76,10 +102,13 @@ async def get_anime_by_name(anime_name: str, session: SessionDep, background_tas
 
 @anime_router.get('/get/paginators', response_model=dict)
 async def get_anime_paginators(pagin_data: PaginatorAnimeDep, 
-                               session: SessionDep):
-    '''Показать аниме с пагинацией в бд'''
+                               session: ReadSessionDep, cursor: str | None = None):
+    '''Показать аниме с пагинацией в бд (offset или cursor из next_cursor)'''
 
-    resp = await pagination_get_anime(pagin_data, session)
+    if cursor:
+        resp = await pagination_get_anime_after(cursor, pagin_data.limit, session)
+    else:
+        resp = await pagination_get_anime(pagin_data, session)
     # Конвертируем SQLAlchemy модели в Pydantic схемы
     # Используем ручную конвертацию, чтобы избежать проблем с relationships
     anime_list = []
@@ -99,149 +128,41 @@ async def get_anime_paginators(pagin_data: PaginatorAnimeDep,
                 anime_id = anime.id
             logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}')
             continue
-    return {'message': anime_list}
+    return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, pagin_data.limit, CATALOG_CURSOR)}
 
 
 @anime_router.get('/{anime_id:int}', response_model=dict)
-async def watch_anime_by_id(anime_id: int, session: SessionDep, background_tasks: BackgroundTasks, 
+async def watch_anime_by_id(anime_id: int, session: SessionDep,
                             token_data: OptionalCookieDataDep = None):
     '''Поиск аниме в базе по id с полными данными
     Аутентификация опциональна (JWT токен в cookies)'''
 
     try:
-        anime = await get_anime_in_db_by_id(anime_id, session, background_tasks)
-        # Коммитим изменения после загрузки объекта, но до сериализации
-        await session.commit()
+        anime_dict = await get_anime_detail(anime_id, session)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f'Ошибка при получении аниме {anime_id}: {e}', exc_info=True)
         raise HTTPException(status_code=500, detail=f'Ошибка при получении аниме: {str(e)}')
     
-    # Конвертируем в Pydantic схему
-    try:
-        # Конвертируем genres
-        genres = []
-        try:
-            if anime.genres:
-                for genre in anime.genres:
-                    genres.append({
-                        'id': genre.id,
-                        'name': genre.name
-                    })
-        except Exception as e:
-            logger.error(f'Ошибка при конвертации жанров: {e}', exc_info=True)
-        
-        # Конвертируем players
-        players = []
-        try:
-            if anime.players:
-                for player in anime.players:
-                    players.append({
-                        'id': player.id,
-                        'embed_url': player.embed_url,
-                        'translator': player.translator,
-                        'quality': player.quality
-                    })
-        except Exception as e:
-            logger.error(f'Ошибка при конвертации плееров: {e}', exc_info=True)
-        
-        # Конвертируем comments
-        comments = []
-        try:
-            if anime.comments:
-                for comment in anime.comments:
-                    try:
-                        # Проверяем, что user загружен
-                        user_data = None
-                        if hasattr(comment, 'user') and comment.user:
-                            from datetime import datetime, timezone
-                            # Вычисляем is_premium из premium_expires_at и type_account
-                            is_premium = False
-                            if comment.user.type_account in ['admin', 'owner']:
-                                is_premium = True
-                            elif comment.user.premium_expires_at:
-                                now = datetime.now(timezone.utc)
-                                if comment.user.premium_expires_at > now:
-                                    is_premium = True
-                            
-                            user_data = {
-                                'id': comment.user.id,
-                                'username': comment.user.username,
-                                'avatar_url': getattr(comment.user, 'avatar_url', None),
-                                'type_account': comment.user.type_account,
-                                'premium_status': {
-                                    'is_premium': is_premium,
-                                    'expires_at': comment.user.premium_expires_at.isoformat() if comment.user.premium_expires_at else None
-                                },
-                                'profile_settings': {
-                                    'is_premium_profile': comment.user.profile_settings.is_premium_profile if comment.user.profile_settings else False
-                                }
-                            }
-                        else:
-                            # Если user не загружен, пропускаем комментарий
-                            logger.warning(f'User not loaded for comment {getattr(comment, "id", "unknown")}')
-                            continue
-                        
-                        # Конвертируем datetime в строку
-                        created_at_str = None
-                        if hasattr(comment, 'created_at') and comment.created_at:
-                            if isinstance(comment.created_at, str):
-                                created_at_str = comment.created_at
-                            else:
-                                created_at_str = comment.created_at.isoformat()
-                        
-                        comments.append({
-                            'id': comment.id,
-                            'text': comment.text,
-                            'created_at': created_at_str,
-                            'user': user_data
-                        })
-                    except Exception as e:
-                        logger.error(f'Ошибка при конвертации комментария {getattr(comment, "id", "unknown")}: {e}', exc_info=True)
-                        continue
-        except Exception as e:
-            logger.error(f'Ошибка при конвертации комментариев: {e}', exc_info=True)
-        
-        # Создаем полный объект
-        try:
-            anime_dict = {
-                'id': anime.id,
-                'title': anime.title,
-                'title_original': anime.title_original,
-                'poster_url': anime.poster_url,
-                'description': anime.description,
-                'year': anime.year,
-                'type': anime.type,
-                'episodes_count': anime.episodes_count,
-                'rating': anime.rating,
-                'score': anime.score,
-                'studio': anime.studio,
-                'status': anime.status,
-                'genres': genres,
-                'players': players,
-                'comments': comments
-            }
-            return {'message': anime_dict}
-        except Exception as e:
-            logger.error(f'Ошибка при создании словаря аниме: {e}', exc_info=True)
-            raise
-    except Exception as e:
-        logger.error(f'Ошибка при конвертации аниме {anime_id}: {e}', exc_info=True)
-        raise HTTPException(status_code=500, detail=f'Ошибка при получении данных аниме: {str(e)}')
+    return {'message': anime_dict}
 
 
 @anime_router.get('/popular', response_model=dict)
 async def get_popular_anime_data(
     limit: int = 6,
     offset: int = 0,
-    session: SessionDep = None
+    session: ReadSessionDep = None,
+    cursor: str | None = None
 ):
     '''Получить популярные аниме с пагинацией'''
     
     try:
-        paginator_data = PaginatorData(limit=limit, offset=offset)
-        resp = await get_popular_anime(paginator_data, session)
+        if cursor:
+            resp = await get_popular_anime_after(cursor, limit, session)
+        else:
+            paginator_data = PaginatorData(limit=limit, offset=offset)
+            resp = await get_popular_anime(paginator_data, session)
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         # Используем from_attributes=True для правильной работы с SQLAlchemy
         anime_list = []
@@ -266,7 +187,9 @@ async def get_popular_anime_data(
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}', exc_info=True)
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, POPULAR_CURSOR)}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении популярных аниме: {e}', exc_info=True)
         return {'message': []}
@@ -275,12 +198,14 @@ async def get_popular_anime_data(
 @anime_router.get('/random', response_model=dict)
 async def get_random_anime_data(
     limit: int = 3,
-    session: SessionDep = None
+    session: ReadSessionDep = None,
+    anime_type: str | None = Query(None, alias='type'),
+    year: int | None = None
 ):
-    '''Получить случайные аниме'''
+    '''Получить случайные аниме (фильтры type и year опциональны)'''
     
     try:
-        resp = await get_random_anime(limit, session)
+        resp = await get_random_anime(limit, session, anime_type=anime_type, year=year)
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
         for anime in resp:
@@ -306,10 +231,10 @@ async def get_random_anime_data(
 
 
 @anime_router.get('/count', response_model=dict)
-async def get_anime_count(session: SessionDep):
-    '''Получить общее количество аниме в базе'''
+async def get_anime_count(session: ReadSessionDep, exact: bool = True):
+    '''Получить общее количество аниме в базе (exact=false - быстрая оценка планировщика)'''
     try:
-        count = await get_anime_total_count(session)
+        count = await get_anime_total_count(session, exact=exact)
         return {'message': count}
     except Exception as e:
         logger.error(f'Ошибка при получении количества аниме: {e}', exc_info=True)
@@ -318,12 +243,15 @@ async def get_anime_count(session: SessionDep):
 
 @anime_router.get('/all/popular', response_model=dict)
 async def get_all_popular_anime(limit: int = 12, offset: int = 0, 
-                                session: SessionDep = None):
+                                session: ReadSessionDep = None, cursor: str | None = None):
     '''Получить по 12 популярных аниме'''
     
     try:
-        paginator_data = PaginatorData(limit=limit, offset=offset)
-        resp = await get_popular_anime(paginator_data, session)
+        if cursor:
+            resp = await get_popular_anime_after(cursor, limit, session)
+        else:
+            paginator_data = PaginatorData(limit=limit, offset=offset)
+            resp = await get_popular_anime(paginator_data, session)
         
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
@@ -343,7 +271,9 @@ async def get_all_popular_anime(limit: int = 12, offset: int = 0,
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}')
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, POPULAR_CURSOR)}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении всех популярных аниме: {e}', exc_info=True)
         return {'message': []}
@@ -351,12 +281,15 @@ async def get_all_popular_anime(limit: int = 12, offset: int = 0,
 
 @anime_router.get('/all/anime', response_model=dict)
 async def get_all_anime(limit: int = 12, offset: int = 0, 
-                        session: SessionDep = None):
+                        session: ReadSessionDep = None, cursor: str | None = None):
     '''Получить все аниме с пагинацией'''
     
     try:
-        paginator_data = PaginatorData(limit=limit, offset=offset)
-        resp = await pagination_get_anime(paginator_data, session)
+        if cursor:
+            resp = await pagination_get_anime_after(cursor, limit, session)
+        else:
+            paginator_data = PaginatorData(limit=limit, offset=offset)
+            resp = await pagination_get_anime(paginator_data, session)
         
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
@@ -376,7 +309,9 @@ async def get_all_anime(limit: int = 12, offset: int = 0,
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}')
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, CATALOG_CURSOR)}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении всех аниме: {e}', exc_info=True)
         return {'message': []}
@@ -384,7 +319,7 @@ async def get_all_anime(limit: int = 12, offset: int = 0,
 
 @anime_router.get('/all/anime', response_model=dict)
 async def get_all_animes(limit: int = 12, offset: int = 0, 
-                                session: SessionDep = None):
+                                session: ReadSessionDep = None):
     '''Показать все аниме с пагинацией в бд
     (по 12 популярных аниме)'''
     try:
@@ -419,11 +354,15 @@ async def get_all_animes(limit: int = 12, offset: int = 0,
 
 @anime_router.get('/comment/paginator')
 async def get_comments_paginator(anime_id: int, limit: int = 4, 
-                                offset: int = 0, session: SessionDep = None):
-    '''Получить комментарии к аниме с пагинацией'''
+                                offset: int = 0, session: SessionDep = None,
+                                cursor: str | None = None):
+    '''Получить комментарии к аниме с пагинацией (offset или cursor из next_cursor)'''
     
     try:
-        comments = await comments_paginator(limit, offset, anime_id, session)
+        if cursor:
+            comments = await comments_paginator_after(cursor, limit, anime_id, session)
+        else:
+            comments = await comments_paginator(limit, offset, anime_id, session)
         
         # Конвертируем SQLAlchemy модели в словари
         comments_list = []
@@ -477,7 +416,10 @@ async def get_comments_paginator(anime_id: int, limit: int = 4,
                 logger.error(f'Ошибка при конвертации комментария {getattr(comment, "id", "unknown")}: {err}', exc_info=True)
                 continue
         
-        return {'message': comments_list}
+        next_cursor = comment_cursor(comments[-1]) if comments and len(comments) == limit else None
+        return {'message': comments_list, 'next_cursor': next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении комментариев: {e}', exc_info=True)
         return {'message': []}
@@ -486,14 +428,18 @@ async def get_comments_paginator(anime_id: int, limit: int = 4,
 
 @anime_router.get('/all/anime/score')
 async def get_anime_by_rating(limit: int = 12, offset: int = 0, 
-                              order: str = 'asc', session: SessionDep = None):
+                              order: str = 'asc', session: ReadSessionDep = None,
+                              cursor: str | None = None):
     '''Получить все аниме отсортированные по оценке
     order: 'asc' - по возрастанию (от низкой к высокой)
            'desc' - по убыванию (от высокой к низкой)
     '''
     
     try:
-        resp = await get_anime_sorted_by_score(limit, offset, order, session)
+        if cursor:
+            resp = await get_anime_sorted_by_score_after(cursor, limit, order, session)
+        else:
+            resp = await get_anime_sorted_by_score(limit, offset, order, session)
         
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
@@ -510,7 +456,9 @@ async def get_anime_by_rating(limit: int = 12, offset: int = 0,
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}')
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, catalog_cursor_kind('score', order))}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении аниме по оценке: {e}', exc_info=True)
         return {'message': []}
@@ -518,7 +466,8 @@ async def get_anime_by_rating(limit: int = 12, offset: int = 0,
 
 @anime_router.get('/all/anime/studio')
 async def get_anime_by_studio(studio_name: str, limit: int = 12, 
-                              offset: int = 0, order: str = 'none', session: SessionDep = None):
+                              offset: int = 0, order: str = 'none', session: ReadSessionDep = None,
+                              cursor: str | None = None):
     '''Получить все аниме от конкретной студии с пагинацией
     order: 'none' - без сортировки
            'asc' - по оценке по возрастанию
@@ -526,7 +475,10 @@ async def get_anime_by_studio(studio_name: str, limit: int = 12,
     '''
     
     try:
-        resp = await get_anime_sorted_by_studio(studio_name, limit, offset, order, session)
+        if cursor:
+            resp = await get_anime_sorted_by_studio_after(studio_name, cursor, limit, order, session)
+        else:
+            resp = await get_anime_sorted_by_studio(studio_name, limit, offset, order, session)
         
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
@@ -546,14 +498,17 @@ async def get_anime_by_studio(studio_name: str, limit: int = 12,
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}')
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, catalog_cursor_kind('studio', order))}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении аниме по студии: {e}', exc_info=True)
         return {'message': []}
 
 @anime_router.get('/all/anime/genre')
 async def get_anime_by_genre(genre: str, limit: int = 12, 
-                              offset: int = 0, order: str = 'none', session: SessionDep = None):
+                              offset: int = 0, order: str = 'none', session: ReadSessionDep = None,
+                              cursor: str | None = None):
     '''Получить все аниме по конкретному жанру с пагинацией
     order: 'none' - без сортировки
            'asc' - по оценке по возрастанию
@@ -561,7 +516,10 @@ async def get_anime_by_genre(genre: str, limit: int = 12,
     '''
     
     try:
-        resp = await get_anime_sorted_by_genre(genre, limit, offset, order, session)
+        if cursor:
+            resp = await get_anime_sorted_by_genre_after(genre, cursor, limit, order, session)
+        else:
+            resp = await get_anime_sorted_by_genre(genre, limit, offset, order, session)
         
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
@@ -581,18 +539,24 @@ async def get_anime_by_genre(genre: str, limit: int = 12,
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}')
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, catalog_cursor_kind('genre', order))}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении аниме по жанру: {e}', exc_info=True)
         return {'message': []}
     
 @anime_router.get('/get/highest-score')
 async def get_best_anime_by_score(limit: int = 12, offset: int = 0,  
-                                  order: str = 'desc', session: SessionDep = None):
+                                  order: str = 'desc', session: ReadSessionDep = None,
+                                  cursor: str | None = None):
     '''Получить аниме с высшей оценкой (отсортированные по оценке по убыванию)'''
     
     try:
-        resp = await get_anime_sorted_by_score(limit, offset, order, session)
+        if cursor:
+            resp = await get_anime_sorted_by_score_after(cursor, limit, order, session)
+        else:
+            resp = await get_anime_sorted_by_score(limit, offset, order, session)
         
         # Конвертируем SQLAlchemy модели в Pydantic схемы
         anime_list = []
@@ -612,7 +576,9 @@ async def get_best_anime_by_score(limit: int = 12, offset: int = 0,
                     anime_id = anime.id
                 logger.error(f'Ошибка при конвертации одного аниме: {err}, anime_id={anime_id}, type={type(anime)}')
                 continue
-        return {'message': anime_list}
+        return {'message': anime_list, 'next_cursor': next_anime_cursor(resp, limit, catalog_cursor_kind('score', order))}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f'Ошибка при получении аниме с высшей оценкой: {e}', exc_info=True)
         return {'message': []}
\ No newline at end of file
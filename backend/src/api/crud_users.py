@@ -1,3 +1,4 @@
+import time
 from fastapi import (APIRouter, Response, Request, 
                      HTTPException, UploadFile)
 from sqlalchemy import select
@@ -5,20 +6,22 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 # 
 from src.models.users import UserModel
-from src.dependencies.all_dep import (SessionDep, UserExistsDep, 
+from src.dependencies.all_dep import (SessionDep, ReadSessionDep, UserExistsDep, FullUserDep,
                                       PaginatorAnimeDep as UserPaginatorDep)
 from src.services.users import (add_user, create_user_comment, 
                                 create_rating, get_user_by_id, login_user,
                                 toggle_favorite, check_favorite, check_rating, get_user_favorites,
+                                get_user_favorites_page, PROFILE_FAVORITES_LIMIT,
                                 get_user_by_username, verify_email, change_username, change_password,
                                 set_best_anime, get_user_best_anime, remove_best_anime,
-                                add_new_user_photo, get_user_most_favorited,
+                                add_new_user_photo, get_user_most_favorited_cached,
                                 get_user_profile_settings, get_or_create_user_profile_settings,
                                 update_user_profile_settings, get_user_by_token,
                                 activate_premium, check_premium_status, update_premium_status_if_expired)
 from src.services.redis_cache import (get_redis_client, get_user_profile_cache_key, 
-                                      clear_user_profile_cache)
-import json
+                                      clear_user_profile_cache, cache_get, cache_set, get_user_cache_tag)
+from src.services.cache_metrics import observe_recompute, key_prefix
+from src.services.user_stats import get_user_stats
 from src.schemas.user import (CreateNewUser, CreateUserComment, 
                               CreateUserRating, LoginUser, 
                               CreateUserFavorite, UserName, ChangeUserPassword, 
@@ -101,7 +104,7 @@ async def create_user_rating(user: UserExistsDep, rating_data: CreateUserRating,
 
 
 @user_router.get('/me')
-async def get_current_user_info(user: UserExistsDep, session: SessionDep):
+async def get_current_user_info(user: FullUserDep, session: SessionDep):
     '''Получить информацию о текущем пользователе'''
     
     logger.info(f'Запрос информации о текущем пользователе: ID={user.id}, username={user.username}')
@@ -204,47 +207,22 @@ async def user_profile(username: str, session: SessionDep):
     cache_key = get_user_profile_cache_key(username)
     
     if redis:
-        try:
-            cached_data = await redis.get(cache_key)
-            if cached_data is not None:
-                logger.debug(f"🎯 Cache HIT: user profile for {username}")
-                return json.loads(cached_data)
-        except Exception as e:
-            logger.warning(f"Redis cache check error for {username}: {e}")
+        found, cached_data = await cache_get(cache_key)
+        if found:
+            logger.debug(f"🎯 Cache HIT: user profile for {username}")
+            return cached_data
     
     # Кэш промах - загружаем данные из БД
     logger.debug(f"💨 Cache MISS: user profile for {username}")
+    started = time.perf_counter()
     user = await get_user_by_username(username, session)
     
-    # Подсчитываем статистику
-    favorites_count = len(user.favorites) if user.favorites else 0
-    ratings_count = len(user.ratings) if user.ratings else 0
-    comments_count = len(user.comments) if user.comments else 0
-    watch_history_count = len(user.watch_history) if user.watch_history else 0
-    
-    # Подсчитываем уникальные аниме в истории просмотров
-    unique_watched_anime = len(set(wh.anime_id for wh in user.watch_history)) if user.watch_history else 0
-    
-    # Преобразуем favorites в список словарей с аниме
-    favorites_list = []
-    if user.favorites:
-        for favorite in user.favorites:
-            if favorite.anime:
-                anime_dict = {
-                    'id': favorite.anime.id,
-                    'title': favorite.anime.title,
-                    'title_original': favorite.anime.title_original,
-                    'poster_url': favorite.anime.poster_url,
-                    'description': favorite.anime.description,
-                    'year': favorite.anime.year,
-                    'type': favorite.anime.type,
-                    'episodes_count': favorite.anime.episodes_count,
-                    'rating': favorite.anime.rating,
-                    'score': favorite.anime.score,
-                    'studio': favorite.anime.studio,
-                    'status': favorite.anime.status,
-                }
-                favorites_list.append(anime_dict)
+    # Статистика - одна строка user_stats
+    stats = await get_user_stats(user.id, session)
+    
+    # Первая страница избранного (следующие - /user/profile/{username}/favorites)
+    favorites_list, favorites_next_cursor = await get_user_favorites_page(
+        user.id, PROFILE_FAVORITES_LIMIT, session)
     
     # Получаем топ-3 аниме пользователя
     best_anime_list = await get_user_best_anime(user.id, session)
@@ -267,31 +245,36 @@ async def user_profile(username: str, session: SessionDep):
             'type_account': user.type_account,
             'created_at': user.created_at.isoformat() if user.created_at else None,
             'favorites': favorites_list,
+            'favorites_next_cursor': favorites_next_cursor,
             'best_anime': best_anime_list,
             'profile_settings': settings_data,
             'premium_status': premium_status,
-            'stats': {
-                'favorites_count': favorites_count,
-                'ratings_count': ratings_count,
-                'comments_count': comments_count,
-                'watch_history_count': watch_history_count,
-                'unique_watched_anime': unique_watched_anime
-            }
+            'stats': stats
         }
     }
     
-    # Сохраняем в кэш на 1 час (3600 секунд)
+    observe_recompute(key_prefix(cache_key), time.perf_counter() - started)
+    
+    # Сохраняем в кэш на 1 час (3600 секунд) под тегом пользователя
     if redis:
-        try:
-            serialized_data = json.dumps(response_data, default=str)
-            await redis.setex(cache_key, 3600, serialized_data)  # TTL = 1 час
+        if await cache_set(cache_key, response_data, 3600, tags=[get_user_cache_tag(username)]):
             logger.debug(f"💾 Cached user profile for {username} (TTL: 3600s)")
-        except Exception as e:
-            logger.warning(f"Failed to cache user profile for {username}: {e}")
     
     return response_data
 
 
+@user_router.get('/profile/{username:str}/favorites')
+async def user_profile_favorites(username: str, session: ReadSessionDep,
+                                 limit: int = PROFILE_FAVORITES_LIMIT, cursor: str | None = None):
+    '''Избранное пользователя постранично (cursor - favorites_next_cursor из профиля
+    или next_cursor предыдущей страницы)'''
+    
+    user = await get_user_by_username(username, session)
+    favorites, next_cursor = await get_user_favorites_page(
+        user.id, max(1, min(limit, 100)), session, cursor)
+    return {'message': favorites, 'next_cursor': next_cursor}
+
+
 @user_router.patch('/change/name')
 async def user_change_name(new_username: UserName, 
                            request: Request, session: SessionDep):
@@ -379,14 +362,8 @@ async def user_settings(username: str, session: SessionDep):
     # Получаем статус премиума
     premium_status = await check_premium_status(user.id, session)
     
-    # Подсчитываем статистику
-    favorites_count = len(user.favorites) if user.favorites else 0
-    ratings_count = len(user.ratings) if user.ratings else 0
-    comments_count = len(user.comments) if user.comments else 0
-    watch_history_count = len(user.watch_history) if user.watch_history else 0
-    
-    # Подсчитываем уникальные аниме в истории просмотров
-    unique_watched_anime = len(set(wh.anime_id for wh in user.watch_history)) if user.watch_history else 0
+    # Статистика - одна строка user_stats
+    stats = await get_user_stats(user.id, session)
     
     return {
         'message': {
@@ -398,13 +375,7 @@ async def user_settings(username: str, session: SessionDep):
             'type_account': user.type_account,
             'created_at': user.created_at.isoformat() if user.created_at else None,
             'premium_status': premium_status,
-            'stats': {
-                'favorites_count': favorites_count,
-                'ratings_count': ratings_count,
-                'comments_count': comments_count,
-                'watch_history_count': watch_history_count,
-                'unique_watched_anime': unique_watched_anime
-            }
+            'stats': stats
         }
     }
 
@@ -414,56 +385,10 @@ async def most_favorited(pagin_data: UserPaginatorDep, session: SessionDep):
     '''Получение топ коллекционеров с кэшированием в Redis
     Кэш на 15 минут (900 секунд) для актуальности данных
     '''
-    # Определяем время кэширования - всегда 15 минут
-    cache_ttl = 900  # 15 минут
-    
-    # Проверяем кэш Redis
-    redis = await get_redis_client()
-    cache_key = f"most_favorited_users:limit:{pagin_data.limit}:offset:{pagin_data.offset}"
-    
-    users_list = None
-    if redis:
-        try:
-            cached_data = await redis.get(cache_key)
-            if cached_data is not None:
-                logger.debug(f"🎯 Cache HIT: most favorited users (limit: {pagin_data.limit}, offset: {pagin_data.offset})")
-                users_list = json.loads(cached_data)
-        except Exception as e:
-            logger.warning(f"Redis cache check error for most favorited users: {e}")
-    
-    # Если данные не в кэше - загружаем из БД
-    if users_list is None:
-        logger.debug(f"💨 Cache MISS: most favorited users (limit: {pagin_data.limit}, offset: {pagin_data.offset})")
-        resp = await get_user_most_favorited(
-            limit=pagin_data.limit, offset=pagin_data.offset, session=session)
-        
-        # Извлекаем информацию о цикле и пользователей из ответа
-        cycle_info = resp.get('cycle_info') if isinstance(resp, dict) else None
-        users_list = resp.get('users', resp) if isinstance(resp, dict) else resp
-        
-        # Сохраняем в кэш только список пользователей (для обратной совместимости)
-        if redis:
-            try:
-                serialized_data = json.dumps(users_list, default=str)
-                await redis.setex(cache_key, cache_ttl, serialized_data)
-                logger.debug(f"💾 Cached most favorited users (TTL: {cache_ttl}s, limit: {pagin_data.limit}, offset: {pagin_data.offset})")
-            except Exception as e:
-                logger.warning(f"Failed to cache most favorited users: {e}")
-    else:
-        # Данные из кэша - получаем актуальную информацию о цикле из БД
-        from src.services.users import get_or_create_current_cycle
-        current_cycle = await get_or_create_current_cycle(session)
-        
-        if current_cycle:
-            cycle_info = {
-                'cycle_id': current_cycle.id,
-                'leader_user_id': current_cycle.leader_user_id,
-                'cycle_start_date': current_cycle.cycle_start_date.isoformat(),
-                'cycle_end_date': current_cycle.cycle_end_date.isoformat(),
-                'is_active': current_cycle.is_active
-            }
-        else:
-            cycle_info = None
+    resp = await get_user_most_favorited_cached(
+        limit=pagin_data.limit, offset=pagin_data.offset, session=session)
+    users_list = resp['users']
+    cycle_info = resp['cycle_info']
     
     # Возвращаем ответ с информацией о цикле
     response_data = {'message': users_list}
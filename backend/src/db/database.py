@@ -1,7 +1,13 @@
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from os import getenv
+from loguru import logger
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from src.db.pool import InstrumentedAsyncPool, record_pool_health
+
 load_dotenv()
 
 POSTGRES_USER = getenv("POSTGRES_USER", 'postgres')
@@ -12,24 +18,161 @@ DB_PORT = getenv("DB_PORT", 5432)
 
 DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
 
-# Настройка пула соединений для продакшена
-# pool_size - базовый размер пула соединений
-# max_overflow - дополнительные соединения при нагрузке
-# pool_pre_ping - проверка соединений перед использованием
-# pool_recycle - переподключение каждые 3600 секунд (1 час)
-engine = create_async_engine(
-    DATABASE_URL,
-    pool_size=20,          # Базовый пул: 20 соединений
-    max_overflow=40,       # Дополнительные: до 40 соединений (итого до 60)
-    pool_pre_ping=True,    # Проверка соединений перед использованием
-    pool_recycle=3600,     # Переподключение каждый час
-    echo=False,            # Отключить SQL логирование в продакшене
-    future=True
-)
+# Реплика для чтения (опционально): те же пользователь и база, другой хост
+DB_REPLICA_HOST = getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = getenv("DB_REPLICA_PORT", DB_PORT)
+# Реплика, отставшая больше чем на N секунд, не используется до следующей проверки
+DB_REPLICA_MAX_LAG = float(getenv("DB_REPLICA_MAX_LAG", "5"))
+# Как часто воркер проверяет отставание реплики (секунды)
+DB_REPLICA_LAG_CHECK_INTERVAL = float(getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "5"))
+# Таймаут подключения к реплике (секунды): недоступная реплика не держит проверку
+DB_REPLICA_CONNECT_TIMEOUT = float(getenv("DB_REPLICA_CONNECT_TIMEOUT", "2"))
+# Как часто фоновая задача проверяет пулы соединений (секунды)
+DB_POOL_HEALTH_CHECK_INTERVAL = float(getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "10"))
+
+
+def _create_engine(url: str, name: str, connect_args: dict | None = None):
+    # Настройка пула соединений для продакшена
+    # pool_size - базовый размер пула соединений
+    # max_overflow - дополнительные соединения при нагрузке
+    # pool_recycle - переподключение каждые 3600 секунд (1 час)
+    # Вместо pool_pre_ping (запрос перед каждой выдачей соединения) пул
+    # проверяет фоновая задача run_pool_health_checker
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncPool,  # Метрики выдачи соединений (src/db/pool.py)
+        pool_logging_name=name,
+        pool_size=20,          # Базовый пул: 20 соединений
+        max_overflow=40,       # Дополнительные: до 40 соединений (итого до 60)
+        pool_recycle=3600,     # Переподключение каждый час
+        echo=False,            # Отключить SQL логирование в продакшене
+        future=True,
+        connect_args=connect_args or {},
+    )
+
+
+engine = _create_engine(DATABASE_URL, 'primary')
 
 new_session = async_sessionmaker(engine, expire_on_commit=False)
 
+# Без DB_REPLICA_HOST чтение идет через основную базу
+if DB_REPLICA_HOST:
+    read_engine = _create_engine(
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{POSTGRES_DB}",
+        'replica',
+        connect_args={'timeout': DB_REPLICA_CONNECT_TIMEOUT})
+    new_replica_session = async_sessionmaker(read_engine, expire_on_commit=False)
+else:
+    read_engine = engine
+    new_replica_session = new_session
+
+# Отставание реплики: 0, если она применила весь полученный WAL
+# (пустая база не отстает, даже если последняя транзакция была давно)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Реплика используется только после первой успешной проверки отставания
+_replica_state = {'available': False}
+
+
+async def check_replica_lag():
+    """
+    Проверить отставание реплики и обновить флаг для read_session
+
+    Выполняется фоновой задачей run_pool_health_checker, а не в запросах:
+    недоступная реплика задерживает только проверку (подключение ограничено
+    DB_REPLICA_CONNECT_TIMEOUT, весь запрос - DB_REPLICA_LAG_CHECK_INTERVAL).
+    Недоступная или отставшая реплика заменяется основной базой до следующей
+    успешной проверки. Заодно это проверка пула соединений реплики.
+    """
+    if read_engine is engine:
+        return
+    try:
+        async with asyncio.timeout(DB_REPLICA_LAG_CHECK_INTERVAL):
+            async with read_engine.connect() as connection:
+                lag = float((await connection.execute(REPLICA_LAG_SQL)).scalar() or 0)
+        record_pool_health('replica', True)
+        available = lag <= DB_REPLICA_MAX_LAG
+        if not available:
+            logger.warning(f"⚠️ Реплика отстает на {lag:.1f} с, чтение идет через основную базу")
+    except Exception as e:
+        record_pool_health('replica', False)
+        available = False
+        logger.warning(f"⚠️ Реплика недоступна, чтение идет через основную базу: {e!r}")
+    if available and not _replica_state['available']:
+        logger.info("✅ Чтение идет через реплику")
+    _replica_state['available'] = available
+
+
+def replica_available() -> bool:
+    """
+    Можно ли читать с реплики - результат последней проверки check_replica_lag
+
+    Запрос к базе не выполняется: флаг обновляет фоновая задача.
+    """
+    return _replica_state['available']
+
+
+@asynccontextmanager
+async def read_session():
+    """
+    Сессия только для чтения: реплика, если она настроена и не отстает
+
+    Для списков, публичных страниц и пересчета кэша. Записи и чтение
+    сразу после своей записи (read-your-writes) - через new_session.
+    """
+    sessionmaker = new_replica_session if replica_available() else new_session
+    async with sessionmaker() as session:
+        yield session
+
+
+async def check_pool_health():
+    """
+    Проверить пулы соединений запросом SELECT 1
+
+    Если соединение оборвано (перезапуск базы, сетевой сбой), SQLAlchemy
+    помечает недействительными все соединения пула, открытые до обрыва:
+    следующие запросы получают новые соединения без pre-ping на каждой выдаче.
+    Пул реплики проверяет check_replica_lag.
+    """
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        record_pool_health('primary', True)
+    except Exception as e:
+        record_pool_health('primary', False)
+        logger.warning(f"⚠️ Проверка пула соединений primary не прошла: {e}")
+
+
+async def _run_periodically(check, interval: float):
+    while True:
+        await check()
+        await asyncio.sleep(interval)
+
+
+async def run_pool_health_checker():
+    """
+    Периодически проверять пулы соединений и отставание реплики
+
+    Запускается фоновой задачей при старте приложения.
+    """
+    await asyncio.gather(
+        _run_periodically(check_pool_health, DB_POOL_HEALTH_CHECK_INTERVAL),
+        _run_periodically(check_replica_lag, DB_REPLICA_LAG_CHECK_INTERVAL),
+    )
+
+
 async def get_session():
+    # Соединение берется из пула при первом запросе сессии к базе,
+    # ответ из кэша пул не занимает
     async with new_session() as session:
         yield session
 
+
+async def get_read_session():
+    async with read_session() as session:
+        yield session
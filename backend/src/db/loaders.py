@@ -0,0 +1,39 @@
+"""
+Профили загрузки связей (loader options) для запросов к моделям
+
+Связи AnimeModel и UserModel объявлены с lazy='raise': обращение к незагруженной
+связи падает с InvalidRequestError, а не выполняет N незаметных запросов.
+Запрос, которому нужны связи, подключает профиль явно:
+
+    select(AnimeModel).options(*ANIME_DETAIL).filter_by(id=anime_id)
+
+Профили:
+- card - только колонки (списки, карточки, проверка существования);
+- detail - страница аниме и результаты поиска: плееры, жанры, темы;
+- best_anime - топ-3 аниме пользователя (лента коллекционеров);
+- ingest - парсинг аниме: те же связи, что и detail (псевдоним).
+"""
+from sqlalchemy.orm import selectinload
+
+from src.models.anime import AnimeModel
+from src.models.users import UserModel
+from src.models.best_user_anime import BestUserAnimeModel
+
+
+ANIME_CARD = ()
+
+ANIME_DETAIL = (
+    selectinload(AnimeModel.players),
+    selectinload(AnimeModel.genres),
+    selectinload(AnimeModel.themes),
+)
+
+# Парсингу нужны те же связи, что и детальной странице (жанры, темы, плееры):
+# псевдоним, а не копия, чтобы два набора не разошлись
+ANIME_INGEST = ANIME_DETAIL
+
+USER_CARD = ()
+
+USER_BEST_ANIME = (
+    selectinload(UserModel.best_anime).selectinload(BestUserAnimeModel.anime),
+)
@@ -0,0 +1,106 @@
+"""
+Пул соединений с базой: метрики выдачи соединений и состояние проверок
+
+Движки создаются с InstrumentedAsyncPool (см. src/db/database.py):
+- время получения соединения из пула (ожидание свободного или открытие
+  нового) - гистограмма по пулам;
+- размер пула, выданные (in use), свободные и сверх pool_size соединения -
+  снимаются с пула в момент чтения метрик;
+- результат последней фоновой проверки пула (run_pool_health_checker).
+
+Сессия (AsyncSession) берет соединение из пула только при первом запросе
+к базе: запрос, обслуженный из кэша, пул не трогает и в метриках не виден.
+"""
+import time
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.services.cache_metrics import Histogram
+
+# Границы корзин времени получения соединения (секунды)
+CHECKOUT_WAIT_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Название пула (pool_logging_name движка) -> текущий пул; пересоздание
+# пула (engine.dispose) заменяет запись
+_pools: dict[str, 'InstrumentedAsyncPool'] = {}
+_checkout_wait: dict[str, Histogram] = {}
+# Название пула -> прошла ли последняя фоновая проверка
+_pool_health: dict[str, bool] = {}
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Очередь соединений asyncio с учетом времени выдачи соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_name = self.logging_name or 'default'
+        _pools[self.metrics_name] = self
+        _checkout_wait.setdefault(self.metrics_name, Histogram(CHECKOUT_WAIT_SECONDS_BUCKETS))
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _checkout_wait[self.metrics_name].observe(time.perf_counter() - started)
+
+
+def record_pool_health(name: str, healthy: bool):
+    """Учесть результат фоновой проверки пула"""
+    _pool_health[name] = healthy
+
+
+def get_pool_metrics() -> dict:
+    """
+    Состояние пулов соединений
+
+    Returns:
+        dict: {pool: {"size": .., "in_use": .., "idle": .., "overflow": ..,
+                      "healthy": .., "checkout_wait_seconds": {..}}}
+    """
+    return {
+        name: {
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "healthy": _pool_health.get(name),
+            "checkout_wait_seconds": _checkout_wait[name].to_dict(),
+        }
+        for name, pool in sorted(_pools.items())
+    }
+
+
+def render_pool_metrics() -> str:
+    """Метрики пулов соединений в текстовом формате Prometheus"""
+    items = sorted(_pools.items())
+    lines = []
+    gauges = (
+        ("anigo_db_pool_size", "Configured pool size.", lambda pool: pool.size()),
+        ("anigo_db_pool_in_use", "Connections currently checked out of the pool.", lambda pool: pool.checkedout()),
+        ("anigo_db_pool_idle", "Idle connections in the pool.", lambda pool: pool.checkedin()),
+        ("anigo_db_pool_overflow", "Connections open above pool_size.", lambda pool: max(pool.overflow(), 0)),
+    )
+    for metric, help_text, value in gauges:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for name, pool in items:
+            lines.append(f'{metric}{{pool="{name}"}} {value(pool)}')
+
+    lines += [
+        "# HELP anigo_db_pool_healthy Result of the last background pool check (1 - passed).",
+        "# TYPE anigo_db_pool_healthy gauge",
+    ]
+    for name, healthy in sorted(_pool_health.items()):
+        lines.append(f'anigo_db_pool_healthy{{pool="{name}"}} {int(healthy)}')
+
+    lines += [
+        "# HELP anigo_db_pool_checkout_wait_seconds Time to get a connection from the pool.",
+        "# TYPE anigo_db_pool_checkout_wait_seconds histogram",
+    ]
+    for name, _ in items:
+        histogram = _checkout_wait[name]
+        for le, count in histogram.cumulative():
+            lines.append(f'anigo_db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="{le}"}} {count}')
+        lines.append(f'anigo_db_pool_checkout_wait_seconds_sum{{pool="{name}"}} {histogram.sum}')
+        lines.append(f'anigo_db_pool_checkout_wait_seconds_count{{pool="{name}"}} {histogram.count}')
+
+    return "\n".join(lines) + "\n"
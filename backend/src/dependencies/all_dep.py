@@ -3,27 +3,33 @@ from fastapi import Depends, Request, HTTPException, status
 from typing import Annotated, Optional
 from loguru import logger
 # 
-from src.db.database import get_session
+from src.db.database import get_session, get_read_session
 from src.services.animes import pagination_get_anime
 from src.schemas.anime import PaginatorData
 from src.auth.auth import get_token, get_token_optional
 from src.models.users import UserModel
-from src.services.users import get_user_by_id
+from src.schemas.user import UserPrincipal
+from src.services.users import get_user_by_id, get_user_principal
 # from src.services.users import UserManager
 
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# Только чтение: реплика, если настроена и не отстает (списки и публичные страницы)
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
 PaginatorAnimeDep = Annotated[PaginatorData, Depends(PaginatorData)]
 CookieDataDep = Annotated[dict, Depends(get_token)]
 OptionalCookieDataDep = Annotated[Optional[dict], Depends(get_token_optional)]
 
 
-async def get_current_user(request: Request, session: SessionDep) -> UserModel:
-    '''Получить текущего пользователя из токена'''
-    logger.debug(f'Попытка получить текущего пользователя. URL: {request.url}, Method: {request.method}')
+async def get_current_user(request: Request, session: SessionDep) -> UserPrincipal:
+    '''Получить текущего пользователя из токена
+
+    Возвращает принципал (id, username, type_account, is_blocked,
+    premium_expires_at) из короткого кэша, без загрузки связей UserModel.
+    Маршрутам, которым нужна полная модель, - FullUserDep.
+    '''
     token_data = await get_token(request)
     user_id = int(token_data.get('sub'))
-    logger.debug(f'Токен декодирован, user_id: {user_id}')
-    user = await get_user_by_id(user_id, session)
+    user = UserPrincipal(**await get_user_principal(user_id, session))
     
     # Проверяем, не заблокирован ли пользователь
     if user.is_blocked:
@@ -33,8 +39,15 @@ async def get_current_user(request: Request, session: SessionDep) -> UserModel:
             detail='Ваш аккаунт заблокирован'
         )
     
-    logger.debug(f'Текущий пользователь получен: ID={user.id}, username={user.username}')
     return user
 
 
-UserExistsDep = Annotated[UserModel, Depends(get_current_user)]
\ No newline at end of file
+UserExistsDep = Annotated[UserPrincipal, Depends(get_current_user)]
+
+
+async def get_current_full_user(user: UserExistsDep, session: SessionDep) -> UserModel:
+    '''Получить текущего пользователя как UserModel (со всеми связями)'''
+    return await get_user_by_id(user.id, session)
+
+
+FullUserDep = Annotated[UserModel, Depends(get_current_full_user)]
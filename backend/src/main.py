@@ -5,7 +5,7 @@ from typing import Callable
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -15,8 +15,12 @@ from src.api.crud_users import user_router
 from src.api.crud_anime import anime_router
 from src.api.crud_admin import admin_router
 from src.api.legal_documents import documents_router
-from src.services.redis_cache import get_redis_client, close_redis_client, get_cache_info
-from src.db.database import engine
+from src.services.redis_cache import (get_redis_client, close_redis_client, get_cache_info,
+                                     run_cache_invalidation_listener)
+from src.services.cache_warmup import warm_up_cache, is_cache_warm, get_warmup_status
+from src.services.anime_views import run_anime_views_flusher, flush_anime_views
+from src.services.collector_leaderboard import run_leaderboard_reconciler
+from src.db.database import engine, run_pool_health_checker
 from src.models import Base
 
 load_dotenv()
@@ -44,10 +48,37 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Redis startup error: {e}")
     
+    # Подписка на инвалидацию локального кэша воркера
+    invalidation_listener = asyncio.create_task(run_cache_invalidation_listener())
+    
+    # Прогрев кэша в фоне: пока он идет, /health/ready отвечает 503
+    cache_warmup = asyncio.create_task(warm_up_cache())
+    
+    # Периодический сброс просмотров аниме из Redis в базу
+    views_flusher = asyncio.create_task(run_anime_views_flusher())
+    
+    # Сверка рейтинга коллекционеров (Redis sorted set) с таблицей favorites
+    leaderboard_reconciler = asyncio.create_task(run_leaderboard_reconciler())
+    
+    # Проверка пулов соединений с базой (вместо pool_pre_ping)
+    pool_health_checker = asyncio.create_task(run_pool_health_checker())
+    
     yield  # Приложение работает
     
     # Shutdown
     logger.info("🛑 Shutting down application...")
+    for task in (cache_warmup, invalidation_listener, views_flusher, leaderboard_reconciler,
+                 pool_health_checker):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    # Просмотры, накопленные после последнего сброса
+    try:
+        await flush_anime_views()
+    except Exception as e:
+        logger.error(f"❌ Failed to flush anime views: {e}")
     await close_redis_client()
     logger.info("✅ Shutdown complete")
 
@@ -92,6 +123,20 @@ app.include_router(anime_router)
 app.include_router(admin_router)
 app.include_router(documents_router)
 
+@app.get("/health")
+async def health():
+    """Проверка, что приложение запущено (liveness)"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Готовность принимать трафик (readiness): 503, пока не завершен прогрев кэша"""
+    if not is_cache_warm():
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": get_warmup_status()})
+    return {"status": "ready", "warmup": get_warmup_status()}
+
+
 # Эндпоинт для отдачи аватарок пользователей
 @app.get("/avatars/{filename:path}")
 async def get_avatar(filename: str):
@@ -7,6 +7,8 @@ class Base(DeclarativeBase):
 from .users import UserModel
 from .pending_registration import PendingRegistrationModel
 from .anime import AnimeModel
+from .genres import GenreModel, anime_genres
+from .themes import ThemeModel, anime_themes
 from .players import PlayerModel
 from .anime_players import AnimePlayerModel
 from .episodes import EpisodeModel
@@ -17,4 +19,6 @@ from .watch_history import WatchHistoryModel
 from .episode_mapping import EpisodeMappingModel
 from .best_user_anime import BestUserAnimeModel
 from .user_profile_settings import UserProfileSettingsModel
-from .collector_competition import CollectorCompetitionCycleModel
\ No newline at end of file
+from .collector_competition import CollectorCompetitionCycleModel
+from .user_stats import UserStatsModel
+from .entity_counters import EntityCounterModel
@@ -1,10 +1,34 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger
+from sqlalchemy import DDL, BigInteger, Computed, Index, event, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+
+# Поисковый вектор: названия (вес A) и описание (вес D), "ё" приравнена к "е"
+# как в normalize_search_query. Совпадает с migrations/add_anime_search_indexes.sql
+ANIME_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', translate(lower(coalesce(title, '')), 'ё', 'е')), 'A') || "
+    "setweight(to_tsvector('simple', translate(lower(coalesce(title_original, '')), 'ё', 'е')), 'A') || "
+    "setweight(to_tsvector('simple', translate(lower(coalesce(description, '')), 'ё', 'е')), 'D')"
+)
+
 class AnimeModel(Base):
     __tablename__ = 'anime'
+    __table_args__ = (
+        # Keyset пагинация по оценке (score, id): по возрастанию и по убыванию с NULL в конце
+        Index('ix_anime_score_id', 'score', 'id'),
+        Index('ix_anime_score_desc_id', text('score DESC NULLS LAST'), 'id'),
+        # Списки студии (регистронезависимо): по id и по оценке
+        Index('ix_anime_lower_studio_id', func.lower(text('studio')), 'id'),
+        Index('ix_anime_lower_studio_score_id', func.lower(text('studio')), 'score', 'id'),
+        Index('ix_anime_lower_studio_score_desc_id', func.lower(text('studio')), text('score DESC NULLS LAST'), 'id'),
+        # Поиск по названию: полнотекстовый (слова и префиксы) и триграммный (опечатки)
+        Index('ix_anime_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_anime_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('ix_anime_title_original_trgm', 'title_original', postgresql_using='gin',
+              postgresql_ops={'title_original': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     title: Mapped[str] = mapped_column(unique=True, nullable=False, index=True)
@@ -20,18 +44,25 @@ class AnimeModel(Base):
     status: Mapped[str]  # вышло, идёт, анонс
     request_count: Mapped[int] = mapped_column(default=0)  # Счетчик запросов для обновления данных
     last_updated: Mapped[datetime | None] = mapped_column(default=None)  # Дата последнего обновления
+    # Вычисляется базой; используется только в условиях поиска, в объекты не загружается
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR, Computed(ANIME_SEARCH_VECTOR_SQL, persisted=True),
+        deferred=True, deferred_raiseload=True,
+    )
     
-    # Связи
-    players: Mapped[list['AnimePlayerModel']] = relationship(back_populates="anime", lazy='selectin', cascade='all, delete-orphan')
-    episodes: Mapped[list['EpisodeModel']] = relationship(back_populates="anime", lazy='selectin', cascade='all, delete-orphan')
-    favorites: Mapped[list['FavoriteModel']] = relationship(back_populates="anime", lazy='selectin')
-    ratings: Mapped[list['RatingModel']] = relationship(back_populates="anime", lazy='selectin')
-    comments: Mapped[list['CommentModel']] = relationship(back_populates="anime", lazy='selectin')
-    watch_history: Mapped[list['WatchHistoryModel']] = relationship(back_populates="anime", lazy='selectin')
-    genres: Mapped[list['GenreModel']] = relationship(back_populates="animes", secondary='anime_genres', lazy='selectin')
-    themes: Mapped[list['ThemeModel']] = relationship(back_populates="animes", secondary='anime_themes', lazy='selectin')
-    best_user_anime: Mapped[list['BestUserAnimeModel']] = relationship(back_populates="anime", lazy='selectin')
-
-
+    # Связи. Не загружаются неявно (lazy='raise'): нужные связи запрос
+    # подгружает явно, профилем из src/db/loaders.py
+    players: Mapped[list['AnimePlayerModel']] = relationship(back_populates="anime", lazy='raise', cascade='all, delete-orphan')
+    episodes: Mapped[list['EpisodeModel']] = relationship(back_populates="anime", lazy='raise', cascade='all, delete-orphan')
+    favorites: Mapped[list['FavoriteModel']] = relationship(back_populates="anime", lazy='raise')
+    ratings: Mapped[list['RatingModel']] = relationship(back_populates="anime", lazy='raise')
+    comments: Mapped[list['CommentModel']] = relationship(back_populates="anime", lazy='raise')
+    watch_history: Mapped[list['WatchHistoryModel']] = relationship(back_populates="anime", lazy='raise')
+    genres: Mapped[list['GenreModel']] = relationship(back_populates="animes", secondary='anime_genres', lazy='raise')
+    themes: Mapped[list['ThemeModel']] = relationship(back_populates="animes", secondary='anime_themes', lazy='raise')
+    best_user_anime: Mapped[list['BestUserAnimeModel']] = relationship(back_populates="anime", lazy='raise')
 
 
+# Триграммные индексы требуют расширения pg_trgm (для create_all на чистой базе)
+event.listen(AnimeModel.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
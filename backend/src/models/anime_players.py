@@ -1,10 +1,15 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class AnimePlayerModel(Base):
     __tablename__ = 'anime_players'
+    __table_args__ = (
+        # Плееры аниме (страница аниме) и связи плеера
+        Index('ix_anime_players_anime_id', 'anime_id'),
+        Index('ix_anime_players_player_id', 'player_id'),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
 
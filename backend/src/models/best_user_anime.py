@@ -1,6 +1,6 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class BestUserAnimeModel(Base):
@@ -8,6 +8,7 @@ class BestUserAnimeModel(Base):
     __table_args__ = (
         UniqueConstraint('user_id', 'place', name='uq_user_place'),  # У пользователя может быть только одно аниме на каждом месте (1, 2, 3)
         UniqueConstraint('user_id', 'anime_id', name='uq_user_anime'),  # Одно и то же аниме не может быть добавлено дважды
+        Index('ix_best_user_anime_anime_id', 'anime_id'),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
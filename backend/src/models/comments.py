@@ -1,10 +1,16 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class CommentModel(Base):
     __tablename__ = 'comments'
+    __table_args__ = (
+        # Keyset пагинация комментариев аниме (created_at, id) от новых к старым
+        Index('ix_comments_anime_id_created_at_id', 'anime_id', text('created_at DESC'), text('id DESC')),
+        # Комментарии пользователя: последний комментарий (антиспам), удаление тестовых данных
+        Index('ix_comments_user_id_created_at', 'user_id', text('created_at DESC')),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
 
@@ -0,0 +1,23 @@
+from . import Base
+from datetime import datetime
+from sqlalchemy import BigInteger, String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+class EntityCounterModel(Base):
+    '''Счетчики каталога: общее число аниме, комментарии и избранное по аниме
+
+    Строка - (название счетчика, id сущности); у общих счетчиков entity_id = 0.
+    Обновляются в той же транзакции, что и сама запись
+    (src/services/entity_counters.py); заполняются и сверяются миграцией
+    migrations/create_entity_counters.sql.
+    '''
+    __tablename__ = 'entity_counters'
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    entity_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, default=0, server_default='0')
+    value: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+        )
@@ -1,10 +1,14 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class EpisodeMappingModel(Base):
     __tablename__ = 'episode_mapping'
+    __table_args__ = (
+        Index('ix_episode_mapping_anime_id', 'anime_id'),
+        Index('ix_episode_mapping_player_id', 'player_id'),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
 
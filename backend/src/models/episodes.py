@@ -1,10 +1,13 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class EpisodeModel(Base):
     __tablename__ = 'episodes'
+    __table_args__ = (
+        Index('ix_episodes_anime_id', 'anime_id'),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     anime_id: Mapped[int] = mapped_column(
@@ -1,10 +1,17 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class FavoriteModel(Base):
     __tablename__ = 'favorites'
+    __table_args__ = (
+        # Избранное пользователя постранично, от новых к старым
+        Index('ix_favorites_user_id_id', 'user_id', 'id'),
+        # Проверка "аниме в избранном у пользователя" и счетчики избранного аниме
+        Index('ix_favorites_user_id_anime_id', 'user_id', 'anime_id'),
+        Index('ix_favorites_anime_id', 'anime_id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('user.id'), nullable=False)
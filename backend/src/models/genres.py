@@ -1,5 +1,5 @@
 from . import Base
-from sqlalchemy import BigInteger, Table, Column, ForeignKey
+from sqlalchemy import BigInteger, Table, Column, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 # Association table для many-to-many между anime и genres
@@ -8,6 +8,8 @@ anime_genres = Table(
     Base.metadata,
     Column('anime_id', BigInteger, ForeignKey('anime.id', ondelete='CASCADE'), primary_key=True),
     Column('genre_id', BigInteger, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    # Списки жанра: аниме по genre_id без полного просмотра связей
+    Index('ix_anime_genres_genre_id_anime_id', 'genre_id', 'anime_id'),
 )
 
 class GenreModel(Base):
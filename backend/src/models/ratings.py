@@ -1,10 +1,15 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class RatingModel(Base):
     __tablename__ = 'ratings'
+    __table_args__ = (
+        # Оценка пользователя для аниме и оценки аниме
+        Index('ix_ratings_user_id_anime_id', 'user_id', 'anime_id'),
+        Index('ix_ratings_anime_id', 'anime_id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('user.id'))
@@ -1,5 +1,5 @@
 from . import Base
-from sqlalchemy import BigInteger, Table, Column, ForeignKey
+from sqlalchemy import BigInteger, Table, Column, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 # Association table для many-to-many между anime и themes
@@ -8,6 +8,8 @@ anime_themes = Table(
     Base.metadata,
     Column('anime_id', BigInteger, ForeignKey('anime.id', ondelete='CASCADE'), primary_key=True),
     Column('theme_id', BigInteger, ForeignKey('themes.id', ondelete='CASCADE'), primary_key=True),
+    # Аниме темы: первичный ключ (anime_id, theme_id) не подходит для поиска по theme_id
+    Index('ix_anime_themes_theme_id_anime_id', 'theme_id', 'anime_id'),
 )
 
 class ThemeModel(Base):
@@ -0,0 +1,25 @@
+from . import Base
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+class UserStatsModel(Base):
+    '''Счетчики профиля пользователя
+
+    Обновляются в той же транзакции, что и запись избранного, оценки,
+    комментария (src/services/user_stats.py); заполняются и сверяются
+    миграцией migrations/create_user_stats.sql.
+    '''
+    __tablename__ = 'user_stats'
+
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    favorites_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    ratings_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    comments_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    watch_history_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    unique_watched_anime: Mapped[int] = mapped_column(default=0, server_default='0')
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+        )
@@ -27,10 +27,11 @@ class UserModel(Base):
         server_default=func.now()
         )
     
-    # Связи
-    favorites: Mapped[list['FavoriteModel']] = relationship(back_populates='user', lazy='selectin')
-    ratings: Mapped[list['RatingModel']] = relationship(back_populates='user', lazy='selectin')
-    comments: Mapped[list['CommentModel']] = relationship(back_populates="user", lazy='selectin')
-    watch_history: Mapped[list['WatchHistoryModel']] = relationship(back_populates="user", lazy='selectin')
-    best_anime: Mapped[list['BestUserAnimeModel']] = relationship(back_populates='user', lazy='selectin')
-    profile_settings: Mapped['UserProfileSettingsModel | None'] = relationship(back_populates='user', lazy='selectin', cascade='all, delete-orphan', uselist=False)
\ No newline at end of file
+    # Связи. Не загружаются неявно (lazy='raise'): нужные связи запрос
+    # подгружает явно, профилем из src/db/loaders.py
+    favorites: Mapped[list['FavoriteModel']] = relationship(back_populates='user', lazy='raise')
+    ratings: Mapped[list['RatingModel']] = relationship(back_populates='user', lazy='raise')
+    comments: Mapped[list['CommentModel']] = relationship(back_populates="user", lazy='raise')
+    watch_history: Mapped[list['WatchHistoryModel']] = relationship(back_populates="user", lazy='raise')
+    best_anime: Mapped[list['BestUserAnimeModel']] = relationship(back_populates='user', lazy='raise')
+    profile_settings: Mapped['UserProfileSettingsModel | None'] = relationship(back_populates='user', lazy='raise', cascade='all, delete-orphan', uselist=False)
\ No newline at end of file
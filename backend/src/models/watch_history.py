@@ -1,10 +1,14 @@
 from . import Base
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 class WatchHistoryModel(Base):
     __tablename__ = 'watch_history'
+    __table_args__ = (
+        Index('ix_watch_history_user_id_anime_id', 'user_id', 'anime_id'),
+        Index('ix_watch_history_anime_id', 'anime_id'),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('user.id'))
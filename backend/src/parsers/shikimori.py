@@ -1,27 +1,47 @@
+import os
 import re
 import asyncio
+import hashlib
 from loguru import logger
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select
 from sqlalchemy.exc import DBAPIError, SQLAlchemyError, IntegrityError
 from anime_parsers_ru import ShikimoriParserAsync
 from anime_parsers_ru.errors import ServiceError, NoResults
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 # 
-from src.parsers.kodik import get_anime_by_shikimori_id
+from src.parsers.kodik import get_anime_by_shikimori_id, get_anime_by_title, get_id_and_players
 from src.models.anime import AnimeModel
 from src.models.players import PlayerModel
 from src.models.anime_players import AnimePlayerModel
-from src.models.genres import GenreModel
-from src.models.themes import ThemeModel
+from src.db.loaders import ANIME_CARD, ANIME_DETAIL, ANIME_INGEST
+from src.services.redis_cache import (cache_get, cache_set, acquire_cache_marker, release_cache_marker,
+                                      invalidate_tags)
+from src.services.anime_sampler import invalidate_anime_sampler
+from src.services.anime_search import search_anime_ids
+from src.services.anime_taxonomy import link_anime_genres, link_anime_themes
+from src.services.entity_counters import change_counter, ANIME_TOTAL
+from src.services.anime_ingest import ANIME_REQUIRED_FIELDS, ingest_anime_batch
+from src.utils.search_query import normalize_search_query
 # 
 # from anime_parsers_ru.parser_aniboom_async 
 
 
 parser_shikimori = ShikimoriParserAsync()
 
+# Сколько помнить, что по запросу ничего не нашлось (без повторного парсинга)
+SEARCH_NEGATIVE_CACHE_TTL = int(os.getenv("SEARCH_NEGATIVE_CACHE_TTL", "1800"))
+# Окно, в течение которого один и тот же запрос парсится не больше одного раза
+SEARCH_SCRAPE_WINDOW = int(os.getenv("SEARCH_SCRAPE_WINDOW", "300"))
+# Через сколько секунд повторить запрос, который уже парсится (заголовок Retry-After)
+SEARCH_SCRAPE_RETRY_AFTER = 5
+# Тег отрицательных результатов: сбрасываются, когда парсинг добавил новые аниме
+SEARCH_MISS_CACHE_TAG = "search:miss"
+# Пауза между запросами к Shikimori при добавлении аниме из результатов Kodik (антибан)
+SHIKIMORI_REQUEST_INTERVAL = float(os.getenv("SHIKIMORI_REQUEST_INTERVAL", "1.5"))
+
 base_get_url = 'https://shikimori.one/animes/'
 new_base_get_url = 'https://shikimori.one/animes/z'
 
@@ -62,86 +82,26 @@ async def safe_shikimori_anime_info(url: str):
         raise
 
 
-async def get_or_create_genre(session: AsyncSession, genre_name: str):
-    """Получить или создать жанр по названию"""
-    try:
-        result = await session.execute(
-            select(GenreModel).where(GenreModel.name == genre_name)
-        )
-        genre = result.scalar_one_or_none()
-        
-        if not genre:
-            genre = GenreModel(name=genre_name)
-            session.add(genre)
-            await session.flush()  # Сохранить чтобы получить ID
-        
-        return genre
-    except (DBAPIError, SQLAlchemyError) as e:
-        logger.warning(f"Ошибка при работе с жанром {genre_name}, делаем rollback: {e}")
-        await session.rollback()
-        # Пробуем снова после rollback
-        result = await session.execute(
-            select(GenreModel).where(GenreModel.name == genre_name)
-        )
-        genre = result.scalar_one_or_none()
-        
-        if not genre:
-            genre = GenreModel(name=genre_name)
-            session.add(genre)
-            await session.flush()
-        
-        return genre
-
-
-async def get_or_create_theme(session: AsyncSession, theme_name: str):
-    """Получить или создать тему по названию"""
-    try:
-        result = await session.execute(
-            select(ThemeModel).where(ThemeModel.name == theme_name)
-        )
-        theme = result.scalar_one_or_none()
-        
-        if not theme:
-            theme = ThemeModel(name=theme_name)
-            session.add(theme)
-            await session.flush()  # Сохранить чтобы получить ID
-        
-        return theme
-    except (DBAPIError, SQLAlchemyError) as e:
-        logger.warning(f"Ошибка при работе с темой {theme_name}, делаем rollback: {e}")
-        await session.rollback()
-        # Пробуем снова после rollback
-        result = await session.execute(
-            select(ThemeModel).where(ThemeModel.name == theme_name)
-        )
-        theme = result.scalar_one_or_none()
-        
-        if not theme:
-            theme = ThemeModel(name=theme_name)
-            session.add(theme)
-            await session.flush()
-        
-        return theme
-
-
 async def get_anime_by_title_db(anime_name: str, session: AsyncSession):
-    '''Поиск аниме в базе по названию (ищет по title и title_original)'''
+    '''Поиск аниме в базе по названию (title, title_original и описание)
+
+    Ранжированный поиск по GIN индексам (src/services/anime_search.py);
+    плееры, жанры и темы подгружаются только для страницы найденных аниме.
+    '''
+
+    async def find():
+        anime_ids = await search_anime_ids(anime_name, session)
+        if not anime_ids:
+            return []
+        animes = (await session.execute(
+            select(AnimeModel).options(*ANIME_DETAIL).where(AnimeModel.id.in_(anime_ids))
+        )).scalars().all()
+        # Порядок релевантности из поиска
+        position = {anime_id: index for index, anime_id in enumerate(anime_ids)}
+        return sorted(animes, key=lambda anime: position[anime.id])
 
-    words = anime_name.split()
-    # Поиск по русскому названию
-    title_conditions = [AnimeModel.title.ilike(f"%{word}%") for word in words]
-    # Поиск по оригинальному названию
-    title_original_conditions = [AnimeModel.title_original.ilike(f"%{word}%") for word in words]
-    
-    # Ищем по обоим полям
-    query = select(AnimeModel).where(
-        or_(
-            and_(*title_conditions),
-            and_(*title_original_conditions)
-        )
-    )
     try:
-        result = (await session.execute(query)).scalars().all()
+        result = await find()
         if result:
             return result
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
@@ -150,7 +110,7 @@ async def get_anime_by_title_db(anime_name: str, session: AsyncSession):
         logger.warning(f"Ошибка базы данных при поиске аниме, делаем rollback: {e}")
         await session.rollback()
         # Пробуем снова после rollback
-        result = (await session.execute(query)).scalars().all()
+        result = await find()
         if result:
             return result
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
@@ -184,136 +144,103 @@ def _get_studio_name_from_material_data(material_data: dict) -> str | None:
     return None
 
 
-async def parse_anime_from_kodik_material_data(kodik_result: dict, session: AsyncSession, added_anime_ids: set):
+def _to_int(value) -> int | None:
+    """Число из данных парсера (год может прийти датой "2020-01-01")"""
+    if isinstance(value, str):
+        value = value.split('-')[0]
+    try:
+        return int(value) if value not in (None, '') else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value) if value not in (None, '') else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _anime_from_kodik_material_data(kodik_result: dict) -> dict | None:
     """
-    Парсит аниме используя material_data из Kodik
+    Колонки аниме и жанры из material_data результата Kodik
     material_data содержит полную информацию об аниме (названия, описания, жанры, студии и т.д.)
+
+    Returns:
+        dict | None: {'anime': {...}, 'genres': [...], 'themes': []};
+        None, если данных не хватает (тогда аниме запрашивается у Shikimori)
     """
     material_data = kodik_result.get('material_data')
-    
-    # Проверяем, что material_data существует и является словарем
     if not material_data or not isinstance(material_data, dict):
         return None
-    
-    sh_id = kodik_result.get('shikimori_id')
-    if not sh_id:
-        return None
-    
-    # Преобразуем в строку для единообразия
-    sh_id_str = str(sh_id)
-    if sh_id_str in added_anime_ids:
-        return None
-    
-    # Извлекаем данные из material_data
-    # material_data может содержать: title, russian, description, year, genres, studios, score, status и т.д.
+
     # Используем русское название из material_data, если есть, иначе оригинальное название
     title = material_data.get('russian') or material_data.get('name') or kodik_result.get('title')
     # Оригинальное название - это title или name из material_data
     title_original = material_data.get('name') or material_data.get('title') or title
     # Описание может быть в разных полях
     description = material_data.get('description') or material_data.get('synopsis') or material_data.get('description_ru') or ''
-    
-    # Проверяем, существует ли уже аниме с таким title_original
-    try:
-        existing_anime = (
-            await session.execute(
-                select(AnimeModel).where(
-                    AnimeModel.title_original == title_original
-                )
-            )
-        ).scalar_one_or_none()
-    except (DBAPIError, SQLAlchemyError) as e:
-        logger.warning(f"Ошибка при проверке существующего аниме из material_data, делаем rollback: {e}")
-        await session.rollback()
-        existing_anime = (
-            await session.execute(
-                select(AnimeModel).where(
-                    AnimeModel.title_original == title_original
-                )
-            )
-        ).scalar_one_or_none()
-    
-    if existing_anime:
-        added_anime_ids.add(sh_id_str)
-        return existing_anime
-    
-    # Создаем новое аниме из material_data
-    episodes_count = None
-    if material_data.get('episodes'):
-        try:
-            episodes_count = int(material_data['episodes'])
-        except (ValueError, TypeError):
-            pass
-    
-    score = None
-    if material_data.get('score'):
-        try:
-            score = float(material_data['score'])
-        except (ValueError, TypeError):
-            pass
-    
-    year = material_data.get('aired_on') or material_data.get('year') or kodik_result.get('year')
-    if year and isinstance(year, str):
-        # Извлекаем год из даты (формат может быть "2020-01-01" или "2020")
-        try:
-            year = int(year.split('-')[0])
-        except (ValueError, TypeError):
-            year = None
-    
-    # Получаем постер
+
+    # Постер: словарь или строка, иначе первый скриншот
     poster_url = None
     poster_data = material_data.get('poster')
-    if poster_data:
-        # poster может быть словарем или строкой
-        if isinstance(poster_data, dict):
-            poster_url = poster_data.get('original') or poster_data.get('preview')
-        elif isinstance(poster_data, str):
-            poster_url = poster_data
-    
+    if isinstance(poster_data, dict):
+        poster_url = poster_data.get('original') or poster_data.get('preview')
+    elif isinstance(poster_data, str):
+        poster_url = poster_data
     if not poster_url:
         screenshots = kodik_result.get('screenshots')
-        if screenshots and isinstance(screenshots, list) and len(screenshots) > 0:
+        if screenshots and isinstance(screenshots, list):
             poster_url = screenshots[0]
-    
-    new_anime = AnimeModel(
-        title=title,
-        title_original=title_original,
-        poster_url=poster_url,
-        description=description,
-        year=year,
-        type=material_data.get('kind') or kodik_result.get('type') or 'TV',
-        episodes_count=episodes_count,
-        rating=material_data.get('rating'),  # Возрастной рейтинг
-        score=score,
-        studio=_get_studio_name_from_material_data(material_data),
-        status=material_data.get('status') or 'unknown',
-    )
-    
-    # Жанры из material_data
-    genres = material_data.get('genres')
-    if genres and isinstance(genres, list):
-        for genre_data in genres:
-            # Проверяем, что genre_data является словарем
-            if isinstance(genre_data, dict):
-                genre_name = genre_data.get('name') or genre_data.get('russian')
-                if genre_name:
-                    genre = await get_or_create_genre(session, genre_name)
-                    new_anime.genres.append(genre)
-            elif isinstance(genre_data, str):
-                # Если это строка, используем её напрямую
-                genre = await get_or_create_genre(session, genre_data)
-                new_anime.genres.append(genre)
-    
-    try:
-        session.add(new_anime)
-        await session.flush()
-        await session.commit()
-        added_anime_ids.add(sh_id_str)
-        return new_anime
-    except (DBAPIError, SQLAlchemyError) as e:
-        logger.error(f"Ошибка при добавлении аниме из material_data {title}: {e}")
-        await session.rollback()
+
+    anime = {
+        'title': title,
+        'title_original': title_original,
+        'poster_url': poster_url,
+        'description': description,
+        'year': _to_int(material_data.get('aired_on') or material_data.get('year') or kodik_result.get('year')),
+        'type': material_data.get('kind') or kodik_result.get('type') or 'TV',
+        'episodes_count': _to_int(material_data.get('episodes')),
+        'rating': material_data.get('rating'),  # Возрастной рейтинг
+        'score': _to_float(material_data.get('score')),
+        'studio': _get_studio_name_from_material_data(material_data),
+        'status': material_data.get('status') or 'unknown',
+    }
+    if not all(anime.get(field) for field in ANIME_REQUIRED_FIELDS):
         return None
+    return {'anime': anime, 'genres': material_data.get('genres'), 'themes': []}
+
+
+def _anime_from_shikimori(anime_data: dict) -> dict:
+    """Колонки аниме, жанры и темы из ответа Shikimori (anime_info)"""
+    return {
+        'anime': {
+            'title': anime_data.get("title") or anime_data.get("original_title"),
+            'title_original': anime_data.get("original_title"),
+            'poster_url': anime_data.get("picture"),
+            'description': anime_data.get("description", ""),
+            'year': _to_int(anime_data.get("year")),
+            'type': anime_data.get("type") or "TV",
+            'episodes_count': _to_int(anime_data.get("episodes")),
+            'rating': anime_data.get("rating"),
+            'score': _to_float(anime_data.get("score")),
+            'studio': anime_data.get("studio"),
+            'status': anime_data.get("status") or "unknown",
+        },
+        'genres': anime_data.get("genres"),
+        'themes': anime_data.get("themes"),
+    }
+
+
+async def _fetch_shikimori_anime(sh_id_str: str) -> dict | None:
+    """Данные аниме с Shikimori по id (основной URL, затем альтернативный)"""
+    for url in (f"{base_get_url}{sh_id_str}", f"{new_base_get_url}{sh_id_str}"):
+        try:
+            anime = await parser_shikimori.anime_info(shikimori_link=url)
+            return anime if anime and isinstance(anime, dict) else None
+        except ServiceError as e:
+            logger.warning(f"❌ Shikimori вернул ошибку для ID {sh_id_str} ({url}): {e}")
+    return None
 
 
 async def parse_and_add_anime_from_kodik_results(animes_dict: dict, kodik_results_list: list, session: AsyncSession, added_anime_ids: set):
@@ -321,304 +248,69 @@ async def parse_and_add_anime_from_kodik_results(animes_dict: dict, kodik_result
     Парсит аниме из результатов kodik и добавляет в БД
     Сначала пытается использовать material_data, если недостаточно данных - запрашивает Shikimori
     Возвращает список добавленных аниме и обновляет added_anime_ids
+
+    Весь список сначала собирается в памяти (запросы к Shikimori идут с паузой
+    SHIKIMORI_REQUEST_INTERVAL), затем записывается одной транзакцией
+    (src/services/anime_ingest.py).
     """
-    added_animes = []
-    
-    # Создаем словарь для быстрого доступа к kodik результатам по sh_id
-    kodik_by_sh_id = {}
-    # Проверяем, что kodik_results_list является списком
     if not isinstance(kodik_results_list, list):
         logger.error(f"kodik_results_list не является списком: {type(kodik_results_list)}")
-        return added_animes
-    
+        return []
+
+    # Первый результат kodik для каждого sh_id
+    kodik_by_sh_id = {}
     for kodik_result in kodik_results_list:
-        # Проверяем, что kodik_result является словарем
         if not isinstance(kodik_result, dict):
             logger.warning(f"Пропущен результат Kodik: не является словарем - {type(kodik_result)}, значение: {kodik_result}")
             continue
-        try:
-            sh_id = kodik_result.get('shikimori_id')
-            if sh_id:
-                # Преобразуем в строку для единообразия
-                kodik_by_sh_id[str(sh_id)] = kodik_result
-        except Exception as e:
-            logger.error(f"Ошибка при обработке kodik_result: {e}, тип: {type(kodik_result)}")
-            continue
-    
+        sh_id = kodik_result.get('shikimori_id')
+        if sh_id:
+            kodik_by_sh_id.setdefault(str(sh_id), kodik_result)
+
+    items = []
+    shikimori_requested = False
     for sh_id, player_urls in animes_dict.items():
-        try:
-            # Преобразуем sh_id в строку для единообразия
-            sh_id_str = str(sh_id)
-            
-            # Пропускаем, если уже обрабатывали этот sh_id
-            if sh_id_str in added_anime_ids:
-                continue
-            
-            # player_urls может быть списком или строкой (для обратной совместимости)
-            if isinstance(player_urls, str):
-                player_urls = [player_urls]
-            elif not isinstance(player_urls, list):
-                player_urls = [player_urls] if player_urls else []
-        except Exception as e:
-            logger.error(f"Ошибка при обработке sh_id={sh_id}, player_urls={player_urls}: {e}", exc_info=True)
+        sh_id_str = str(sh_id)
+        if sh_id_str in added_anime_ids:
             continue
-        
-        # Сначала пытаемся использовать material_data из Kodik
-        # Ищем первый kodik_result с этим sh_id (может быть несколько результатов для одного sh_id)
-        kodik_result = None
-        # Пробуем найти в словаре kodik_by_sh_id
+        # player_urls может быть списком или строкой (для обратной совместимости)
+        if isinstance(player_urls, str):
+            player_urls = [player_urls]
+        elif not isinstance(player_urls, list):
+            player_urls = [player_urls] if player_urls else []
+
         kodik_result = kodik_by_sh_id.get(sh_id_str)
-        
-        # Если не нашли, ищем в списке
-        if not kodik_result:
-            for result in kodik_results_list:
-                # Проверяем, что result является словарем
-                if not isinstance(result, dict):
-                    continue
-                # Преобразуем sh_id в строку для сравнения, так как в result может быть строка или число
-                result_sh_id = result.get('shikimori_id')
-                if result_sh_id and str(result_sh_id) == sh_id_str:
-                    kodik_result = result
-                    break
-        
-        new_anime = None
-        
-        # Проверяем, что kodik_result существует, material_data есть и это словарь
-        if kodik_result and isinstance(kodik_result, dict):
-            material_data = kodik_result.get('material_data')
-            if material_data and isinstance(material_data, dict):
-                new_anime = await parse_anime_from_kodik_material_data(kodik_result, session, added_anime_ids)
-                if new_anime:
-                    added_animes.append(new_anime)
-                    # Продолжаем к добавлению плееров
-                else:
-                    # Если material_data не сработал, запрашиваем Shikimori
-                    kodik_result = None  # Сбрасываем, чтобы запросить Shikimori
-        
-        # Если material_data не сработал или его нет, запрашиваем Shikimori
-        if not new_anime:
-            anime = None
-            try:
-                anime = await parser_shikimori.anime_info(shikimori_link=f"{base_get_url}{sh_id_str}")
-                # Проверяем, что anime является словарем
-                if not (anime and isinstance(anime, dict)):
-                    anime = None  # Если не словарь, сбрасываем
-            except ServiceError as e:
-                logger.warning(
-                    f"❌ Shikimori вернул ошибку для ID {sh_id_str} на основном URL: {e}"
-                )
-                # Пробуем альтернативный URL
-                try:
-                    anime = await parser_shikimori.anime_info(shikimori_link=f"{new_base_get_url}{sh_id_str}")
-                    # Проверяем, что anime является словарем
-                    if not (anime and isinstance(anime, dict)):
-                        anime = None  # Если не словарь, сбрасываем
-                except ServiceError as e2:
-                    logger.warning(
-                        f"❌ Shikimori вернул ошибку для ID {sh_id_str} на альтернативном URL: {e2}"
-                    )
-                    continue
-            
-            # Если anime всё ещё None или не словарь после всех попыток, пропускаем
-            if not anime or not isinstance(anime, dict):
+        item = _anime_from_kodik_material_data(kodik_result) if kodik_result else None
+        if not item:
+            # material_data нет или данных не хватает - запрашиваем Shikimori (антибан между запросами)
+            if shikimori_requested:
+                await asyncio.sleep(SHIKIMORI_REQUEST_INTERVAL)
+            shikimori_requested = True
+            anime_data = await _fetch_shikimori_anime(sh_id_str)
+            if not anime_data:
                 logger.warning(f"⚠️ Не удалось получить данные для ID {sh_id_str}, пропускаем")
                 continue
+            item = _anime_from_shikimori(anime_data)
 
-            # Проверяем, существует ли уже аниме с таким title_original
-            try:
-                existing_anime = (
-                    await session.execute(
-                        select(AnimeModel).where(
-                            AnimeModel.title_original == anime.get("original_title")
-                        )
-                    )
-                ).scalar_one_or_none()
-            except (DBAPIError, SQLAlchemyError) as e:
-                logger.warning(f"Ошибка при проверке существующего аниме, делаем rollback: {e}")
-                await session.rollback()
-                existing_anime = (
-                    await session.execute(
-                        select(AnimeModel).where(
-                            AnimeModel.title_original == anime.get("original_title")
-                        )
-                    )
-                ).scalar_one_or_none()
-
-            if existing_anime:
-                # Аниме уже есть в БД, просто добавляем связь с плеером если её нет
-                new_anime = existing_anime
-                added_anime_ids.add(sh_id_str)  # Помечаем как обработанное
-                added_animes.append(new_anime)
-            else:
-                # Создаем новое аниме
-                episodes_count = None
-                if anime.get("episodes"):
-                    try:
-                        episodes_count = int(anime["episodes"])
-                    except (ValueError, TypeError):
-                        pass
-
-                score = None
-                if anime.get("score"):
-                    try:
-                        score = float(anime["score"])
-                    except (ValueError, TypeError):
-                        pass
-
-                new_anime = AnimeModel(
-                    title=anime.get("title"),
-                    title_original=anime.get("original_title"),
-                    poster_url=anime.get("picture"),
-                    description=anime.get("description", ""),
-                    year=anime.get("year"),
-                    type=anime.get("type", "TV"),
-                    episodes_count=episodes_count,
-                    rating=anime.get("rating"),
-                    score=score,
-                    studio=anime.get("studio"),
-                    status=anime.get("status", "unknown"),
-                )
-
-                # Жанры
-                genres = anime.get("genres")
-                if genres:
-                    # Проверяем, что genres является списком
-                    if isinstance(genres, list):
-                        for genre_name in genres:
-                            # Проверяем, что genre_name является строкой, а не словарем
-                            if isinstance(genre_name, str):
-                                genre = await get_or_create_genre(session, genre_name)
-                                new_anime.genres.append(genre)
-                            elif isinstance(genre_name, dict):
-                                # Если это словарь, извлекаем название
-                                genre_name_str = genre_name.get("name") or genre_name.get("russian") or str(genre_name)
-                                if genre_name_str:
-                                    genre = await get_or_create_genre(session, genre_name_str)
-                                    new_anime.genres.append(genre)
-
-                # Темы
-                themes = anime.get("themes")
-                if themes:
-                    # Проверяем, что themes является списком
-                    if isinstance(themes, list):
-                        for theme_name in themes:
-                            # Проверяем, что theme_name является строкой, а не словарем
-                            if isinstance(theme_name, str):
-                                theme = await get_or_create_theme(session, theme_name)
-                                new_anime.themes.append(theme)
-                            elif isinstance(theme_name, dict):
-                                # Если это словарь, извлекаем название
-                                theme_name_str = theme_name.get("name") or theme_name.get("russian") or str(theme_name)
-                                if theme_name_str:
-                                    theme = await get_or_create_theme(session, theme_name_str)
-                                    new_anime.themes.append(theme)
-
-                try:
-                    session.add(new_anime)
-                    await session.flush()
-                    await session.commit()
-                    added_anime_ids.add(sh_id_str)  # Помечаем как обработанное
-                    added_animes.append(new_anime)
-                except (DBAPIError, SQLAlchemyError) as e:
-                    logger.error(f"Ошибка при добавлении аниме {anime.get('title')}: {e}")
-                    await session.rollback()
-                    continue
-        
-        # Если new_anime всё ещё None, пропускаем этот sh_id
-        if not new_anime:
-            continue
-
-        # Добавляем все плееры для этого аниме
-        for player_url in player_urls:
-            if not player_url:
-                continue
-                
-            # Плеер
-            try:
-                existing_player = (
-                    await session.execute(
-                        select(PlayerModel).where(
-                            PlayerModel.base_url == player_url
-                        )
-                    )
-                ).scalar_one_or_none()
-            except (DBAPIError, SQLAlchemyError) as e:
-                logger.warning(f"Ошибка при проверке плеера, делаем rollback: {e}")
-                await session.rollback()
-                existing_player = (
-                    await session.execute(
-                        select(PlayerModel).where(
-                            PlayerModel.base_url == player_url
-                        )
-                    )
-                ).scalar_one_or_none()
-
-            if not existing_player:
-                existing_player = PlayerModel(
-                    base_url=player_url,
-                    name="kodik",
-                    type="iframe"
-                )
-                try:
-                    session.add(existing_player)
-                    await session.flush()
-                except (DBAPIError, SQLAlchemyError) as e:
-                    logger.warning(f"Ошибка при добавлении плеера, делаем rollback: {e}")
-                    await session.rollback()
-                    session.add(existing_player)
-                    await session.flush()
+        item['shikimori_id'] = sh_id_str
+        item['player_urls'] = [url for url in player_urls if url]
+        items.append(item)
 
-            # Связь аниме ↔ плеер
-            try:
-                existing_anime_player = (
-                    await session.execute(
-                        select(AnimePlayerModel).where(
-                            AnimePlayerModel.anime_id == new_anime.id,
-                            AnimePlayerModel.player_id == existing_player.id,
-                            AnimePlayerModel.embed_url == player_url
-                        )
-                    )
-                ).scalar_one_or_none()
-            except (DBAPIError, SQLAlchemyError) as e:
-                logger.warning(f"Ошибка при проверке связи аниме-плеер, делаем rollback: {e}")
-                await session.rollback()
-                existing_anime_player = (
-                    await session.execute(
-                        select(AnimePlayerModel).where(
-                            AnimePlayerModel.anime_id == new_anime.id,
-                            AnimePlayerModel.player_id == existing_player.id,
-                            AnimePlayerModel.embed_url == player_url
-                        )
-                    )
-                ).scalar_one_or_none()
+    if not items:
+        return []
+    try:
+        anime_ids = await ingest_anime_batch(items, session)
+    except (DBAPIError, SQLAlchemyError) as e:
+        logger.error(f"❌ Ошибка при записи пакета из {len(items)} аниме: {e}")
+        return []
+    added_anime_ids.update(anime_ids)
 
-            if not existing_anime_player:
-                anime_player = AnimePlayerModel(
-                    external_id=f"{sh_id_str}_{player_url}",
-                    embed_url=player_url,
-                    translator="Russian",
-                    quality="720p",
-                    anime=new_anime,
-                    player=existing_player,
-                )
-                try:
-                    session.add(anime_player)
-                    await session.commit()
-                except (DBAPIError, SQLAlchemyError) as e:
-                    logger.error(f"Ошибка при добавлении связи аниме-плеер: {e}")
-                    await session.rollback()
-                    continue
-            else:
-                try:
-                    await session.commit()
-                except (DBAPIError, SQLAlchemyError) as e:
-                    logger.warning(f"Ошибка при коммите, делаем rollback: {e}")
-                    await session.rollback()
-        
-        # Антибан (только один раз на все плееры для этого аниме)
-        await asyncio.sleep(1.5)
-    
-    return added_animes
+    ordered_ids = list(dict.fromkeys(anime_ids.values()))
+    animes = (await session.execute(
+        select(AnimeModel).options(*ANIME_CARD).where(AnimeModel.id.in_(ordered_ids))
+    )).scalars().all()
+    animes_by_id = {anime.id: anime for anime in animes}
+    return [animes_by_id[anime_id] for anime_id in ordered_ids if anime_id in animes_by_id]
 
 
 async def search_anime_by_progressive_words(anime_name: str, session: AsyncSession):
@@ -894,51 +586,11 @@ async def background_search_and_add_anime(anime_name: str):
                             # Сохраняем ID до коммита, чтобы не обращаться к объекту после коммита
                             anime_id = new_anime.id
 
-                            # Сохраняем ID жанров и тем для прямой вставки в association tables
-                            genre_ids = []
-                            if anime.get("genres"):
-                                for genre_name in anime["genres"]:
-                                    genre = await get_or_create_genre(session, genre_name)
-                                    genre_ids.append(genre.id)
-
-                            theme_ids = []
-                            if anime.get("themes"):
-                                for theme_name in anime["themes"]:
-                                    theme = await get_or_create_theme(session, theme_name)
-                                    theme_ids.append(theme.id)
-
                             try:
-                                await session.commit()
-                                
-                                # После коммита добавляем связи через прямую вставку в association tables
-                                if genre_ids:
-                                    from src.models.genres import anime_genres
-                                    for genre_id in genre_ids:
-                                        try:
-                                            await session.execute(
-                                                anime_genres.insert().values(
-                                                    anime_id=anime_id,
-                                                    genre_id=genre_id
-                                                )
-                                            )
-                                        except Exception:
-                                            # Игнорируем ошибки дубликатов
-                                            pass
-                                
-                                if theme_ids:
-                                    from src.models.themes import anime_themes
-                                    for theme_id in theme_ids:
-                                        try:
-                                            await session.execute(
-                                                anime_themes.insert().values(
-                                                    anime_id=anime_id,
-                                                    theme_id=theme_id
-                                                )
-                                            )
-                                        except Exception:
-                                            # Игнорируем ошибки дубликатов
-                                            pass
-                                
+                                # Жанры и темы - по одному INSERT в таблицы связей, в одной транзакции с аниме
+                                await link_anime_genres(session, anime_id, anime.get("genres"))
+                                await link_anime_themes(session, anime_id, anime.get("themes"))
+                                await change_counter(ANIME_TOTAL, session, 1)
                                 await session.commit()
                                 added_count += 1
                             except IntegrityError as e:
@@ -1153,7 +805,62 @@ async def shikimori_get_anime(anime_name: str, session: AsyncSession):
             pass
         # Продолжаем парсинг
     
+    # Запрос, по которому недавно ничего не нашлось, повторно не парсим
+    query_hash = hashlib.sha1(normalize_search_query(anime_name).encode()).hexdigest()
+    miss_key = f"search_miss:{query_hash}"
+    found, _ = await cache_get(miss_key)
+    if found:
+        raise HTTPException(status_code=404, detail="Аниме не найдено")
+    
+    scrape_key = f"search_scrape:{query_hash}"
+    if not await acquire_cache_marker(scrape_key, SEARCH_SCRAPE_WINDOW):
+        # Запрос уже парсится (или парсился в текущем окне) - повторно не запускаем.
+        # Это не "не найдено": аниме может появиться в базе, когда парсинг закончится
+        logger.debug(f"⏭️ Парсинг '{anime_name}' уже запускался, пропускаем")
+        raise HTTPException(
+            status_code=status.HTTP_202_ACCEPTED,
+            detail="Аниме ищется, повторите запрос позже",
+            headers={"Retry-After": str(SEARCH_SCRAPE_RETRY_AFTER)},
+        )
+    
+    try:
+        added_animes = await _scrape_anime_by_title(anime_name, session)
+    except HTTPException as e:
+        if e.status_code == 404:
+            # Ничего не нашлось - повторы блокирует search_miss
+            await cache_set(miss_key, True, SEARCH_NEGATIVE_CACHE_TTL, tags=[SEARCH_MISS_CACHE_TAG])
+        else:
+            # Временная ошибка Shikimori/Kodik не должна блокировать запрос на все окно
+            await release_cache_marker(scrape_key)
+        raise
+    except BaseException:
+        await release_cache_marker(scrape_key)
+        raise
+    
+    # Новые аниме могут подходить под запросы, которые раньше ничего не находили
+    await invalidate_tags(SEARCH_MISS_CACHE_TAG)
+    # ...и должны попадать в блок случайных аниме
+    await invalidate_anime_sampler()
+    # Жанры и темы записаны напрямую в таблицы связей - перечитываем аниме со связями
+    anime_ids = list(dict.fromkeys(anime.id for anime in added_animes))
+    animes = (await session.execute(
+        select(AnimeModel).options(*ANIME_DETAIL)
+        .where(AnimeModel.id.in_(anime_ids))
+        .execution_options(populate_existing=True)
+    )).scalars().all()
+    animes_by_id = {anime.id: anime for anime in animes}
+    return [animes_by_id[anime_id] for anime_id in anime_ids if anime_id in animes_by_id]
+
+
+async def _scrape_anime_by_title(anime_name: str, session: AsyncSession):
+    """
+    Найти аниме на Kodik/Shikimori и добавить в БД
+
+    Raises:
+        HTTPException: 404 - ничего не найдено, 500 - ошибка парсинга
+    """
     # Используем поиск по нарастающим комбинациям слов
+    added_animes = []
     try:
         added_animes = await search_anime_by_progressive_words(anime_name, session)
     except Exception as e:
@@ -1276,7 +983,7 @@ async def shikimori_get_anime_background(anime_name: str):
             try:
                 existing_anime = (
                     await session.execute(
-                        select(AnimeModel).where(
+                        select(AnimeModel).options(*ANIME_INGEST).where(
                             AnimeModel.title_original == anime.get("original_title")
                         )
                     )
@@ -1287,7 +994,7 @@ async def shikimori_get_anime_background(anime_name: str):
                 await session.rollback()
                 existing_anime = (
                     await session.execute(
-                        select(AnimeModel).where(
+                        select(AnimeModel).options(*ANIME_INGEST).where(
                             AnimeModel.title_original == anime.get("original_title")
                         )
                     )
@@ -1349,7 +1056,7 @@ async def shikimori_get_anime_background(anime_name: str):
                         try:
                             existing_anime = (
                                 await session.execute(
-                                    select(AnimeModel).where(
+                                    select(AnimeModel).options(*ANIME_INGEST).where(
                                         AnimeModel.title_original == original_title_value
                                     )
                                 )
@@ -1375,52 +1082,11 @@ async def shikimori_get_anime_background(anime_name: str):
                     # Сохраняем ID до коммита
                     anime_id = new_anime.id
 
-                    # Сохраняем ID жанров и тем для прямой вставки в association tables
-                    genre_ids = []
-                    if anime.get("genres"):
-                        for genre_name in anime["genres"]:
-                            genre = await get_or_create_genre(session, genre_name)
-                            genre_ids.append(genre.id)
-
-                    theme_ids = []
-                    if anime.get("themes"):
-                        for theme_name in anime["themes"]:
-                            theme = await get_or_create_theme(session, theme_name)
-                            theme_ids.append(theme.id)
-
                     try:
-                        # Коммитим аниме сразу после добавления
-                        await session.commit()
-                        
-                        # После коммита добавляем связи через прямую вставку в association tables
-                        if genre_ids:
-                            from src.models.genres import anime_genres
-                            for genre_id in genre_ids:
-                                try:
-                                    await session.execute(
-                                        anime_genres.insert().values(
-                                            anime_id=anime_id,
-                                            genre_id=genre_id
-                                        )
-                                    )
-                                except Exception:
-                                    # Игнорируем ошибки дубликатов
-                                    pass
-                        
-                        if theme_ids:
-                            from src.models.themes import anime_themes
-                            for theme_id in theme_ids:
-                                try:
-                                    await session.execute(
-                                        anime_themes.insert().values(
-                                            anime_id=anime_id,
-                                            theme_id=theme_id
-                                        )
-                                    )
-                                except Exception:
-                                    # Игнорируем ошибки дубликатов
-                                    pass
-                        
+                        # Жанры и темы - по одному INSERT в таблицы связей, в одной транзакции с аниме
+                        await link_anime_genres(session, anime_id, anime.get("genres"))
+                        await link_anime_themes(session, anime_id, anime.get("themes"))
+                        await change_counter(ANIME_TOTAL, session, 1)
                         await session.commit()
                         added_animes.append(new_anime)
                     except IntegrityError as e:
@@ -1436,7 +1102,7 @@ async def shikimori_get_anime_background(anime_name: str):
                             try:
                                 existing_anime = (
                                     await session.execute(
-                                        select(AnimeModel).where(
+                                        select(AnimeModel).options(*ANIME_INGEST).where(
                                             AnimeModel.title_original == original_title_value
                                         )
                                     )
@@ -152,4 +152,12 @@ class PremiumStatusResponse(BaseModel):
     is_premium: bool
     expires_at: str | None
     days_remaining: int | None
-    type_account: str
\ No newline at end of file
+    type_account: str
+
+class UserPrincipal(BaseModel):
+    """Текущий пользователь для авторизации запроса (без связей UserModel)"""
+    id: int
+    username: str
+    type_account: str
+    is_blocked: bool
+    premium_expires_at: datetime | None
@@ -5,8 +5,12 @@ from datetime import datetime, timedelta, timezone
 from loguru import logger
 from sqlalchemy.orm import noload
 import random
+from collections import Counter
 # 
 from src.services.users import get_user_by_id
+from src.services.collector_leaderboard import rebuild_leaderboard, remove_from_leaderboard
+from src.services.user_stats import change_user_stats
+from src.services.entity_counters import change_counter, change_counters, ANIME_COMMENTS, ANIME_FAVORITES
 from src.models.anime import AnimeModel
 from src.models.users import UserModel
 from src.schemas.anime import PaginatorData
@@ -16,7 +20,8 @@ from src.models.favorites import FavoriteModel
 from src.models.best_user_anime import BestUserAnimeModel
 from src.models.watch_history import WatchHistoryModel
 from src.auth.auth import hashed_password
-from src.services.redis_cache import clear_all_cache, get_redis_client
+from src.services.redis_cache import (clear_all_cache, get_redis_client, clear_anime_detail_cache,
+                                     clear_user_principal_cache)
 
 async def admin_get_all_users(limit: int, offset: int, session: AsyncSession):
     '''Получить всех пользователей с пагинацией'''
@@ -40,6 +45,7 @@ async def admin_block_user(user_id: int, session: AsyncSession):
     user_for_block.is_blocked = True
     await session.commit()
     await session.refresh(user_for_block)
+    await clear_user_principal_cache(user_for_block.id)
     return 'Пользователь заблокирован'
     
 
@@ -48,6 +54,7 @@ async def admin_unblock_user(user_id: int, session: AsyncSession):
     user_for_unblock.is_blocked = False
     await session.commit()
     await session.refresh(user_for_unblock)
+    await clear_user_principal_cache(user_for_unblock.id)
     return 'Пользователь разблокирован'
 
 
@@ -70,6 +77,7 @@ async def admin_make_admin(user_id: int, session: AsyncSession):
     user_to_promote.type_account = 'admin'
     await session.commit()
     await session.refresh(user_to_promote)
+    await clear_user_principal_cache(user_to_promote.id)
     return 'Пользователь назначен администратором'
 
 
@@ -92,6 +100,7 @@ async def admin_remove_admin(user_id: int, session: AsyncSession):
     user_to_demote.type_account = 'base'
     await session.commit()
     await session.refresh(user_to_demote)
+    await clear_user_principal_cache(user_to_demote.id)
     return 'Права администратора сняты'
 
 
@@ -249,6 +258,9 @@ async def admin_create_test_users(count: int, session: AsyncSession) -> dict:
     total_comments = 0
     total_favorites = 0
     total_best_anime = 0
+    # Новые комментарии и избранное по anime_id - для счетчиков каталога
+    anime_comments = Counter()
+    anime_favorites = Counter()
     
     for i in range(count):
         # Генерируем данные
@@ -316,6 +328,7 @@ async def admin_create_test_users(count: int, session: AsyncSession) -> dict:
                 session.add(comment)
                 user_comments += 1
                 total_comments += 1
+                anime_comments[anime_id] += 1
             
             # Избранное
             # Для первых 5 пользователей: гарантированное количество
@@ -348,6 +361,7 @@ async def admin_create_test_users(count: int, session: AsyncSession) -> dict:
                     session.add(favorite)
                     user_favorites += 1
                     total_favorites += 1
+                    anime_favorites[anime_id] += 1
             
             # Топ-3 лучших аниме (от 1 до 3)
             num_best_anime = random.randint(1, 3)
@@ -379,6 +393,9 @@ async def admin_create_test_users(count: int, session: AsyncSession) -> dict:
                     user_best_anime += 1
                     total_best_anime += 1
         
+        await change_user_stats(user_id, session, comments_count=user_comments,
+                                favorites_count=user_favorites)
+        
         created_users.append({
             'username': username,
             'email': email,
@@ -390,7 +407,11 @@ async def admin_create_test_users(count: int, session: AsyncSession) -> dict:
             'best_anime': user_best_anime
         })
     
+    await change_counters(ANIME_COMMENTS, anime_comments, session)
+    await change_counters(ANIME_FAVORITES, anime_favorites, session)
     await session.commit()
+    # Избранного добавлено много и сразу - рейтинг проще перестроить целиком
+    await rebuild_leaderboard()
     
     return {
         'created': len(created_users),
@@ -430,19 +451,26 @@ async def admin_delete_test_data(session: AsyncSession) -> dict:
     
     # Подсчитываем и удаляем связанные данные
     # Комментарии
-    comments_result = await session.execute(
-        select(func.count(CommentModel.id)).filter(CommentModel.user_id.in_(user_ids))
-    )
-    comments_count = comments_result.scalar() or 0
+    # Подсчет по anime_id - для уменьшения счетчиков каталога
+    anime_comments = dict((await session.execute(
+        select(CommentModel.anime_id, func.count(CommentModel.id))
+        .filter(CommentModel.user_id.in_(user_ids))
+        .group_by(CommentModel.anime_id)
+    )).all())
+    comments_count = sum(anime_comments.values())
+    await change_counters(ANIME_COMMENTS, {anime_id: -amount for anime_id, amount in anime_comments.items()}, session)
     await session.execute(
         delete(CommentModel).where(CommentModel.user_id.in_(user_ids))
     )
     
     # Избранное
-    favorites_result = await session.execute(
-        select(func.count(FavoriteModel.id)).filter(FavoriteModel.user_id.in_(user_ids))
-    )
-    favorites_count = favorites_result.scalar() or 0
+    anime_favorites = dict((await session.execute(
+        select(FavoriteModel.anime_id, func.count(FavoriteModel.id))
+        .filter(FavoriteModel.user_id.in_(user_ids))
+        .group_by(FavoriteModel.anime_id)
+    )).all())
+    favorites_count = sum(anime_favorites.values())
+    await change_counters(ANIME_FAVORITES, {anime_id: -amount for anime_id, amount in anime_favorites.items()}, session)
     await session.execute(
         delete(FavoriteModel).where(FavoriteModel.user_id.in_(user_ids))
     )
@@ -485,6 +513,8 @@ async def admin_delete_test_data(session: AsyncSession) -> dict:
     # Очищаем кэш топ пользователей, так как пользователи удалены
     from src.services.redis_cache import clear_most_favorited_cache
     await clear_most_favorited_cache()
+    await clear_user_principal_cache(*user_ids)
+    await remove_from_leaderboard(*user_ids)
     
     return {
         'deleted_users': users_count,
@@ -539,8 +569,12 @@ async def delete_comment(current_user_id: int, current_user_type: str, comment_i
     is_comment_owner = comment_from_delete.user_id == current_user_id
     
     if is_admin_or_owner or is_comment_owner:
+        anime_id = comment_from_delete.anime_id
         await session.delete(comment_from_delete)
+        await change_user_stats(comment_from_delete.user_id, session, comments_count=-1)
+        await change_counter(ANIME_COMMENTS, session, -1, entity_id=anime_id)
         await session.commit()
+        await clear_anime_detail_cache(anime_id)
         return 'Удалили комментарий'
     
     # Если нет прав, возвращаем None
@@ -0,0 +1,143 @@
+"""
+Пакетная запись результатов парсинга Kodik в базу
+
+parse_and_add_anime_from_kodik_results раньше на каждое аниме делал SELECT по
+title_original, на каждый плеер - SELECT по base_url и по связи аниме-плеер,
+и коммитил после каждого аниме и каждой связи. Теперь парсер сначала собирает
+весь список результатов в памяти, а запись идет одной транзакцией:
+- anime: INSERT ... ON CONFLICT DO NOTHING RETURNING, id уже существующих
+  (по title_original) - одним SELECT. Аниме, не вставленное из-за совпадения
+  title с другим аниме, пропускается, а не откатывает весь пакет;
+- жанры и темы новых аниме - по одному INSERT (src/services/anime_taxonomy.py);
+- счетчик anime_total - на число вставленных аниме (src/services/entity_counters.py);
+- players: INSERT ... ON CONFLICT (base_url) DO NOTHING RETURNING + SELECT;
+- anime_players: INSERT ... ON CONFLICT (external_id) DO NOTHING.
+
+Существующие аниме не перезаписываются (как и раньше): их данные обновляет
+update_anime_data_from_shikimori.
+
+Элемент пакета - словарь:
+    {
+        'shikimori_id': '5114',
+        'anime': {'title': ..., 'title_original': ..., ...},  # колонки anime
+        'genres': [...], 'themes': [...],  # названия или словари парсера
+        'player_urls': ['//kodik.info/...'],
+    }
+"""
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.anime import AnimeModel
+from src.models.players import PlayerModel
+from src.models.anime_players import AnimePlayerModel
+from src.services.anime_taxonomy import link_genres_batch, link_themes_batch
+from src.services.entity_counters import change_counter, ANIME_TOTAL
+
+
+# Обязательные колонки anime: элемент без них не попадает в пакет
+ANIME_REQUIRED_FIELDS = ('title', 'title_original', 'poster_url', 'status')
+
+
+async def _upsert_anime(items: list[dict], session: AsyncSession) -> tuple[dict[str, int], set[int]]:
+    """
+    Вставить новые аниме пакета
+
+    Returns:
+        tuple: ({title_original: anime_id} для вставленных и уже существующих аниме,
+                id вставленных аниме)
+    """
+    rows = {}
+    for item in items:
+        rows.setdefault(item['anime']['title_original'], item['anime'])
+    rows = list(rows.values())
+    inserted = (await session.execute(
+        insert(AnimeModel)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(AnimeModel.title_original, AnimeModel.id)
+    )).all()
+    anime_ids = {title_original: anime_id for title_original, anime_id in inserted}
+    existing = [row['title_original'] for row in rows if row['title_original'] not in anime_ids]
+    if existing:
+        anime_ids.update((await session.execute(
+            select(AnimeModel.title_original, AnimeModel.id)
+            .where(AnimeModel.title_original.in_(existing))
+        )).all())
+    return anime_ids, {anime_id for _, anime_id in inserted}
+
+
+async def _upsert_players(player_urls: list[str], session: AsyncSession) -> dict[str, int]:
+    """Вставить новые плееры Kodik: {base_url: player_id}"""
+    if not player_urls:
+        return {}
+    inserted = (await session.execute(
+        insert(PlayerModel)
+        .values([{'base_url': url, 'name': 'kodik', 'type': 'iframe', 'is_active': True} for url in player_urls])
+        .on_conflict_do_nothing(index_elements=[PlayerModel.base_url])
+        .returning(PlayerModel.base_url, PlayerModel.id)
+    )).all()
+    player_ids = {base_url: player_id for base_url, player_id in inserted}
+    existing = [url for url in player_urls if url not in player_ids]
+    if existing:
+        player_ids.update((await session.execute(
+            select(PlayerModel.base_url, PlayerModel.id).where(PlayerModel.base_url.in_(existing))
+        )).all())
+    return player_ids
+
+
+async def ingest_anime_batch(items: list[dict], session: AsyncSession) -> dict[str, int]:
+    """
+    Записать пакет аниме с плеерами одной транзакцией (с commit)
+
+    Raises:
+        DBAPIError, SQLAlchemyError: транзакция откатывается целиком
+
+    Returns:
+        dict: {shikimori_id: anime_id} для записанных аниме пакета (новых и уже существующих)
+    """
+    complete = [item for item in items if all(item['anime'].get(field) for field in ANIME_REQUIRED_FIELDS)]
+    if len(complete) < len(items):
+        logger.warning(f"⚠️ Пропущено аниме без обязательных полей: {len(items) - len(complete)}")
+    items = complete
+    if not items:
+        return {}
+    try:
+        anime_ids, inserted_ids = await _upsert_anime(items, session)
+        items = [item for item in items if item['anime']['title_original'] in anime_ids]
+
+        # Жанры и темы - только у новых аниме, как при создании через ORM
+        new_items = {}
+        for item in items:
+            anime_id = anime_ids[item['anime']['title_original']]
+            if anime_id in inserted_ids:
+                new_items.setdefault(anime_id, item)
+        await link_genres_batch(session, {anime_id: item['genres'] for anime_id, item in new_items.items()})
+        await link_themes_batch(session, {anime_id: item['themes'] for anime_id, item in new_items.items()})
+        await change_counter(ANIME_TOTAL, session, len(inserted_ids))
+
+        player_urls = list(dict.fromkeys(url for item in items for url in item['player_urls'] if url))
+        player_ids = await _upsert_players(player_urls, session)
+        anime_players = list({
+            f"{item['shikimori_id']}_{url}": {
+                'external_id': f"{item['shikimori_id']}_{url}",
+                'anime_id': anime_ids[item['anime']['title_original']],
+                'player_id': player_ids[url],
+                'embed_url': url,
+                'translator': 'Russian',
+                'quality': '720p',
+            }
+            for item in items for url in item['player_urls'] if url
+        }.values())
+        if anime_players:
+            await session.execute(
+                insert(AnimePlayerModel)
+                .values(anime_players)
+                .on_conflict_do_nothing(index_elements=[AnimePlayerModel.external_id])
+            )
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return {item['shikimori_id']: anime_ids[item['anime']['title_original']] for item in items}
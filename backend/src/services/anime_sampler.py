@@ -0,0 +1,83 @@
+"""
+Выбор случайных аниме без ORDER BY random()
+
+ORDER BY random() LIMIT n сканирует и сортирует всю таблицу anime на каждый
+показ блока "случайные аниме". Вместо этого воркер держит компактный массив
+id (array('q'), 8 байт на аниме) для каждого фильтра (тип, год) в локальном
+кэше, выбирает из него limit случайных id за O(limit) и загружает только эти
+строки по первичному ключу.
+
+Массив перечитывается по таймеру (ANIME_SAMPLER_TTL) и сбрасывается во всех
+воркерах при добавлении новых аниме (invalidate_anime_sampler).
+"""
+import os
+import random
+import asyncio
+from array import array
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.anime import AnimeModel
+from src.services.local_cache import local_cache
+from src.services.redis_cache import publish_cache_invalidation
+
+load_dotenv()
+
+ANIME_SAMPLER_PREFIX = "anime_sampler"
+# Сколько секунд массив id живет в памяти воркера
+ANIME_SAMPLER_TTL = float(os.getenv("ANIME_SAMPLER_TTL", "600"))
+
+_load_lock = asyncio.Lock()
+
+
+def _sampler_key(anime_type: str | None, year: int | None) -> str:
+    return f"{ANIME_SAMPLER_PREFIX}:{anime_type or '*'}:{year or '*'}"
+
+
+async def _load_anime_ids(anime_type: str | None, year: int | None, session: AsyncSession) -> array:
+    """Прочитать id аниме под фильтр (только колонка id)"""
+    query = select(AnimeModel.id)
+    if anime_type:
+        query = query.where(AnimeModel.type == anime_type)
+    if year:
+        query = query.where(AnimeModel.year == year)
+    return array('q', (await session.execute(query)).scalars().all())
+
+
+async def get_anime_ids(anime_type: str | None, year: int | None, session: AsyncSession) -> array:
+    """
+    Получить массив id аниме под фильтр из памяти воркера
+
+    Промах (первый запрос, истек TTL, инвалидация) перечитывает массив;
+    конкурентные промахи ждут одну загрузку.
+    """
+    key = _sampler_key(anime_type, year)
+    found, anime_ids = local_cache.get(key)
+    if found:
+        return anime_ids
+    async with _load_lock:
+        found, anime_ids = local_cache.get(key)
+        if found:
+            return anime_ids
+        anime_ids = await _load_anime_ids(anime_type, year, session)
+        local_cache.set(key, anime_ids, ANIME_SAMPLER_TTL, anime_ids.itemsize * len(anime_ids))
+        return anime_ids
+
+
+async def sample_anime_ids(limit: int, session: AsyncSession,
+                           anime_type: str | None = None, year: int | None = None) -> list[int]:
+    """
+    Выбрать до limit случайных различных id аниме под фильтр
+
+    Returns:
+        list[int]: id в случайном порядке (пустой, если подходящих аниме нет)
+    """
+    anime_ids = await get_anime_ids(anime_type, year, session)
+    positions = random.sample(range(len(anime_ids)), min(limit, len(anime_ids)))
+    return [anime_ids[position] for position in positions]
+
+
+async def invalidate_anime_sampler():
+    """Сбросить массивы id во всех воркерах (после добавления аниме)"""
+    await publish_cache_invalidation(f"{ANIME_SAMPLER_PREFIX}:*")
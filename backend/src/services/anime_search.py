@@ -0,0 +1,105 @@
+"""
+Поиск аниме в базе по названию
+
+Раньше поиск строил AND из ILIKE '%слово%' по title и title_original: такие
+условия не используют btree индекс и читают всю таблицу. Теперь запрос
+обслуживают GIN индексы (migrations/add_anime_search_indexes.sql):
+- search_vector @@ to_tsquery - все слова запроса (как префиксы) есть в
+  названиях или описании;
+- title % запрос, title_original % запрос (pg_trgm) - похожее название,
+  в том числе с опечаткой.
+
+Результаты ранжируются по релевантности (ts_rank + триграммное сходство),
+затем по популярности (оценка Shikimori), и отдаются страницей из колонок
+карточки.
+"""
+import os
+import re
+from dotenv import load_dotenv
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.anime import AnimeModel
+from src.utils.search_query import normalize_search_query
+
+load_dotenv()
+
+# Размер страницы поиска по умолчанию и максимальный
+ANIME_SEARCH_LIMIT = int(os.getenv("ANIME_SEARCH_LIMIT", "20"))
+ANIME_SEARCH_MAX_LIMIT = 100
+
+# Колонки карточки аниме в результатах поиска
+ANIME_SEARCH_COLUMNS = (
+    AnimeModel.id,
+    AnimeModel.title,
+    AnimeModel.title_original,
+    AnimeModel.poster_url,
+    AnimeModel.year,
+    AnimeModel.type,
+    AnimeModel.score,
+    AnimeModel.status,
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _prefix_tsquery(query: str) -> str | None:
+    """Запрос в синтаксисе to_tsquery: все слова как префиксы ("наруто:* & ураган:*")"""
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def _search_query(anime_name: str, *columns):
+    """
+    select(*columns) по найденным аниме в порядке релевантности
+
+    Returns:
+        Select | None: None, если в запросе нет ни одного слова
+    """
+    query = normalize_search_query(anime_name)
+    prefix_query = _prefix_tsquery(query)
+    if not prefix_query:
+        return None
+
+    ts_query = func.to_tsquery('simple', prefix_query)
+    relevance = func.ts_rank(AnimeModel.search_vector, ts_query) + func.greatest(
+        func.similarity(AnimeModel.title, query),
+        func.similarity(AnimeModel.title_original, query),
+    )
+    return (
+        select(*columns)
+        .where(or_(
+            AnimeModel.search_vector.op('@@')(ts_query),
+            AnimeModel.title.op('%')(query),
+            AnimeModel.title_original.op('%')(query),
+        ))
+        .order_by(relevance.desc(), AnimeModel.score.desc().nulls_last(), AnimeModel.id)
+    )
+
+
+async def search_anime_ids(anime_name: str, session: AsyncSession,
+                           limit: int = ANIME_SEARCH_LIMIT, offset: int = 0) -> list[int]:
+    """ID найденных аниме в порядке релевантности"""
+    query = _search_query(anime_name, AnimeModel.id)
+    if query is None:
+        return []
+    limit = max(1, min(limit, ANIME_SEARCH_MAX_LIMIT))
+    return list((await session.execute(query.limit(limit).offset(max(offset, 0)))).scalars().all())
+
+
+async def search_anime_cards(anime_name: str, session: AsyncSession,
+                             limit: int = ANIME_SEARCH_LIMIT, offset: int = 0) -> list[dict]:
+    """
+    Страница результатов поиска: только колонки карточки
+
+    Returns:
+        list[dict]: Карточки аниме в порядке релевантности
+    """
+    query = _search_query(anime_name, *ANIME_SEARCH_COLUMNS)
+    if query is None:
+        return []
+    limit = max(1, min(limit, ANIME_SEARCH_MAX_LIMIT))
+    rows = (await session.execute(query.limit(limit).offset(max(offset, 0)))).mappings().all()
+    return [dict(row) for row in rows]
@@ -0,0 +1,158 @@
+"""
+Словари жанров и тем (название -> id) для парсинга аниме
+
+get_or_create_genre/get_or_create_theme делали SELECT (и иногда INSERT + flush)
+на каждое название у каждого аниме, а связи добавлялись через
+anime.genres.append() по одной. Теперь:
+- воркер держит словарь название -> id, загруженный из базы один раз;
+- на промах словарь перечитывается (название мог добавить другой воркер),
+  оставшиеся названия вставляются одним INSERT ... ON CONFLICT DO NOTHING
+  RETURNING;
+- связи anime_genres/anime_themes пишутся одним INSERT на аниме
+  (link_anime_*) или на весь пакет аниме (link_*_batch).
+
+Новые жанры и темы вставляются в отдельной сессии и сразу коммитятся: откат
+транзакции парсинга не оставит в словаре id несуществующих строк.
+"""
+import asyncio
+from typing import Iterable
+from sqlalchemy import select, delete, Table
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import new_session
+from src.models.genres import GenreModel, anime_genres
+from src.models.themes import ThemeModel, anime_themes
+
+
+def taxonomy_names(items) -> list[str]:
+    """
+    Названия жанров/тем из данных парсера без повторов
+
+    Элемент - строка или словарь с ключом name/russian (Shikimori, Kodik).
+    """
+    if not isinstance(items, list):
+        return []
+    names = []
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get('name') or item.get('russian')
+        if isinstance(item, str) and item.strip() and item.strip() not in names:
+            names.append(item.strip())
+    return names
+
+
+class NameDictionary:
+    """Словарь название -> id для таблицы справочника (genres, themes)"""
+
+    def __init__(self, model):
+        self.model = model
+        self._ids: dict[str, int] = {}
+        self._lock = asyncio.Lock()
+
+    async def _reload(self, session: AsyncSession):
+        rows = (await session.execute(select(self.model.name, self.model.id))).all()
+        self._ids = {name: id_ for name, id_ in rows}
+
+    async def _insert(self, names: list[str], session: AsyncSession):
+        """Вставить названия одним запросом; добавленные конкурентно - дочитать"""
+        inserted = (await session.execute(
+            insert(self.model)
+            .values([{'name': name} for name in names])
+            .on_conflict_do_nothing(index_elements=[self.model.name])
+            .returning(self.model.name, self.model.id)
+        )).all()
+        self._ids.update({name: id_ for name, id_ in inserted})
+        missing = [name for name in names if name not in self._ids]
+        if missing:
+            rows = (await session.execute(
+                select(self.model.name, self.model.id).where(self.model.name.in_(missing))
+            )).all()
+            self._ids.update({name: id_ for name, id_ in rows})
+        await session.commit()
+
+    async def get_ids(self, names: Iterable[str]) -> list[int]:
+        """
+        id по названиям (в том же порядке); отсутствующие названия создаются
+
+        Returns:
+            list[int]: id записей справочника
+        """
+        names = list(names)
+        if all(name in self._ids for name in names):
+            return [self._ids[name] for name in names]
+        async with self._lock:
+            missing = [name for name in names if name not in self._ids]
+            if missing:
+                async with new_session() as session:
+                    await self._reload(session)
+                    missing = [name for name in missing if name not in self._ids]
+                    if missing:
+                        await self._insert(missing, session)
+        return [self._ids[name] for name in names]
+
+
+genre_dictionary = NameDictionary(GenreModel)
+theme_dictionary = NameDictionary(ThemeModel)
+
+
+async def _link(session: AsyncSession, association: Table, column: str,
+                anime_id: int, ids: list[int], replace: bool):
+    if replace:
+        stmt = delete(association).where(association.c.anime_id == anime_id)
+        if ids:
+            stmt = stmt.where(association.c[column].not_in(ids))
+        await session.execute(stmt)
+    if ids:
+        await session.execute(
+            insert(association)
+            .values([{'anime_id': anime_id, column: id_} for id_ in ids])
+            .on_conflict_do_nothing()
+        )
+
+
+async def link_anime_genres(session: AsyncSession, anime_id: int, genres, replace: bool = False):
+    """
+    Связать аниме с жанрами одним INSERT (без commit)
+
+    Args:
+        genres: Жанры из данных парсера (строки или словари)
+        replace: Удалить связи с жанрами, которых нет в списке
+    """
+    ids = await genre_dictionary.get_ids(taxonomy_names(genres))
+    await _link(session, anime_genres, 'genre_id', anime_id, ids, replace)
+
+
+async def link_anime_themes(session: AsyncSession, anime_id: int, themes, replace: bool = False):
+    """
+    Связать аниме с темами одним INSERT (без commit)
+
+    Args:
+        themes: Темы из данных парсера (строки или словари)
+        replace: Удалить связи с темами, которых нет в списке
+    """
+    ids = await theme_dictionary.get_ids(taxonomy_names(themes))
+    await _link(session, anime_themes, 'theme_id', anime_id, ids, replace)
+
+
+async def _link_batch(session: AsyncSession, dictionary: NameDictionary, association: Table,
+                      column: str, items_by_anime: dict[int, list]):
+    names_by_anime = {anime_id: taxonomy_names(items) for anime_id, items in items_by_anime.items()}
+    all_names = list(dict.fromkeys(name for names in names_by_anime.values() for name in names))
+    ids = dict(zip(all_names, await dictionary.get_ids(all_names)))
+    rows = [
+        {'anime_id': anime_id, column: ids[name]}
+        for anime_id, names in names_by_anime.items() for name in names
+    ]
+    if rows:
+        await session.execute(insert(association).values(rows).on_conflict_do_nothing())
+
+
+async def link_genres_batch(session: AsyncSession, genres_by_anime: dict[int, list]):
+    """Связать пакет аниме с жанрами одним INSERT (без commit): {anime_id: жанры}"""
+    await _link_batch(session, genre_dictionary, anime_genres, 'genre_id', genres_by_anime)
+
+
+async def link_themes_batch(session: AsyncSession, themes_by_anime: dict[int, list]):
+    """Связать пакет аниме с темами одним INSERT (без commit): {anime_id: темы}"""
+    await _link_batch(session, theme_dictionary, anime_themes, 'theme_id', themes_by_anime)
@@ -0,0 +1,168 @@
+"""
+Буферизованный счетчик просмотров аниме
+
+Просмотр детальной страницы не пишет в PostgreSQL: счетчик увеличивается
+в Redis (HINCRBY в хэше anime_views), а фоновая задача раз в
+ANIME_VIEWS_FLUSH_INTERVAL секунд забирает накопленное и применяет одним
+UPDATE на пачку аниме.
+
+Та же задача решает, пора ли обновить данные из Shikimori: аниме, у которого
+с прошлого обновления накопилось не меньше ANIME_REFRESH_MIN_VIEWS просмотров
+и данные старше ANIME_REFRESH_MIN_AGE секунд. Счетчик и last_updated
+сбрасываются в том же UPDATE, поэтому обновление запускается один раз,
+даже если задача работает в нескольких воркерах.
+
+Без Redis просмотры не учитываются (страница отдается как обычно).
+"""
+import os
+import asyncio
+from datetime import datetime, timedelta
+from loguru import logger
+from dotenv import load_dotenv
+from sqlalchemy import select, update, case, func, and_, or_, values, column, BigInteger, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import new_session
+from src.models.anime import AnimeModel
+from src.models.anime_players import AnimePlayerModel
+from src.services.redis_cache import increment_hash, drain_hash
+
+load_dotenv()
+
+ANIME_VIEWS_KEY = "anime_views"
+# Как часто накопленные просмотры сбрасываются в базу (секунды)
+ANIME_VIEWS_FLUSH_INTERVAL = float(os.getenv("ANIME_VIEWS_FLUSH_INTERVAL", "30"))
+# Сколько аниме обновляется одним UPDATE
+ANIME_VIEWS_FLUSH_BATCH = int(os.getenv("ANIME_VIEWS_FLUSH_BATCH", "500"))
+# Обновление из Shikimori: не меньше N просмотров и данные не моложе M секунд
+ANIME_REFRESH_MIN_VIEWS = int(os.getenv("ANIME_REFRESH_MIN_VIEWS", "5"))
+ANIME_REFRESH_MIN_AGE = int(os.getenv("ANIME_REFRESH_MIN_AGE", "86400"))
+
+# Фоновые обновления из Shikimori, запущенные этим воркером
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+async def record_anime_view(anime_id: int):
+    """Учесть просмотр аниме (только Redis, без записи в базу)"""
+    await increment_hash(ANIME_VIEWS_KEY, {str(anime_id): 1})
+
+
+async def _apply_views(views: dict[int, int], session: AsyncSession) -> list[int]:
+    """
+    Прибавить просмотры к request_count одним UPDATE ... FROM (VALUES ...)
+
+    Returns:
+        list[int]: ID аниме, которым пора обновиться из Shikimori
+    """
+    now = datetime.now()
+    batch = values(
+        column('anime_id', BigInteger), column('views', Integer), name='views'
+    ).data(list(views.items()))
+
+    request_count = func.coalesce(AnimeModel.request_count, 0) + batch.c.views
+    refresh_due = and_(
+        request_count >= ANIME_REFRESH_MIN_VIEWS,
+        or_(AnimeModel.last_updated.is_(None),
+            AnimeModel.last_updated < now - timedelta(seconds=ANIME_REFRESH_MIN_AGE)),
+    )
+    updated = (await session.execute(
+        update(AnimeModel)
+        .where(AnimeModel.id == batch.c.anime_id)
+        .values(
+            request_count=case((refresh_due, 0), else_=request_count),
+            last_updated=case((refresh_due, now), else_=AnimeModel.last_updated),
+        )
+        .returning(AnimeModel.id, AnimeModel.request_count)
+        .execution_options(synchronize_session=False)
+    )).all()
+    # У аниме с просмотрами счетчик обнуляется только при запуске обновления
+    return [anime_id for anime_id, count in updated if count == 0]
+
+
+def parse_shikimori_id(external_id: str | None) -> int | None:
+    """Получить shikimori_id из external_id плеера (формат "shikimori_id_player_url")"""
+    try:
+        return int(external_id.split('_')[0])
+    except (AttributeError, ValueError, IndexError):
+        return None
+
+
+async def _get_shikimori_ids(anime_ids: list[int], session: AsyncSession) -> dict[int, int]:
+    """Найти shikimori_id аниме по external_id их плееров"""
+    if not anime_ids:
+        return {}
+    players = (await session.execute(
+        select(AnimePlayerModel.anime_id, AnimePlayerModel.external_id)
+        .where(AnimePlayerModel.anime_id.in_(anime_ids))
+        .order_by(AnimePlayerModel.anime_id, AnimePlayerModel.id)
+    )).all()
+    shikimori_ids = {}
+    for anime_id, external_id in players:
+        if anime_id not in shikimori_ids:
+            shikimori_id = parse_shikimori_id(external_id)
+            if shikimori_id:
+                shikimori_ids[anime_id] = shikimori_id
+    return shikimori_ids
+
+
+async def _refresh_from_shikimori(shikimori_ids: dict[int, int]):
+    """Обновить аниме из Shikimori по очереди (не нагружая Shikimori параллельными запросами)"""
+    from src.services.animes import update_anime_data_from_shikimori
+    
+    for anime_id, shikimori_id in shikimori_ids.items():
+        try:
+            await update_anime_data_from_shikimori(anime_id, shikimori_id)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления аниме {anime_id} из Shikimori: {e}")
+
+
+async def flush_anime_views() -> int:
+    """
+    Сбросить накопленные просмотры в базу и запустить обновления из Shikimori
+
+    Если запись в базу не удалась, просмотры возвращаются в буфер.
+
+    Returns:
+        int: Количество аниме, у которых обновлен счетчик
+    """
+    pending = await drain_hash(ANIME_VIEWS_KEY)
+    if not pending:
+        return 0
+    views = {int(anime_id): count for anime_id, count in pending.items()}
+    items = list(views.items())
+
+    shikimori_ids = {}
+    try:
+        async with new_session() as session:
+            for start in range(0, len(items), ANIME_VIEWS_FLUSH_BATCH):
+                due_ids = await _apply_views(dict(items[start:start + ANIME_VIEWS_FLUSH_BATCH]), session)
+                shikimori_ids.update(await _get_shikimori_ids(due_ids, session))
+            await session.commit()
+    except Exception as e:
+        logger.error(f"❌ Не удалось сохранить просмотры аниме: {e}")
+        await increment_hash(ANIME_VIEWS_KEY, pending)
+        return 0
+
+    logger.debug(f"👁️ Сохранены просмотры {len(views)} аниме, обновление из Shikimori: {len(shikimori_ids)}")
+    if shikimori_ids:
+        task = asyncio.create_task(_refresh_from_shikimori(shikimori_ids))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return len(views)
+
+
+async def run_anime_views_flusher():
+    """
+    Периодически сбрасывать просмотры в базу
+
+    Запускается фоновой задачей при старте приложения; при остановке
+    вызывающий код делает последний flush_anime_views.
+    """
+    while True:
+        await asyncio.sleep(ANIME_VIEWS_FLUSH_INTERVAL)
+        try:
+            await flush_anime_views()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка сброса просмотров аниме: {e}")
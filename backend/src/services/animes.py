@@ -1,36 +1,44 @@
+import os
+import time
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, exists
-from datetime import datetime, timedelta
+from sqlalchemy import select, func, and_, or_, tuple_, exists
+from datetime import datetime, timedelta, timezone
 from loguru import logger
-from sqlalchemy.orm import noload
 
 # 
+from src.db.loaders import ANIME_CARD
 from src.models.anime import AnimeModel
 from src.models.users import UserModel
 from src.schemas.anime import PaginatorData
 from src.models.ratings import RatingModel
 from src.models.comments import CommentModel
-from src.services.redis_cache import redis_cached, redis_cached_limited
+from src.services.redis_cache import (redis_cached, redis_cached_limited, cache_get, cache_set,
+                                      invalidate_tags, get_anime_detail_cache_key, clear_anime_detail_cache,
+                                      get_user_cache_tag)
+from src.services.cache_metrics import observe_recompute, key_prefix
+from src.services.anime_views import record_anime_view
+from src.services.anime_sampler import sample_anime_ids
+from src.services.anime_taxonomy import link_anime_genres, link_anime_themes
+from src.services.entity_counters import (ANIME_TOTAL, ANIME_COMMENTS, ANIME_FAVORITES, get_counter,
+                                         get_entity_counters, estimate_table_rows)
+from src.utils.cursor import (encode_cursor, decode_cursor, cursor_id, cursor_score,
+                              cursor_optional_score, cursor_timestamp)
 
 
 async def update_anime_data_from_shikimori(anime_id: int, shikimori_id: int):
     '''Обновить данные аниме из Shikimori (использует новую сессию)'''
-    from src.parsers.shikimori import parser_shikimori, base_get_url, new_base_get_url, get_or_create_genre, get_or_create_theme
+    from src.parsers.shikimori import parser_shikimori, base_get_url, new_base_get_url
     from src.db.database import new_session
     from src.models.anime import AnimeModel
-    from sqlalchemy.orm import selectinload
     from sqlalchemy import select
     
     async with new_session() as session:
         try:
-            # Загружаем аниме с relationships
+            # Связи не нужны: жанры и темы пишутся напрямую в anime_genres/anime_themes
             anime = (await session.execute(
                 select(AnimeModel)
-                    .options(
-                        selectinload(AnimeModel.genres),
-                        selectinload(AnimeModel.themes),
-                    )
+                    .options(*ANIME_CARD)
                     .filter_by(id=anime_id)
             )).scalar_one_or_none()
             
@@ -81,21 +89,15 @@ async def update_anime_data_from_shikimori(anime_id: int, shikimori_id: int):
             anime.last_updated = datetime.now()
             anime.request_count = 0  # Сбрасываем счетчик после обновления
             
-            # Обновляем жанры
+            # Обновляем жанры и темы (по одному INSERT на таблицу связей)
             if anime_data.get("genres"):
-                anime.genres.clear()
-                for genre_name in anime_data["genres"]:
-                    genre = await get_or_create_genre(session, genre_name)
-                    anime.genres.append(genre)
-            
-            # Обновляем темы
+                await link_anime_genres(session, anime.id, anime_data["genres"], replace=True)
             if anime_data.get("themes"):
-                anime.themes.clear()
-                for theme_name in anime_data["themes"]:
-                    theme = await get_or_create_theme(session, theme_name)
-                    anime.themes.append(theme)
+                await link_anime_themes(session, anime.id, anime_data["themes"], replace=True)
             
             await session.commit()
+            # Сбрасываем страницу аниме и карточки в лентах
+            await invalidate_tags(get_anime_detail_cache_key(anime_id))
             return True
         except Exception as e:
             logger.error(f"Ошибка при обновлении данных аниме {anime_id}: {e}", exc_info=True)
@@ -103,83 +105,188 @@ async def update_anime_data_from_shikimori(anime_id: int, shikimori_id: int):
             return False
 
 
-async def get_anime_in_db_by_id(anime_id: int, session: AsyncSession, background_tasks=None):
-    '''Поиск аниме в базе по id с загрузкой relationships и обновлением данных каждые 5 запросов'''
+# Детальная страница аниме кэшируется целиком (метаданные, жанры, плееры, первая страница комментариев)
+ANIME_DETAIL_CACHE_TTL = int(os.getenv("ANIME_DETAIL_CACHE_TTL", "600"))
+# Сколько последних комментариев отдается вместе со страницей аниме (остальные - через /anime/comment/paginator)
+ANIME_DETAIL_COMMENTS_LIMIT = int(os.getenv("ANIME_DETAIL_COMMENTS_LIMIT", "50"))
 
-    from sqlalchemy.orm import selectinload
-    from src.models.comments import CommentModel
-    from src.models.users import UserModel
-    
-    try:
-        anime = (await session.execute(
-            select(AnimeModel)
-                .options(
-                    selectinload(AnimeModel.players),
-                    selectinload(AnimeModel.genres),
-                    selectinload(AnimeModel.comments).selectinload(CommentModel.user).selectinload(UserModel.profile_settings),  # Загружаем пользователя и его profile_settings для комментариев
-                )
-                .filter_by(id=anime_id)
-            )).scalar_one_or_none()
-        
-        if anime:
-            # Сохраняем информацию о relationships ДО коммита
-            players_count = len(anime.players) if anime.players else 0
-            genres_count = len(anime.genres) if anime.genres else 0
-            comments_count = len(anime.comments) if anime.comments else 0
-            
-            # Сортируем комментарии от новых к старым ПЕРЕД любыми изменениями
-            if anime.comments:
-                anime.comments.sort(key=lambda c: c.created_at if c.created_at else datetime.min, reverse=True)
-            
-            # Увеличиваем счетчик запросов
-            anime.request_count = (anime.request_count or 0) + 1
-            
-            # Проверяем, нужно ли обновлять данные (каждые 5 запросов)
-            should_update = anime.request_count >= 5
-            shikimori_id = None
-            
-            if should_update:
-                # Получаем shikimori_id из external_id первого плеера ДО коммита
-                if anime.players:
-                    for player_link in anime.players:
-                        if player_link.external_id:
-                            # external_id имеет формат "shikimori_id_player_url"
-                            try:
-                                shikimori_id = int(player_link.external_id.split('_')[0])
-                                break
-                            except (ValueError, IndexError):
-                                continue
-                
-                if shikimori_id:
-                    # Сбрасываем счетчик перед запуском обновления
-                    anime.request_count = 0
-                else:
-                    logger.warning(f"⚠️ Не удалось найти shikimori_id для аниме {anime_id}")
-                    # Сбрасываем счетчик, чтобы не накапливать запросы
-                    anime.request_count = 0
-            
-            # Сохраняем счетчик запросов (используем flush, commit будет в endpoint)
-            await session.flush()
-            
-            # Запускаем обновление в фоне через BackgroundTasks (если нужно)
-            if should_update and shikimori_id and background_tasks:
-                background_tasks.add_task(update_anime_data_from_shikimori, anime_id, shikimori_id)
-            
-            # Возвращаем объект БЕЗ коммита - коммит будет выполнен в endpoint после сериализации
-            # Это предотвращает проблемы с доступом к relationships после коммита
-            return anime
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
-                            detail='Аниме не найдено')
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f'Ошибка при загрузке аниме {anime_id}: {e}', exc_info=True)
-        raise HTTPException(status_code=500, detail=f'Ошибка при загрузке аниме: {str(e)}')
-
-
-@redis_cached(prefix="popular", ttl=900)  # 15 минут
-async def get_popular_anime(paginator_data: PaginatorData, session: AsyncSession):
-    '''Получить популярное аниме (все аниме из базы, отсортированные по популярности)'''
+
+def _is_premium(type_account: str, premium_expires_at: datetime | None) -> bool:
+    """Премиум есть у админов/владельцев и у пользователей с неистекшей подпиской"""
+    if type_account in ['admin', 'owner']:
+        return True
+    return bool(premium_expires_at and premium_expires_at > datetime.now(timezone.utc))
+
+
+def _refresh_comment_premium(comments: list[dict]):
+    """Пересчитать is_premium авторов комментариев из кэша (подписка могла истечь)"""
+    for comment in comments:
+        user = comment['user']
+        expires_at = user['premium_status']['expires_at']
+        user['premium_status']['is_premium'] = _is_premium(
+            user['type_account'], datetime.fromisoformat(expires_at) if expires_at else None)
+
+
+def _anime_players_query(anime_id: int):
+    '''Плееры аниме для детальной страницы'''
+    from src.models.anime_players import AnimePlayerModel
+
+    return (
+        select(AnimePlayerModel.id, AnimePlayerModel.embed_url, AnimePlayerModel.translator,
+               AnimePlayerModel.quality, AnimePlayerModel.external_id)
+        .where(AnimePlayerModel.anime_id == anime_id)
+        .order_by(AnimePlayerModel.id)
+    )
+
+
+def _anime_detail_comments_query(anime_id: int):
+    '''Первая страница комментариев детальной страницы (колонки комментария и автора)'''
+    from src.models.user_profile_settings import UserProfileSettingsModel
+
+    return (
+        select(CommentModel.id, CommentModel.text, CommentModel.created_at,
+               UserModel.id.label('user_id'), UserModel.username, UserModel.avatar_url,
+               UserModel.type_account, UserModel.premium_expires_at,
+               UserProfileSettingsModel.is_premium_profile)
+        .join(UserModel, UserModel.id == CommentModel.user_id)
+        .outerjoin(UserProfileSettingsModel, UserProfileSettingsModel.user_id == UserModel.id)
+        .where(CommentModel.anime_id == anime_id)
+        .order_by(CommentModel.created_at.desc(), CommentModel.id.desc())
+        .limit(ANIME_DETAIL_COMMENTS_LIMIT)
+    )
+
+
+async def _build_anime_detail(anime_id: int, session: AsyncSession) -> dict | None:
+    """
+    Собрать документ детальной страницы аниме
+
+    Запросы выбирают только нужные колонки (без загрузки ORM объектов и их
+    selectin-связей), комментарии - только первая страница.
+
+    Returns:
+        dict: {'anime': данные для ответа, 'usernames': авторы комментариев}
+        или None, если аниме нет
+    """
+    from src.models.genres import GenreModel, anime_genres
+
+    anime = (await session.execute(
+        select(AnimeModel.id, AnimeModel.title, AnimeModel.title_original, AnimeModel.poster_url,
+               AnimeModel.description, AnimeModel.year, AnimeModel.type, AnimeModel.episodes_count,
+               AnimeModel.rating, AnimeModel.score, AnimeModel.studio, AnimeModel.status)
+        .where(AnimeModel.id == anime_id)
+    )).mappings().one_or_none()
+    if anime is None:
+        return None
+
+    genres = (await session.execute(
+        select(GenreModel.id, GenreModel.name)
+        .join(anime_genres, anime_genres.c.genre_id == GenreModel.id)
+        .where(anime_genres.c.anime_id == anime_id)
+    )).mappings().all()
+
+    players = (await session.execute(_anime_players_query(anime_id))).mappings().all()
+
+    comments = (await session.execute(_anime_detail_comments_query(anime_id))).mappings().all()
+
+    counters = await get_entity_counters(anime_id, (ANIME_COMMENTS, ANIME_FAVORITES), session)
+
+    return {
+        'anime': {
+            **anime,
+            'genres': [dict(genre) for genre in genres],
+            'players': [{'id': player['id'], 'embed_url': player['embed_url'],
+                         'translator': player['translator'], 'quality': player['quality']}
+                        for player in players],
+            'comments': [{
+                'id': comment['id'],
+                'text': comment['text'],
+                'created_at': comment['created_at'].isoformat() if comment['created_at'] else None,
+                'user': {
+                    'id': comment['user_id'],
+                    'username': comment['username'],
+                    'avatar_url': comment['avatar_url'],
+                    'type_account': comment['type_account'],
+                    'premium_status': {
+                        'is_premium': _is_premium(comment['type_account'], comment['premium_expires_at']),
+                        'expires_at': comment['premium_expires_at'].isoformat() if comment['premium_expires_at'] else None
+                    },
+                    'profile_settings': {
+                        'is_premium_profile': bool(comment['is_premium_profile'])
+                    }
+                }
+            } for comment in comments],
+            'comments_count': counters[ANIME_COMMENTS],
+            'favorites_count': counters[ANIME_FAVORITES],
+        },
+        'usernames': sorted({comment['username'] for comment in comments}),
+    }
+
+
+async def get_anime_detail(anime_id: int, session: AsyncSession) -> dict:
+    """
+    Получить данные детальной страницы аниме (из кэша anime:{id} или из БД)
+
+    Запрос ничего не пишет в базу: просмотр учитывается в буфере Redis
+    (см. anime_views), обновление из Shikimori запускает задача сброса просмотров.
+    Кэш сбрасывается при создании/удалении комментария и обновлении из Shikimori,
+    а также по тегам авторов комментариев (смена ника/аватара).
+
+    Raises:
+        HTTPException: 404, если аниме нет в базе
+    """
+    cache_key = get_anime_detail_cache_key(anime_id)
+    found, document = await cache_get(cache_key)
+    if found:
+        await record_anime_view(anime_id)
+        detail = document['anime']
+        _refresh_comment_premium(detail['comments'])
+        return detail
+
+    started = time.perf_counter()
+    document = await _build_anime_detail(anime_id, session)
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Аниме не найдено')
+    observe_recompute(key_prefix(cache_key), time.perf_counter() - started)
+
+    await record_anime_view(anime_id)
+    tags = [get_anime_detail_cache_key(anime_id)] + [get_user_cache_tag(username) for username in document['usernames']]
+    await cache_set(cache_key, document, ANIME_DETAIL_CACHE_TTL, tags=tags)
+    return document['anime']
+
+
+def _anime_list_query():
+    '''select(AnimeModel) для списков - без загрузки relationships'''
+    return select(AnimeModel).options(*ANIME_CARD)
+
+
+# Виды курсоров (курсор одного списка нельзя передать в другой)
+CATALOG_CURSOR = "catalog"
+POPULAR_CURSOR = "popular"
+COMMENTS_CURSOR = "comments"
+
+
+def anime_cursor(kind: str, anime) -> str:
+    '''
+    Курсор следующей страницы по последнему аниме страницы
+
+    Списки по id кодируют (id), по оценке - (score, id).
+    anime - объект AnimeModel или словарь из кэша.
+    '''
+    get = anime.get if isinstance(anime, dict) else lambda field: getattr(anime, field)
+    if kind == CATALOG_CURSOR or kind.endswith(':none'):
+        return encode_cursor(kind, get('id'))
+    return encode_cursor(kind, get('score'), get('id'))
+
+
+def catalog_cursor_kind(list_name: str, order: str) -> str:
+    '''Вид курсора списка каталога: "score:asc|desc", "studio:none|asc|desc", "genre:none|asc|desc"'''
+    if list_name == 'score':
+        return f"score:{'desc' if order.lower() == 'desc' else 'asc'}"
+    return f"{list_name}:{_catalog_order(order)}"
+
+
+def _popular_anime_query():
+    '''Популярное аниме (без сортировки и пагинации)'''
 
     # Упрощенная фильтрация: оценка >= 7.5, минимум 6 комментариев, обновлено за последние 2 недели
     
@@ -195,16 +302,7 @@ async def get_popular_anime(paginator_data: PaginatorData, session: AsyncSession
     )
     
     # Строгая фильтрация через where()
-    query = select(AnimeModel).options(
-        noload(AnimeModel.players),
-        noload(AnimeModel.episodes),
-        noload(AnimeModel.favorites),
-        noload(AnimeModel.ratings),
-        noload(AnimeModel.comments),
-        noload(AnimeModel.watch_history),
-        noload(AnimeModel.genres),
-        noload(AnimeModel.themes),
-    ).where(
+    query = _anime_list_query().where(
         and_(
             # Оценка аниме не ниже 7.5
             AnimeModel.score >= 7.5,
@@ -214,7 +312,16 @@ async def get_popular_anime(paginator_data: PaginatorData, session: AsyncSession
             AnimeModel.last_updated >= two_weeks_ago,
             AnimeModel.last_updated <= now,
         )
-    ).order_by(
+    )
+    return query
+
+
+# 15 минут + 5 минут отдаем устаревшее, 10 секунд в памяти воркера
+@redis_cached(prefix="popular", ttl=900, stale_ttl=300, local_ttl=10, tags=("feed:popular",))
+async def get_popular_anime(paginator_data: PaginatorData, session: AsyncSession):
+    '''Получить популярное аниме (все аниме из базы, отсортированные по популярности)'''
+    
+    query = _popular_anime_query().order_by(
         AnimeModel.score.desc().nulls_last(),  # Сначала по рейтингу (высокий -> низкий)
         AnimeModel.id.desc()  # Потом по ID (новые -> старые)
     ).limit(paginator_data.limit).offset(paginator_data.offset)
@@ -225,33 +332,50 @@ async def get_popular_anime(paginator_data: PaginatorData, session: AsyncSession
     return animes if animes else []
 
 
-@redis_cached_limited(prefix="anime_paginated", ttl=300, max_cache_items=18)  # 5 минут, кэшируем только первые 18 элементов
+async def get_popular_anime_after(cursor: str, limit: int, session: AsyncSession):
+    '''Следующая страница популярного аниме после курсора (score, id)'''
+    score, last_id = decode_cursor(cursor, POPULAR_CURSOR, cursor_score, cursor_id)
+    return (await session.execute(_popular_after_query(score, last_id).limit(limit))).scalars().all()
+
+
+def _popular_after_query(score, last_id: int):
+    '''Популярное аниме после курсора (score, id), без limit'''
+    # В популярном нет аниме без оценки, поэтому достаточно сравнения пар
+    return _popular_anime_query().where(
+        tuple_(AnimeModel.score, AnimeModel.id) < tuple_(score, last_id)
+    ).order_by(
+        AnimeModel.score.desc().nulls_last(),
+        AnimeModel.id.desc()
+    )
+
+
+# 5 минут, все страницы из блоков по 100 id, 10 секунд в памяти воркера
+@redis_cached_limited(prefix="anime_paginated", ttl=300, block_size=100, local_ttl=10,
+                      tags=("feed:catalog",))
 async def pagination_get_anime(paginator_data: PaginatorData, session: AsyncSession):
     '''Получить конкретное количество аниме (Пагинация, без фильтров)'''
     
     # Не загружаем relationships для списка, чтобы избежать проблем с сериализацией
-    from sqlalchemy.orm import noload
-    
-    query = select(AnimeModel).options(
-        noload(AnimeModel.players),
-        noload(AnimeModel.episodes),
-        noload(AnimeModel.favorites),
-        noload(AnimeModel.ratings),
-        noload(AnimeModel.comments),
-        noload(AnimeModel.watch_history),
-        noload(AnimeModel.genres),
-        noload(AnimeModel.themes),
+    query = _anime_list_query().order_by(
+        AnimeModel.id  # Стабильный порядок нужен для кэширования страниц блоками
     ).limit(paginator_data.limit).offset(paginator_data.offset)
     animes = (await session.execute(query)).scalars().all()
 
     return animes
+
+
+async def pagination_get_anime_after(cursor: str, limit: int, session: AsyncSession):
+    '''Следующая страница каталога после курсора (id)'''
+    last_id, = decode_cursor(cursor, CATALOG_CURSOR, cursor_id)
+    query = _id_after_query(_anime_list_query(), last_id).limit(limit)
+    return (await session.execute(query)).scalars().all()
     
 
 async def get_anime_by_id(anime_id: int, session: AsyncSession):
     '''Получить аниме в базе по ID'''
     
     anime = (await session.execute(
-        select(AnimeModel).filter_by(id=anime_id)
+        select(AnimeModel).options(*ANIME_CARD).filter_by(id=anime_id)
     )).scalar_one_or_none()
     
     if anime:
@@ -262,36 +386,45 @@ async def get_anime_by_id(anime_id: int, session: AsyncSession):
     )
 
 
-async def get_random_anime(limit: int = 3, session: AsyncSession = None):
-    '''Получить случайные аниме'''
-    from sqlalchemy.orm import noload
+async def get_random_anime(limit: int = 3, session: AsyncSession = None,
+                           anime_type: str | None = None, year: int | None = None):
+    '''Получить случайные аниме (опционально - заданного типа и года)
+
+    id выбираются из массива в памяти воркера (см. anime_sampler),
+    из базы загружаются только выбранные строки по первичному ключу.
+    '''
+    anime_ids = await sample_anime_ids(limit, session, anime_type, year)
+    if not anime_ids:
+        return []
     
-    # Используем func.random() для PostgreSQL
     animes = (await session.execute(
-        select(AnimeModel)
-            .options(
-                noload(AnimeModel.players),
-                noload(AnimeModel.episodes),
-                noload(AnimeModel.favorites),
-                noload(AnimeModel.ratings),
-                noload(AnimeModel.comments),
-                noload(AnimeModel.watch_history),
-                noload(AnimeModel.genres),
-                noload(AnimeModel.themes),
-            )
-            .order_by(func.random())
-            .limit(limit)
+        _anime_list_query().where(AnimeModel.id.in_(anime_ids))
     )).scalars().all()
-    
-    return animes if animes else []
+    # Сохраняем случайный порядок выборки
+    position = {anime_id: index for index, anime_id in enumerate(anime_ids)}
+    return sorted(animes, key=lambda anime: position[anime.id])
 
 
-@redis_cached(prefix="anime_count", ttl=1800)  # 30 минут
-async def get_anime_total_count(session: AsyncSession):
-    '''Получить общее количество аниме в базе'''
-    count = (await session.execute(
-        select(func.count(AnimeModel.id))
-    )).scalar()
+@redis_cached(prefix="anime_count", ttl=300, stale_ttl=300, local_ttl=60)  # 5 минут + 5 минут отдаем устаревшее, минута в памяти воркера
+async def get_anime_total_count(session: AsyncSession, exact: bool = True):
+    '''
+    Получить общее количество аниме в базе
+
+    Args:
+        exact: True - счетчик anime_total (entity_counters), False - оценка
+            планировщика pg_class.reltuples (может отставать до autovacuum)
+    '''
+    if not exact:
+        count = await estimate_table_rows(AnimeModel.__tablename__, session)
+        if count is not None:
+            return count
+    count = await get_counter(ANIME_TOTAL, session)
+    if count is None:
+        # Счетчик еще не создан миграцией create_entity_counters.sql
+        logger.warning("⚠️ Нет счетчика anime_total, считаем аниме через COUNT")
+        count = (await session.execute(
+            select(func.count(AnimeModel.id))
+        )).scalar()
     
     return count if count else 0
 
@@ -309,17 +442,53 @@ async def comments_paginator(limit: int, offset: int,
                 selectinload(CommentModel.user).selectinload(UserModel.profile_settings)  # Загружаем пользователя и его profile_settings для каждого комментария
             )
             .where(CommentModel.anime_id == anime_id)
-            .order_by(CommentModel.created_at.desc())  # Сортируем от новых к старым
+            .order_by(CommentModel.created_at.desc(), CommentModel.id.desc())  # Сортируем от новых к старым
             .limit(limit)
             .offset(offset)
     )).scalars().all()
     
     return comments if comments else []
 
+
+async def comments_paginator_after(cursor: str, limit: int,
+                                   anime_id: int, session: AsyncSession):
+    '''Следующая страница комментариев после курсора (created_at, id)'''
+    from sqlalchemy.orm import selectinload
+    from src.models.users import UserModel
+    
+    created_at, last_id = decode_cursor(cursor, COMMENTS_CURSOR, cursor_timestamp, cursor_id)
+    
+    comments = (await session.execute(
+        _comments_after_query(anime_id, created_at, last_id)
+            .options(
+                selectinload(CommentModel.user).selectinload(UserModel.profile_settings)
+            )
+            .limit(limit)
+    )).scalars().all()
+    
+    return comments
+
+
+def _comments_after_query(anime_id: int, created_at: datetime, last_id: int):
+    '''Комментарии аниме после курсора (created_at, id), от новых к старым, без limit'''
+    return (
+        select(CommentModel)
+        .where(
+            CommentModel.anime_id == anime_id,
+            tuple_(CommentModel.created_at, CommentModel.id) < tuple_(created_at, last_id)
+        )
+        .order_by(CommentModel.created_at.desc(), CommentModel.id.desc())
+    )
+
+
+def comment_cursor(comment) -> str:
+    '''Курсор следующей страницы комментариев по последнему комментарию страницы'''
+    return encode_cursor(COMMENTS_CURSOR, comment.created_at.isoformat(), comment.id)
+
 async def sort_anime_by_rating(score: int | float, limit: int, 
                                offset: int, session: AsyncSession):
     sorted_animes = (await session.execute(
-        select(AnimeModel)
+        _anime_list_query()
         .where(AnimeModel.score >= score)
         .order_by(AnimeModel.score.asc())
         .limit(limit)
@@ -328,7 +497,7 @@ async def sort_anime_by_rating(score: int | float, limit: int,
     return sorted_animes if sorted_animes else []
 
 
-@redis_cached_limited(prefix="anime_by_score", ttl=300, max_cache_items=18)  # 5 минут, кэшируем только первые 18 элементов
+@redis_cached_limited(prefix="anime_by_score", ttl=300, block_size=100, tags=("feed:score",))  # 5 минут, все страницы из блоков по 100 id
 async def get_anime_sorted_by_score(limit: int, offset: int, 
                                      order: str = 'asc', session: AsyncSession = None):
     '''Получить все аниме отсортированные по оценке (score)
@@ -336,31 +505,22 @@ async def get_anime_sorted_by_score(limit: int, offset: int,
            'desc' - по убыванию (от высокой к низкой)
     '''
     
-    query = select(AnimeModel).options(
-        noload(AnimeModel.players),
-        noload(AnimeModel.episodes),
-        noload(AnimeModel.favorites),
-        noload(AnimeModel.ratings),
-        noload(AnimeModel.comments),
-        noload(AnimeModel.watch_history),
-        noload(AnimeModel.genres),
-        noload(AnimeModel.themes),
-    )
-    
-    # Сортируем по score
-    if order.lower() == 'desc':
-        # По убыванию (высокая → низкая), NULL значения в конце
-        query = query.order_by(AnimeModel.score.desc().nullslast())
-    else:
-        # По возрастанию (низкая → высокая), NULL значения в конце
-        query = query.order_by(AnimeModel.score.asc().nullslast())
-    
+    # Сортируем по score (id - дополнительный ключ: стабильный порядок для кэширования блоками)
+    query = _order_by_score(_anime_list_query(), 'desc' if order.lower() == 'desc' else 'asc')
     query = query.limit(limit).offset(offset)
     
     animes = (await session.execute(query)).scalars().all()
     return animes if animes else []
 
 
+async def get_anime_sorted_by_score_after(cursor: str, limit: int,
+                                          order: str = 'asc', session: AsyncSession = None):
+    '''Следующая страница аниме по оценке после курсора (score, id)'''
+    kind = catalog_cursor_kind('score', order)
+    return await _fetch_after_cursor(_anime_list_query(), kind, kind.split(':')[1], cursor, limit, session)
+
+
+@redis_cached_limited(prefix="anime_by_studio", ttl=600, block_size=100, tags=("feed:catalog",))  # 10 минут, все страницы из блоков по 100 id
 async def get_anime_sorted_by_studio(studio_name: str, limit: int = 12, 
                                      offset: int = 0, order: str = 'none', session: AsyncSession = None):
     '''Получить все аниме от конкретной студии
@@ -368,27 +528,8 @@ async def get_anime_sorted_by_studio(studio_name: str, limit: int = 12,
            'asc' - по оценке по возрастанию (низкая → высокая)
            'desc' - по оценке по убыванию (высокая → низкая)
     '''
-    query = select(AnimeModel).options(
-        noload(AnimeModel.players),
-        noload(AnimeModel.episodes),
-        noload(AnimeModel.favorites),
-        noload(AnimeModel.ratings),
-        noload(AnimeModel.comments),
-        noload(AnimeModel.watch_history),
-        noload(AnimeModel.genres),
-        noload(AnimeModel.themes),
-    )
-    # Используем ilike для регистронезависимого поиска
-    from sqlalchemy import func
-    query = query.where(func.lower(AnimeModel.studio) == func.lower(studio_name))
-    
-    # Применяем сортировку по оценке если нужно
-    if order.lower() == 'desc':
-        # По убыванию (высокая → низкая), NULL значения в конце
-        query = query.order_by(AnimeModel.score.desc().nullslast())
-    elif order.lower() == 'asc':
-        # По возрастанию (низкая → высокая), NULL значения в конце
-        query = query.order_by(AnimeModel.score.asc().nullslast())
+    # Применяем сортировку по оценке если нужно (id - стабильный порядок для кэширования блоками)
+    query = _order_by_score(_studio_query(studio_name), _catalog_order(order))
     
     animes = (await session.execute(
         query.limit(limit).offset(offset)
@@ -396,6 +537,20 @@ async def get_anime_sorted_by_studio(studio_name: str, limit: int = 12,
     return animes if animes else []
 
 
+async def get_anime_sorted_by_studio_after(studio_name: str, cursor: str, limit: int = 12,
+                                           order: str = 'none', session: AsyncSession = None):
+    '''Следующая страница аниме студии после курсора ((score,) id)'''
+    kind = catalog_cursor_kind('studio', order)
+    return await _fetch_after_cursor(_studio_query(studio_name), kind, kind.split(':')[1], cursor, limit, session)
+
+
+def _studio_query(studio_name: str):
+    '''Аниме студии (без сортировки и пагинации)'''
+    # Регистронезависимое сравнение (есть индекс по lower(studio))
+    return _anime_list_query().where(func.lower(AnimeModel.studio) == func.lower(studio_name))
+
+
+@redis_cached_limited(prefix="anime_by_genre", ttl=600, block_size=100, tags=("feed:catalog",))  # 10 минут, все страницы из блоков по 100 id
 async def get_anime_sorted_by_genre(genre: str, limit: int = 12, 
                                      offset: int = 0, order: str = 'none', session: AsyncSession = None):
     '''Получить все аниме по конкретному жанру
@@ -403,34 +558,129 @@ async def get_anime_sorted_by_genre(genre: str, limit: int = 12,
            'asc' - по оценке по возрастанию (низкая → высокая)
            'desc' - по оценке по убыванию (высокая → низкая)
     '''
+    # Применяем сортировку по оценке если нужно (id - стабильный порядок для кэширования блоками)
+    query = _order_by_score(_genre_query(genre), _catalog_order(order))
+    
+    animes = (await session.execute(
+        query.limit(limit).offset(offset)
+    )).scalars().all()
+    return animes if animes else []
+
+
+async def get_anime_sorted_by_genre_after(genre: str, cursor: str, limit: int = 12,
+                                          order: str = 'none', session: AsyncSession = None):
+    '''Следующая страница аниме жанра после курсора ((score,) id)'''
+    kind = catalog_cursor_kind('genre', order)
+    return await _fetch_after_cursor(_genre_query(genre), kind, kind.split(':')[1], cursor, limit, session)
+
+
+def _genre_query(genre: str):
+    '''Аниме жанра (без сортировки и пагинации)'''
     from src.models.genres import GenreModel, anime_genres
     
-    query = select(AnimeModel).options(
-        noload(AnimeModel.players),
-        noload(AnimeModel.episodes),
-        noload(AnimeModel.favorites),
-        noload(AnimeModel.ratings),
-        noload(AnimeModel.comments),
-        noload(AnimeModel.watch_history),
-        noload(AnimeModel.genres),
-        noload(AnimeModel.themes),
-    ).join(
+    return _anime_list_query().join(
         anime_genres
     ).join(
         GenreModel
     ).where(
         func.lower(GenreModel.name) == func.lower(genre)
     ).distinct()
-    
-    # Применяем сортировку по оценке если нужно
-    if order.lower() == 'desc':
+
+
+def _catalog_order(order: str) -> str:
+    '''Нормализовать order списков каталога: 'asc', 'desc' или 'none' (по id)'''
+    order = order.lower()
+    return order if order in ('asc', 'desc') else 'none'
+
+
+def _order_by_score(query, order: str):
+    '''
+    Отсортировать по оценке (NULL в конце) и id, либо только по id для order='none'
+
+    Тот же порядок использует _fetch_after_cursor, поэтому курсор, построенный
+    по странице из кэша, продолжает ее без пропусков и повторов.
+    '''
+    if order == 'desc':
         # По убыванию (высокая → низкая), NULL значения в конце
-        query = query.order_by(AnimeModel.score.desc().nullslast())
-    elif order.lower() == 'asc':
+        return query.order_by(AnimeModel.score.desc().nullslast(), AnimeModel.id)
+    if order == 'asc':
         # По возрастанию (низкая → высокая), NULL значения в конце
-        query = query.order_by(AnimeModel.score.asc().nullslast())
+        return query.order_by(AnimeModel.score.asc().nullslast(), AnimeModel.id)
+    return query.order_by(AnimeModel.id)
+
+
+async def _fetch_after_cursor(query, kind: str, order: str, cursor: str, limit: int, session: AsyncSession):
+    '''
+    Выбрать limit аниме после курсора в порядке _order_by_score
+
+    Условия подобраны под составные индексы (score, id) и (score DESC NULLS LAST, id),
+    чтобы каждая страница была диапазоном индекса. Аниме без оценки идут в конце:
+    когда аниме с оценкой на странице не хватает, добираем их отдельным запросом по id.
+    '''
+    if order == 'none':
+        last_id, = decode_cursor(cursor, kind, cursor_id)
+        return (await session.execute(
+            _id_after_query(query, last_id).limit(limit)
+        )).scalars().all()
     
-    animes = (await session.execute(
-        query.limit(limit).offset(offset)
+    score, last_id = decode_cursor(cursor, kind, cursor_optional_score, cursor_id)
+    animes = []
+    if score is not None:
+        animes = list((await session.execute(
+            _scored_after_query(query, order, score, last_id).limit(limit)
+        )).scalars().all())
+    
+    if len(animes) < limit:
+        animes += (await session.execute(
+            _unscored_after_query(query, score, last_id).limit(limit - len(animes))
+        )).scalars().all()
+    return animes
+
+
+def _id_after_query(query, last_id: int):
+    '''Аниме после курсора (id) по возрастанию id, без limit'''
+    return query.where(AnimeModel.id > last_id).order_by(AnimeModel.id)
+
+
+def _scored_after_query(query, order: str, score, last_id: int):
+    '''Аниме с оценкой после курсора (score, id) в порядке _order_by_score, без limit'''
+    if order == 'desc':
+        after = and_(AnimeModel.score <= score,
+                     or_(AnimeModel.score < score, AnimeModel.id > last_id))
+    else:
+        after = tuple_(AnimeModel.score, AnimeModel.id) > tuple_(score, last_id)
+    return _order_by_score(query.where(after), order)
+
+
+def _unscored_after_query(query, score, last_id: int):
+    '''Аниме без оценки (конец списка) по id; после курсора, если курсор уже среди них'''
+    unscored = query.where(AnimeModel.score.is_(None))
+    if score is None:
+        unscored = unscored.where(AnimeModel.id > last_id)
+    return unscored.order_by(AnimeModel.id)
+
+
+async def get_top_genres(limit: int = 10, session: AsyncSession = None) -> list[str]:
+    '''Получить названия жанров с наибольшим количеством аниме'''
+    from src.models.genres import GenreModel, anime_genres
+    
+    genres = (await session.execute(
+        select(GenreModel.name)
+        .join(anime_genres, anime_genres.c.genre_id == GenreModel.id)
+        .group_by(GenreModel.id, GenreModel.name)
+        .order_by(func.count(anime_genres.c.anime_id).desc())
+        .limit(limit)
     )).scalars().all()
-    return animes if animes else []
+    return list(genres)
+
+
+async def get_top_studios(limit: int = 10, session: AsyncSession = None) -> list[str]:
+    '''Получить названия студий с наибольшим количеством аниме'''
+    studios = (await session.execute(
+        select(AnimeModel.studio)
+        .where(AnimeModel.studio.is_not(None), AnimeModel.studio != '')
+        .group_by(AnimeModel.studio)
+        .order_by(func.count(AnimeModel.id).desc())
+        .limit(limit)
+    )).scalars().all()
+    return list(studios)
@@ -0,0 +1,113 @@
+"""
+Бинарный формат значений в Redis кэше
+
+Каждое значение хранится в "конверте": заголовок фиксированной длины
+и полезная нагрузка. Заголовок содержит:
+- магические байты и версию схемы (несовместимый формат отбрасывается
+  проверкой заголовка, без разбора содержимого);
+- кодировку полезной нагрузки (JSON, через orjson если установлен);
+- сжатие (zstd если установлен, иначе zlib) - только для больших значений;
+- время создания значения (мс), по которому считается возраст записи.
+"""
+import os
+import struct
+import time
+import json
+import zlib
+from typing import Any
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # orjson опционален, используем stdlib json
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard опционален, сжимаем zlib
+    zstandard = None
+
+load_dotenv()
+
+# Увеличивать при изменении формата сериализуемых данных (старые записи станут промахами)
+CACHE_SCHEMA_VERSION = 1
+
+# Значения больше порога (в байтах) сжимаются
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+
+_MAGIC = b"AG"
+# magic, версия, кодировка, сжатие, created_at (мс)
+_HEADER = struct.Struct(">2sBBBQ")
+
+ENCODING_JSON = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+class CacheFormatError(ValueError):
+    """Значение в кэше не в текущем формате или повреждено"""
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str, ensure_ascii=False).encode()
+
+
+def _loads(payload: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(bytes(payload))
+
+
+def encode_cache_value(value: Any) -> bytes:
+    """Упаковать значение в конверт"""
+    payload = _dumps(value)
+    compression = COMPRESSION_NONE
+    if len(payload) >= CACHE_COMPRESS_MIN_BYTES:
+        if _zstd_compressor is not None:
+            payload = _zstd_compressor.compress(payload)
+            compression = COMPRESSION_ZSTD
+        else:
+            payload = zlib.compress(payload, 6)
+            compression = COMPRESSION_ZLIB
+    header = _HEADER.pack(_MAGIC, CACHE_SCHEMA_VERSION, ENCODING_JSON, compression, int(time.time() * 1000))
+    return header + payload
+
+
+def decode_cache_value(data: bytes) -> tuple[Any, float]:
+    """
+    Распаковать значение из конверта
+
+    Returns:
+        tuple: (значение, время создания в секундах unix time)
+
+    Raises:
+        CacheFormatError: Заголовок не совпадает с текущим форматом или данные повреждены
+    """
+    if len(data) < _HEADER.size:
+        raise CacheFormatError("значение короче заголовка")
+    magic, version, encoding, compression, created_at_ms = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != CACHE_SCHEMA_VERSION or encoding != ENCODING_JSON:
+        raise CacheFormatError(f"неподдерживаемый формат (version={version}, encoding={encoding})")
+
+    payload = memoryview(data)[_HEADER.size:]
+    try:
+        if compression == COMPRESSION_ZSTD:
+            if _zstd_decompressor is None:
+                raise CacheFormatError("zstandard не установлен")
+            payload = _zstd_decompressor.decompress(payload)
+        elif compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression != COMPRESSION_NONE:
+            raise CacheFormatError(f"неизвестное сжатие {compression}")
+        return _loads(payload), created_at_ms / 1000
+    except CacheFormatError:
+        raise
+    except Exception as e:
+        raise CacheFormatError(str(e)) from e
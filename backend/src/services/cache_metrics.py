@@ -0,0 +1,214 @@
+"""
+Метрики Redis кэша по префиксам ключей
+
+Метрики живут в памяти воркера и нужны, чтобы подбирать TTL и размеры
+кэшируемых страниц для каждого префикса:
+- результаты обращений (local_hit/hit/stale/miss);
+- время пересчета значения при промахе (гистограмма);
+- размер сохраняемых значений в байтах (гистограмма);
+- количество инвалидированных ключей.
+
+Отдельно учитываются состояние и переходы circuit breaker'ов (см. redis_breaker).
+
+Префикс - часть ключа до первого двоеточия ("anime_paginated", "user_profile", ...).
+"""
+import bisect
+from collections import defaultdict
+
+# Результаты обращения к кэшу
+CACHE_LOCAL_HIT = "local_hit"  # значение из локального кэша воркера (без Redis)
+CACHE_HIT = "hit"              # свежее значение из Redis
+CACHE_STALE = "stale"          # устаревшее значение отдано сразу, обновление в фоне
+CACHE_MISS = "miss"            # значения нет, функция выполнена синхронно
+
+CACHE_OUTCOMES = (CACHE_LOCAL_HIT, CACHE_HIT, CACHE_STALE, CACHE_MISS)
+
+# Границы корзин гистограмм (верхние, включительно)
+RECOMPUTE_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как в Prometheus)"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Накопительные счетчики по корзинам: [(le, count), ...]"""
+        result = []
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            result.append((str(bound), total))
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class PrefixMetrics:
+    """Метрики одного префикса"""
+
+    def __init__(self):
+        self.outcomes = dict.fromkeys(CACHE_OUTCOMES, 0)
+        self.recompute_seconds = Histogram(RECOMPUTE_SECONDS_BUCKETS)
+        self.payload_bytes = Histogram(PAYLOAD_BYTES_BUCKETS)
+        self.invalidated_keys = 0
+
+
+_metrics: dict[str, PrefixMetrics] = defaultdict(PrefixMetrics)
+
+# Состояния circuit breaker (как в redis_breaker)
+BREAKER_STATES = ("closed", "half_open", "open")
+
+# name -> текущее состояние; (name, состояние) -> количество переходов в него
+_breaker_states: dict[str, str] = {}
+_breaker_transitions: dict[tuple[str, str], int] = defaultdict(int)
+
+
+def key_prefix(cache_key: str) -> str:
+    """Получить префикс ключа кэша"""
+    return cache_key.split(":", 1)[0]
+
+
+def record_cache_event(prefix: str, outcome: str):
+    """Учесть результат обращения к кэшу для префикса"""
+    _metrics[prefix].outcomes[outcome] += 1
+
+
+def observe_recompute(prefix: str, seconds: float):
+    """Учесть время пересчета значения (выполнения функции при промахе)"""
+    _metrics[prefix].recompute_seconds.observe(seconds)
+
+
+def observe_payload_size(prefix: str, size: int):
+    """Учесть размер сохраненного в кэш значения в байтах"""
+    _metrics[prefix].payload_bytes.observe(size)
+
+
+def record_invalidation(cache_keys: list[str]):
+    """Учесть инвалидированные ключи (по их префиксам)"""
+    for cache_key in cache_keys:
+        _metrics[key_prefix(cache_key)].invalidated_keys += 1
+
+
+def record_breaker_state(name: str, state: str):
+    """Учесть переход circuit breaker в новое состояние"""
+    if name in _breaker_states:
+        _breaker_transitions[(name, state)] += 1
+    _breaker_states[name] = state
+
+
+def get_breaker_metrics() -> dict:
+    """Состояние и количество переходов circuit breaker'ов"""
+    return {
+        name: {
+            "state": state,
+            "transitions": {s: _breaker_transitions[(name, s)] for s in BREAKER_STATES},
+        }
+        for name, state in sorted(_breaker_states.items())
+    }
+
+
+def get_cache_metrics() -> dict:
+    """
+    Получить метрики кэша по префиксам
+
+    Returns:
+        dict: {prefix: {"local_hit": .., "hit": .., "stale": .., "miss": .., "hit_ratio": ..,
+                        "recompute_seconds": {..}, "payload_bytes": {..}, "invalidated_keys": ..}}
+    """
+    result = {}
+    for prefix, metrics in sorted(_metrics.items()):
+        outcomes = metrics.outcomes
+        total = sum(outcomes.values())
+        served_from_cache = outcomes[CACHE_LOCAL_HIT] + outcomes[CACHE_HIT] + outcomes[CACHE_STALE]
+        result[prefix] = {
+            **outcomes,
+            "total": total,
+            "hit_ratio": round(served_from_cache / total, 4) if total else 0.0,
+            "recompute_seconds": metrics.recompute_seconds.to_dict(),
+            "payload_bytes": metrics.payload_bytes.to_dict(),
+            "invalidated_keys": metrics.invalidated_keys,
+        }
+    return result
+
+
+def _render_histogram(lines: list[str], name: str, prefix: str, histogram: Histogram):
+    for le, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{prefix="{prefix}",le="{le}"}} {count}')
+    lines.append(f'{name}_sum{{prefix="{prefix}"}} {histogram.sum}')
+    lines.append(f'{name}_count{{prefix="{prefix}"}} {histogram.count}')
+
+
+def render_prometheus_metrics() -> str:
+    """Метрики кэша в текстовом формате Prometheus"""
+    items = sorted(_metrics.items())
+    lines = [
+        "# HELP anigo_cache_requests_total Cache lookups by prefix and outcome.",
+        "# TYPE anigo_cache_requests_total counter",
+    ]
+    for prefix, metrics in items:
+        for outcome, count in metrics.outcomes.items():
+            lines.append(f'anigo_cache_requests_total{{prefix="{prefix}",outcome="{outcome}"}} {count}')
+
+    lines += [
+        "# HELP anigo_cache_recompute_seconds Time spent recomputing a value on a cache miss.",
+        "# TYPE anigo_cache_recompute_seconds histogram",
+    ]
+    for prefix, metrics in items:
+        _render_histogram(lines, "anigo_cache_recompute_seconds", prefix, metrics.recompute_seconds)
+
+    lines += [
+        "# HELP anigo_cache_payload_bytes Size of values written to the cache.",
+        "# TYPE anigo_cache_payload_bytes histogram",
+    ]
+    for prefix, metrics in items:
+        _render_histogram(lines, "anigo_cache_payload_bytes", prefix, metrics.payload_bytes)
+
+    lines += [
+        "# HELP anigo_cache_invalidated_keys_total Keys removed by cache invalidation.",
+        "# TYPE anigo_cache_invalidated_keys_total counter",
+    ]
+    for prefix, metrics in items:
+        lines.append(f'anigo_cache_invalidated_keys_total{{prefix="{prefix}"}} {metrics.invalidated_keys}')
+
+    lines += [
+        "# HELP anigo_circuit_breaker_state Current breaker state (1 for the active state).",
+        "# TYPE anigo_circuit_breaker_state gauge",
+    ]
+    for name, current in sorted(_breaker_states.items()):
+        for state in BREAKER_STATES:
+            lines.append(f'anigo_circuit_breaker_state{{name="{name}",state="{state}"}} {int(state == current)}')
+
+    lines += [
+        "# HELP anigo_circuit_breaker_transitions_total Breaker transitions by target state.",
+        "# TYPE anigo_circuit_breaker_transitions_total counter",
+    ]
+    for name in sorted(_breaker_states):
+        for state in BREAKER_STATES:
+            lines.append(f'anigo_circuit_breaker_transitions_total{{name="{name}",state="{state}"}} '
+                         f'{_breaker_transitions[(name, state)]}')
+
+    return "\n".join(lines) + "\n"
+
+
+def reset_cache_metrics():
+    """Сбросить метрики кэша (состояние breaker'ов сохраняется)"""
+    _metrics.clear()
+    _breaker_transitions.clear()
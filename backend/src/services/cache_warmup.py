@@ -0,0 +1,165 @@
+"""
+Прогрев кэша после старта приложения или перезапуска Redis
+
+Первые страницы главных лент считаются заранее, чтобы первые пользователи
+не пересобирали их с холодного кэша. Запросы выполняются параллельно,
+но не больше CACHE_WARMUP_CONCURRENCY одновременно (каждый в своей сессии:
+ленты читаются с реплики, если она настроена; топ коллекционеров - с основной
+базы, потому что он может начать новый цикл конкурса).
+Пока прогрев не завершен, воркер не считается готовым (/health/ready).
+"""
+import os
+import asyncio
+import time
+from typing import Awaitable, Callable
+from loguru import logger
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import new_session, read_session
+from src.schemas.anime import PaginatorData
+from src.services.animes import (get_popular_anime, get_anime_sorted_by_score, get_anime_total_count,
+                                 get_anime_sorted_by_genre, get_anime_sorted_by_studio,
+                                 get_top_genres, get_top_studios)
+from src.services.users import get_user_most_favorited_cached
+
+load_dotenv()
+
+CACHE_WARMUP_CONCURRENCY = int(os.getenv("CACHE_WARMUP_CONCURRENCY", "4"))
+# Сколько жанров и студий прогревать
+CACHE_WARMUP_TOP_N = int(os.getenv("CACHE_WARMUP_TOP_N", "10"))
+# Прогрев не должен держать воркер неготовым бесконечно
+CACHE_WARMUP_TIMEOUT = float(os.getenv("CACHE_WARMUP_TIMEOUT", "120"))
+
+# Размеры первых страниц - как их запрашивает фронтенд
+FEED_PAGE_SIZE = 12
+POPULAR_CAROUSEL_SIZE = 18
+MOST_FAVORITED_SIZE = 6
+
+_warmup_state = {
+    'ready': False,
+    'running': False,
+    'started_at': None,
+    'finished_at': None,
+    'duration_seconds': None,
+    'succeeded': 0,
+    'failed': [],
+}
+
+WarmupJob = tuple[str, Callable[[AsyncSession], Awaitable]]
+
+
+def is_cache_warm() -> bool:
+    """Завершен ли первый прогрев кэша в этом воркере"""
+    return _warmup_state['ready']
+
+
+def get_warmup_status() -> dict:
+    """Состояние прогрева кэша в этом воркере"""
+    return dict(_warmup_state)
+
+
+async def _run_jobs(jobs: list[WarmupJob], semaphore: asyncio.Semaphore,
+                   session_factory: Callable = read_session) -> list[str]:
+    """
+    Выполнить задачи прогрева с ограничением параллельности
+
+    Args:
+        session_factory: read_session (только чтение) или new_session
+
+    Returns:
+        list: Названия задач, завершившихся с ошибкой
+    """
+    async def run(name: str, job: Callable[[AsyncSession], Awaitable]):
+        async with semaphore:
+            async with session_factory() as session:
+                await job(session)
+
+    results = await asyncio.gather(*(run(name, job) for name, job in jobs), return_exceptions=True)
+    failed = []
+    for (name, _), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            logger.warning(f"⚠️ Прогрев {name} не удался: {result}")
+            failed.append(name)
+    _warmup_state['succeeded'] += len(jobs) - len(failed)
+    return failed
+
+
+def _feed_jobs() -> list[WarmupJob]:
+    """Первые страницы основных лент"""
+    return [
+        ('popular:carousel', lambda session: get_popular_anime(
+            PaginatorData(limit=POPULAR_CAROUSEL_SIZE, offset=0), session)),
+        ('popular:page', lambda session: get_popular_anime(
+            PaginatorData(limit=FEED_PAGE_SIZE, offset=0), session)),
+        ('score:asc', lambda session: get_anime_sorted_by_score(FEED_PAGE_SIZE, 0, 'asc', session)),
+        ('score:desc', lambda session: get_anime_sorted_by_score(FEED_PAGE_SIZE, 0, 'desc', session)),
+        ('anime_count', lambda session: get_anime_total_count(session, exact=True)),
+    ]
+
+
+def _leaderboard_jobs() -> list[WarmupJob]:
+    """Топ коллекционеров (может записать новый цикл конкурса - только основная база)"""
+    return [
+        ('most_favorited', lambda session: get_user_most_favorited_cached(
+            limit=MOST_FAVORITED_SIZE, offset=0, session=session)),
+    ]
+
+
+async def _catalog_jobs() -> list[WarmupJob]:
+    """Первые страницы самых больших жанров и студий"""
+    async with read_session() as session:
+        genres = await get_top_genres(CACHE_WARMUP_TOP_N, session)
+        studios = await get_top_studios(CACHE_WARMUP_TOP_N, session)
+
+    jobs = []
+    for genre in genres:
+        jobs.append((f'genre:{genre}', lambda session, genre=genre: get_anime_sorted_by_genre(
+            genre, FEED_PAGE_SIZE, 0, 'none', session)))
+    for studio in studios:
+        jobs.append((f'studio:{studio}', lambda session, studio=studio: get_anime_sorted_by_studio(
+            studio, FEED_PAGE_SIZE, 0, 'none', session)))
+    return jobs
+
+
+async def warm_up_cache(concurrency: int = CACHE_WARMUP_CONCURRENCY) -> dict:
+    """
+    Прогреть кэш главных лент
+
+    Ошибки отдельных задач не прерывают прогрев. По окончании (или по
+    таймауту) воркер помечается готовым.
+
+    Returns:
+        dict: Состояние прогрева
+    """
+    if _warmup_state['running']:
+        return get_warmup_status()
+
+    _warmup_state.update(running=True, started_at=time.time(), succeeded=0, failed=[])
+    started = time.monotonic()
+    logger.info("🔥 Прогрев кэша...")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_all():
+        failed = await _run_jobs(_feed_jobs(), semaphore)
+        failed += await _run_jobs(_leaderboard_jobs(), semaphore, new_session)
+        try:
+            failed += await _run_jobs(await _catalog_jobs(), semaphore)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось получить топ жанров и студий для прогрева: {e}")
+            failed.append('catalog')
+        _warmup_state['failed'] = failed
+
+    try:
+        await asyncio.wait_for(run_all(), timeout=CACHE_WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ Прогрев кэша не уложился в {CACHE_WARMUP_TIMEOUT} сек, продолжаем без него")
+    except Exception as e:
+        logger.error(f"❌ Ошибка прогрева кэша: {e}")
+    finally:
+        duration = round(time.monotonic() - started, 3)
+        _warmup_state.update(ready=True, running=False, finished_at=time.time(), duration_seconds=duration)
+
+    logger.info(f"✅ Прогрев кэша завершен за {duration} сек "
+                f"(успешно: {_warmup_state['succeeded']}, с ошибкой: {len(_warmup_state['failed'])})")
+    return get_warmup_status()
@@ -0,0 +1,121 @@
+"""
+Рейтинг коллекционеров (количество избранного у пользователя)
+
+Топ коллекционеров и лидер недельного цикла раньше считались запросом
+users LEFT JOIN favorites GROUP BY user ORDER BY count(*) по всем
+пользователям. Теперь счетчики лежат в Redis sorted set leaderboard:favorites
+(user_id -> количество избранного):
+- toggle_favorite и удаление тестовых данных меняют счетчик (ZINCRBY/ZREM);
+- топ-N читается за O(log n + N) без обхода пользователей;
+- пустой набор (первый запуск, сброс Redis) строится из favorites при
+  первом чтении, а фоновая сверка раз в LEADERBOARD_RECONCILE_INTERVAL секунд
+  перестраивает его целиком и исправляет расхождения;
+- перестроение читает основную базу (реплика может отставать), а приращения,
+  сделанные во время перестроения, записываются в журнал и применяются к
+  новому набору перед заменой (begin_sorted_set_rebuild).
+
+В наборе только пользователи, у которых есть избранное. Без Redis топ
+считается запросом к базе, как раньше.
+"""
+import os
+import asyncio
+from loguru import logger
+from dotenv import load_dotenv
+from sqlalchemy import select, func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.database import new_session
+from src.models.favorites import FavoriteModel
+from src.services.redis_cache import (increment_sorted_set, get_sorted_set_range,
+                                      remove_from_sorted_set, replace_sorted_set,
+                                      begin_sorted_set_rebuild, acquire_cache_marker)
+
+load_dotenv()
+
+LEADERBOARD_KEY = "leaderboard:favorites"
+# Как часто набор перестраивается из favorites (секунды)
+LEADERBOARD_RECONCILE_INTERVAL = int(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "3600"))
+# Сколько живет журнал приращений одного перестроения (секунды): перестроение
+# дольше этого отбрасывается, текущий набор остается
+LEADERBOARD_REBUILD_TIMEOUT = 300
+
+
+def _favorites_counts_query():
+    """Количество избранного по пользователям, по убыванию"""
+    favorites_count = func.count(FavoriteModel.id)
+    return (
+        select(FavoriteModel.user_id, favorites_count)
+        .group_by(FavoriteModel.user_id)
+        .order_by(desc(favorites_count), FavoriteModel.user_id)
+    )
+
+
+async def rebuild_leaderboard() -> int:
+    """
+    Перестроить рейтинг из таблицы favorites основной базы
+
+    Журнал заводится до чтения базы: ZINCRBY из toggle_favorite, сделанные
+    после чтения, применяются к новому набору, а не затираются им.
+
+    Returns:
+        int: Количество пользователей в рейтинге
+    """
+    journal_key = await begin_sorted_set_rebuild(LEADERBOARD_KEY, LEADERBOARD_REBUILD_TIMEOUT)
+    if journal_key is None:
+        return 0
+    async with new_session() as session:
+        rows = (await session.execute(_favorites_counts_query())).all()
+    await replace_sorted_set(LEADERBOARD_KEY, {str(user_id): amount for user_id, amount in rows}, journal_key)
+    return len(rows)
+
+
+async def change_favorites_count(user_id: int, amount: int):
+    """Изменить счетчик избранного пользователя (после коммита в базу)"""
+    await increment_sorted_set(LEADERBOARD_KEY, str(user_id), amount)
+
+
+async def remove_from_leaderboard(*user_ids: int):
+    """Убрать пользователей из рейтинга (удаленные пользователи)"""
+    await remove_from_sorted_set(LEADERBOARD_KEY, *(str(user_id) for user_id in user_ids))
+
+
+async def get_top_collectors(limit: int, offset: int, session: AsyncSession) -> list[tuple[int, int]]:
+    """
+    Топ коллекционеров: [(user_id, количество избранного)] по убыванию
+
+    Набор, которого еще нет в Redis, строится из favorites. Без Redis -
+    GROUP BY по favorites.
+    """
+    stop = offset + limit - 1
+    top = await get_sorted_set_range(LEADERBOARD_KEY, offset, stop)
+    if top is None:
+        await rebuild_leaderboard()
+        top = await get_sorted_set_range(LEADERBOARD_KEY, offset, stop)
+    if top is None:
+        rows = (await session.execute(_favorites_counts_query().limit(limit).offset(offset))).all()
+        return [(user_id, amount) for user_id, amount in rows]
+    return [(int(user_id), amount) for user_id, amount in top]
+
+
+async def reconcile_leaderboard():
+    """Перестроить рейтинг из базы (не чаще раза за интервал на все воркеры)"""
+    if not await acquire_cache_marker(f"{LEADERBOARD_KEY}:reconcile", LEADERBOARD_RECONCILE_INTERVAL):
+        return
+    users_count = await rebuild_leaderboard()
+    logger.debug(f"🏆 Рейтинг коллекционеров перестроен: {users_count} пользователей")
+
+
+async def run_leaderboard_reconciler():
+    """
+    Периодически сверять рейтинг с таблицей favorites
+
+    Запускается фоновой задачей при старте приложения.
+    """
+    while True:
+        try:
+            await reconcile_leaderboard()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка сверки рейтинга коллекционеров: {e}")
+        await asyncio.sleep(LEADERBOARD_RECONCILE_INTERVAL)
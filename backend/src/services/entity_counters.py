@@ -0,0 +1,129 @@
+"""
+Счетчики каталога (таблица entity_counters)
+
+Общее число аниме считалось SELECT count(anime.id) - полным проходом по
+таблице, который дорожает с ростом каталога, а число комментариев на
+странице аниме - COUNT по comments. Теперь счетчики хранятся строками
+(название, id сущности) и читаются по первичному ключу:
+- ANIME_TOTAL - число аниме в каталоге (entity_id = 0);
+- ANIME_COMMENTS, ANIME_FAVORITES - комментарии и избранное по anime_id.
+
+Пути записи вызывают change_counter/change_counters до commit, поэтому
+счетчик меняется в той же транзакции, что и сама запись. Строки создает и
+сверяет migrations/create_entity_counters.sql.
+
+Если точное число не нужно, estimate_table_rows берет оценку планировщика
+(pg_class.reltuples) без обращения к самой таблице.
+"""
+from sqlalchemy import select, update, func, text, values, column, BigInteger
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.entity_counters import EntityCounterModel
+
+
+# Названия счетчиков
+ANIME_TOTAL = 'anime_total'
+ANIME_COMMENTS = 'anime_comments'
+ANIME_FAVORITES = 'anime_favorites'
+
+# Оценка числа строк таблицы по статистике планировщика; -1 - таблицу еще
+# ни разу не анализировали (VACUUM/ANALYZE)
+TABLE_ROWS_ESTIMATE_SQL = text(
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"
+)
+
+
+async def change_counters(name: str, deltas: dict[int, int], session: AsyncSession):
+    """
+    Изменить счетчик у нескольких сущностей (в текущей транзакции, без commit)
+
+    Увеличение - одним INSERT ... ON CONFLICT DO UPDATE (строка создается при
+    первом изменении), уменьшение - одним UPDATE; счетчик не опускается ниже 0.
+    Строки обновляются в порядке entity_id, чтобы параллельные транзакции
+    не блокировали друг друга крест-накрест.
+
+    Example:
+        await change_counters(ANIME_FAVORITES, {anime_id: -1}, session)
+    """
+    deltas = {entity_id: amount for entity_id, amount in sorted(deltas.items()) if amount}
+    increments = [{'name': name, 'entity_id': entity_id, 'value': amount}
+                  for entity_id, amount in deltas.items() if amount > 0]
+    decrements = [(entity_id, amount) for entity_id, amount in deltas.items() if amount < 0]
+
+    if increments:
+        stmt = insert(EntityCounterModel).values(increments)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[EntityCounterModel.name, EntityCounterModel.entity_id],
+            set_={
+                'value': EntityCounterModel.value + stmt.excluded.value,
+                'updated_at': func.now(),
+            },
+        ))
+    if decrements:
+        amounts = values(
+            column('entity_id', BigInteger), column('amount', BigInteger), name='deltas'
+        ).data(decrements)
+        await session.execute(
+            update(EntityCounterModel)
+            .where(EntityCounterModel.name == name, EntityCounterModel.entity_id == amounts.c.entity_id)
+            .values(value=func.greatest(EntityCounterModel.value + amounts.c.amount, 0), updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def change_counter(name: str, session: AsyncSession, amount: int, entity_id: int = 0):
+    """
+    Изменить один счетчик (в текущей транзакции, без commit)
+
+    Example:
+        await change_counter(ANIME_COMMENTS, session, 1, entity_id=anime_id)
+    """
+    await change_counters(name, {entity_id: amount}, session)
+
+
+async def get_counter(name: str, session: AsyncSession, entity_id: int = 0) -> int | None:
+    """
+    Значение счетчика
+
+    Returns:
+        int | None: None, если строки счетчика нет (миграция не применялась)
+    """
+    return (await session.execute(
+        select(EntityCounterModel.value)
+        .where(EntityCounterModel.name == name, EntityCounterModel.entity_id == entity_id)
+    )).scalar_one_or_none()
+
+
+async def get_entity_counters(entity_id: int, names: tuple[str, ...], session: AsyncSession) -> dict[str, int]:
+    """
+    Несколько счетчиков одной сущности одним запросом
+
+    Returns:
+        dict: {название: значение}; 0, если строки счетчика нет
+    """
+    rows = (await session.execute(
+        select(EntityCounterModel.name, EntityCounterModel.value)
+        .where(EntityCounterModel.name.in_(names), EntityCounterModel.entity_id == entity_id)
+    )).all()
+    counters = dict.fromkeys(names, 0)
+    counters.update(rows)
+    return counters
+
+
+async def estimate_table_rows(table_name: str, session: AsyncSession) -> int | None:
+    """
+    Оценка числа строк таблицы по статистике планировщика (pg_class.reltuples)
+
+    Обновляется autovacuum/ANALYZE, поэтому может отставать от реального
+    числа строк.
+
+    Returns:
+        int | None: None, если таблицы нет или статистика еще не собрана
+    """
+    estimate = (await session.execute(
+        TABLE_ROWS_ESTIMATE_SQL, {'table_name': table_name}
+    )).scalar_one_or_none()
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
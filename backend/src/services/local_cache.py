@@ -0,0 +1,100 @@
+"""
+Локальный (в памяти воркера) LRU кэш - первый уровень перед Redis
+
+Значения хранятся уже десериализованными, поэтому попадание не требует
+ни запроса в Redis, ни json.loads. Объекты отдаются без копирования:
+вызывающий код должен считать их неизменяемыми.
+
+Размер ограничен и количеством записей, и суммарным объемом
+(объем оценивается по длине JSON из Redis).
+"""
+import os
+import time
+import fnmatch
+from collections import OrderedDict
+from typing import Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1024"))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class LocalCache:
+    """LRU кэш с TTL и ограничением по количеству записей и байтам"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # key -> (значение, размер в байтах, момент истечения по time.monotonic)
+        self._entries: OrderedDict[str, tuple[Any, int, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """
+        Получить значение
+
+        Returns:
+            tuple: (найдено ли значение, значение)
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, _, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: float, size: int):
+        """Сохранить значение, вытесняя самые старые записи при переполнении"""
+        if size > self.max_bytes:
+            # Слишком большое значение не кэшируем локально
+            self.delete(key)
+            return
+        self.delete(key)
+        self._entries[key] = (value, size, time.monotonic() + ttl)
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def delete(self, key: str):
+        """Удалить значение по ключу"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def delete_pattern(self, pattern: str) -> int:
+        """
+        Удалить значения по glob-паттерну (как в Redis SCAN MATCH)
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def clear(self):
+        """Очистить кэш"""
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def info(self) -> dict:
+        """Информация о заполненности кэша"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+local_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_MAX_BYTES)
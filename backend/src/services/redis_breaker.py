@@ -0,0 +1,121 @@
+"""
+Circuit breaker для Redis
+
+Когда Redis недоступен, каждое обращение к кэшу ждало бы таймаут подключения.
+Breaker после нескольких ошибок подряд размыкается (open): кэш пропускается
+сразу, без сетевых вызовов. По истечении паузы breaker пропускает одну пробную
+проверку (half-open): при успехе замыкается (closed), при ошибке снова
+размыкается с удвоенной паузой (до REDIS_BREAKER_MAX_BACKOFF). Проба без
+итога (задачу отменили) через REDIS_BREAKER_PROBE_TIMEOUT считается неудачной.
+"""
+import os
+import time
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.cache_metrics import record_breaker_state
+
+load_dotenv()
+
+# Сколько ошибок подряд размыкают breaker
+REDIS_BREAKER_FAILURE_THRESHOLD = int(os.getenv("REDIS_BREAKER_FAILURE_THRESHOLD", "3"))
+# Пауза перед первой пробной проверкой и ее верхняя граница (секунды)
+REDIS_BREAKER_BASE_BACKOFF = float(os.getenv("REDIS_BREAKER_BASE_BACKOFF", "1"))
+REDIS_BREAKER_MAX_BACKOFF = float(os.getenv("REDIS_BREAKER_MAX_BACKOFF", "60"))
+# Сколько ждать итога пробной проверки, прежде чем снова разомкнуть breaker (секунды)
+REDIS_BREAKER_PROBE_TIMEOUT = float(os.getenv("REDIS_BREAKER_PROBE_TIMEOUT", "5"))
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Circuit breaker с экспоненциальной паузой между пробами"""
+
+    def __init__(self, name: str, failure_threshold: int, base_backoff: float, max_backoff: float,
+                 probe_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self.opened_until = 0.0
+        self.probe_deadline = 0.0
+        record_breaker_state(name, self.state)
+
+    def allow_request(self) -> bool:
+        """
+        Можно ли обращаться к Redis
+
+        В состоянии open - только проверка времени, без сетевых вызовов.
+        Когда пауза истекла, breaker переходит в half-open и пропускает
+        ровно одного вызывающего (пробу); остальные пропускают кэш до ее итога.
+        Если итога нет дольше probe_timeout (пробу отменили до record_*),
+        проба считается неудачной - иначе breaker остался бы в half-open навсегда.
+        """
+        if self.state == BREAKER_CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == BREAKER_HALF_OPEN and now >= self.probe_deadline:
+            self.record_failure(TimeoutError("нет итога пробной проверки"))
+        if self.state == BREAKER_OPEN and now >= self.opened_until:
+            self.probe_deadline = now + self.probe_timeout
+            self._set_state(BREAKER_HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self):
+        """Учесть успешное обращение"""
+        if self.state != BREAKER_CLOSED:
+            self.backoff = self.base_backoff
+            self._set_state(BREAKER_CLOSED)
+        self.failures = 0
+
+    def record_failure(self, error: Exception | None = None):
+        """Учесть ошибку соединения"""
+        if self.state == BREAKER_OPEN:
+            return
+        if self.state == BREAKER_HALF_OPEN:
+            # Проба не удалась - следующая пауза вдвое дольше
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self._open(error)
+            return
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self._open(error)
+
+    def _open(self, error: Exception | None):
+        self.failures = 0
+        self.opened_until = time.monotonic() + self.backoff
+        self._set_state(BREAKER_OPEN)
+        logger.warning(f"⚡ {self.name}: breaker разомкнут на {self.backoff:.1f} сек ({error})")
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        logger.info(f"🔌 {self.name}: breaker {self.state} -> {state}")
+        self.state = state
+        record_breaker_state(self.name, state)
+
+    def info(self) -> dict:
+        """Состояние breaker"""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "backoff_seconds": self.backoff,
+            "retry_in_seconds": max(0.0, round(self.opened_until - time.monotonic(), 3))
+            if self.state == BREAKER_OPEN else 0.0,
+        }
+
+
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=REDIS_BREAKER_FAILURE_THRESHOLD,
+    base_backoff=REDIS_BREAKER_BASE_BACKOFF,
+    max_backoff=REDIS_BREAKER_MAX_BACKOFF,
+    probe_timeout=REDIS_BREAKER_PROBE_TIMEOUT,
+)
@@ -5,21 +5,67 @@ from loguru import logger
 import redis.asyncio as redis
 import os
 import json
+import time
+import uuid
+import asyncio
+import copy
 import functools
 import hashlib
-from typing import Any, Callable
+import inspect
+from typing import Any, Callable, Iterable
 from dotenv import load_dotenv
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.database import read_session
+from src.services.cache_metrics import (record_cache_event, get_cache_metrics, observe_recompute,
+                                        observe_payload_size, record_invalidation, key_prefix,
+                                        CACHE_HIT, CACHE_LOCAL_HIT, CACHE_STALE, CACHE_MISS)
+from src.services.local_cache import local_cache
+from src.services.redis_breaker import redis_breaker, BREAKER_CLOSED, BREAKER_HALF_OPEN
+from src.services.cache_codec import encode_cache_value, decode_cache_value, CacheFormatError
 
 load_dotenv()
 
+# Пул соединений и таймауты: запрос к кэшу не должен ждать Redis дольше, чем посчитать заново
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.5"))
+# Сколько ждать свободного соединения из пула
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "0.5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
 _redis_client: redis.Redis | None = None
+_connect_lock = asyncio.Lock()
+
+
+def _report_redis_error(error: Exception):
+    """Учесть ошибку соединения с Redis в circuit breaker (ошибки данных не учитываются)"""
+    if isinstance(error, (redis.ConnectionError, redis.TimeoutError, asyncio.TimeoutError, OSError)):
+        redis_breaker.record_failure(error)
+
 
 async def get_redis_client() -> redis.Redis | None:
-    """Получить клиент Redis"""
+    """
+    Получить клиент Redis
+    
+    Пока circuit breaker разомкнут, сразу возвращает None - кэш пропускается
+    без сетевых вызовов. Подключение (и пробная проверка после паузы)
+    выполняется одним вызывающим, остальные в это время работают без кэша.
+    """
+    if not redis_breaker.allow_request():
+        return None
+    if _redis_client is not None and redis_breaker.state == BREAKER_CLOSED:
+        return _redis_client
+    
+    async with _connect_lock:
+        return await _connect_redis()
+
+
+async def _connect_redis() -> redis.Redis | None:
+    """Создать клиент (если его еще нет) и проверить соединение"""
     global _redis_client
     
-    if _redis_client is not None:
+    if _redis_client is not None and redis_breaker.state == BREAKER_CLOSED:
         return _redis_client
     
     # Сначала проверяем REDIS_URL
@@ -43,22 +89,539 @@ async def get_redis_client() -> redis.Redis | None:
         return None
     
     try:
-        _redis_client = redis.from_url(redis_url, decode_responses=True)
+        if _redis_client is None:
+            # Бинарный клиент: значения кэша хранятся в бинарном конверте (см. cache_codec).
+            # Блокирующий пул ждет свободное соединение не дольше REDIS_POOL_TIMEOUT
+            pool = redis.BlockingConnectionPool.from_url(
+                redis_url,
+                decode_responses=False,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            )
+            _redis_client = redis.Redis(connection_pool=pool)
         await _redis_client.ping()
+        redis_breaker.record_success()
         return _redis_client
     except Exception as e:
         logger.error(f"❌ Ошибка подключения к Redis: {e}")
+        redis_breaker.record_failure(e)
         return None
+    except BaseException as e:
+        # Пробу отменили (например, asyncio.wait_for прогрева кэша): без итога
+        # breaker остался бы в half-open и не пускал бы к Redis остальных
+        if redis_breaker.state == BREAKER_HALF_OPEN:
+            redis_breaker.record_failure(e)
+        raise
 
 
 async def close_redis_client():
     """Закрыть соединение с Redis"""
     global _redis_client
     if _redis_client:
-        await _redis_client.close()
+        await _redis_client.aclose()
+        await _redis_client.connection_pool.disconnect()
         _redis_client = None
 
 
+# Канал, через который воркеры сообщают друг другу об инвалидации локального кэша
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+async def publish_cache_invalidation(*patterns: str):
+    """
+    Сбросить ключи по паттернам в локальном кэше всех воркеров
+    
+    Свой локальный кэш очищается сразу, остальные воркеры получают
+    паттерны через Redis pub/sub (см. run_cache_invalidation_listener).
+    """
+    for pattern in patterns:
+        local_cache.delete_pattern(pattern)
+    redis = await get_redis_client()
+    if not redis:
+        return
+    try:
+        await redis.publish(CACHE_INVALIDATION_CHANNEL, "\n".join(patterns))
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось опубликовать инвалидацию кэша {patterns}: {e}")
+        _report_redis_error(e)
+
+
+async def run_cache_invalidation_listener():
+    """
+    Слушать канал инвалидации и очищать локальный кэш воркера
+    
+    Запускается фоновой задачей при старте приложения. При обрыве соединения
+    локальный кэш очищается целиком (сообщения за время обрыва потеряны)
+    и подписка восстанавливается.
+    
+    Сообщения читаются с коротким таймаутом: блокирующее чтение без
+    сообщений упиралось бы в REDIS_SOCKET_TIMEOUT.
+    """
+    while True:
+        redis = await get_redis_client()
+        if not redis:
+            await asyncio.sleep(5)
+            continue
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            logger.info(f"📡 Подписка на инвалидацию кэша: {CACHE_INVALIDATION_CHANNEL}")
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    for pattern in message["data"].decode().split("\n"):
+                        local_cache.delete_pattern(pattern)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Подписка на инвалидацию кэша прервана: {e}")
+            _report_redis_error(e)
+            local_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+# Теги кэша: ключи регистрируются в множествах tag:{тег}, например
+# anime:{id}, user:{username}, feed:popular. Инвалидация по тегу не сканирует keyspace.
+CACHE_TAG_PREFIX = "tag:"
+# Множества тегов живут не меньше суток, чтобы пережить любой ключ, который в них записан
+CACHE_TAG_TTL = int(os.getenv("CACHE_TAG_TTL", "86400"))
+
+# KEYS - множества тегов (может быть пустым), ARGV - дополнительные ключи для удаления.
+# Возвращает список удаленных ключей (для очистки локального кэша воркеров)
+_INVALIDATE_TAGS_SCRIPT = """
+local keys = {}
+if #KEYS > 0 then
+    keys = redis.call('sunion', unpack(KEYS))
+end
+for i = 1, #ARGV do
+    keys[#keys + 1] = ARGV[i]
+end
+for i = 1, #keys, 500 do
+    redis.call('unlink', unpack(keys, i, math.min(i + 499, #keys)))
+end
+if #KEYS > 0 then
+    redis.call('unlink', unpack(KEYS))
+end
+return keys
+"""
+
+
+def _escape_glob(key: str) -> str:
+    """Экранировать ключ, чтобы использовать его как glob-паттерн"""
+    return "".join(f"[{char}]" if char in "*?[]" else char for char in key)
+
+
+def _register_tags(pipe, cache_key: str, tags: Iterable[str], ttl: int):
+    """Добавить в pipeline регистрацию ключа в множествах тегов"""
+    for tag in tags:
+        tag_key = f"{CACHE_TAG_PREFIX}{tag}"
+        pipe.sadd(tag_key, cache_key)
+        pipe.expire(tag_key, max(ttl, CACHE_TAG_TTL))
+
+
+async def cache_set(cache_key: str, value, ttl: int, tags: Iterable[str] = ()) -> bool:
+    """
+    Сохранить значение в кэш и зарегистрировать ключ в тегах (одним pipeline)
+    
+    Для кэшей, которые пишутся вручную (профиль, топ коллекционеров).
+    
+    Returns:
+        bool: Удалось ли сохранить значение
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return False
+    try:
+        serialized = encode_cache_value(value)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.setex(cache_key, ttl, serialized)
+            _register_tags(pipe, cache_key, tags, ttl)
+            await pipe.execute()
+        observe_payload_size(key_prefix(cache_key), len(serialized))
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to cache {cache_key}: {e}")
+        _report_redis_error(e)
+        return False
+
+
+async def cache_get(cache_key: str) -> tuple[bool, Any]:
+    """
+    Прочитать значение, сохраненное через cache_set
+    
+    Попадание или промах учитывается в метриках префикса ключа.
+    
+    Returns:
+        tuple: (найдено ли значение, значение)
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return False, None
+    found, value, _ = await _read_cache(redis, cache_key, cache_key)
+    record_cache_event(key_prefix(cache_key), CACHE_HIT if found else CACHE_MISS)
+    return found, value
+
+
+async def acquire_cache_marker(marker_key: str, ttl: int) -> bool:
+    """
+    Поставить метку на ttl секунд, если ее еще нет (SET NX EX)
+
+    Пока метка стоит, тяжелая операция (например, парсинг) не запускается
+    повторно ни на одном воркере. После успеха метка остается до конца окна
+    ttl; после сбоя ее снимают release_cache_marker, чтобы разовая ошибка не
+    блокировала операцию на все окно.
+
+    Returns:
+        bool: Метка поставлена этим вызовом. Без Redis всегда True -
+        операция выполняется как раньше, без ограничения.
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return True
+    try:
+        return bool(await redis.set(marker_key, b"1", nx=True, ex=ttl))
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось поставить метку {marker_key}: {e}")
+        _report_redis_error(e)
+        return True
+
+
+async def release_cache_marker(marker_key: str):
+    """Снять метку acquire_cache_marker (например, операция завершилась ошибкой)"""
+    redis = await get_redis_client()
+    if not redis:
+        return
+    try:
+        await redis.delete(marker_key)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось снять метку {marker_key}: {e}")
+        _report_redis_error(e)
+
+
+async def increment_hash(hash_key: str, increments: dict[str, int]) -> bool:
+    """
+    Увеличить поля хэша (HINCRBY одним pipeline)
+
+    Для счетчиков, которые копятся в Redis и периодически сбрасываются
+    в базу (см. drain_hash).
+
+    Returns:
+        bool: Удалось ли записать (без Redis - False)
+    """
+    redis = await get_redis_client()
+    if not redis or not increments:
+        return False
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for field, amount in increments.items():
+                pipe.hincrby(hash_key, field, amount)
+            await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось увеличить счетчики {hash_key}: {e}")
+        _report_redis_error(e)
+        return False
+
+
+# Атомарно забрать все поля хэша и удалить его: приращения после этого
+# попадают уже в новый хэш и не теряются между HGETALL и DEL
+_DRAIN_HASH_SCRIPT = """
+local data = redis.call('hgetall', KEYS[1])
+redis.call('del', KEYS[1])
+return data
+"""
+
+
+async def drain_hash(hash_key: str) -> dict[str, int]:
+    """
+    Забрать и удалить накопленные счетчики хэша
+
+    Returns:
+        dict: {поле: значение}; пустой, если счетчиков нет или Redis недоступен
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return {}
+    try:
+        data = await redis.eval(_DRAIN_HASH_SCRIPT, 1, hash_key)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось забрать счетчики {hash_key}: {e}")
+        _report_redis_error(e)
+        return {}
+    return {data[i].decode(): int(data[i + 1]) for i in range(0, len(data), 2)}
+
+
+# Журналы идущих перестроений sorted set (см. begin_sorted_set_rebuild): множество
+# ключей журналов в {set_key}:journals. Каждое изменение набора пишется и в
+# журналы, чтобы перестроение, прочитавшее базу раньше, не потеряло его
+_JOURNAL_CHANGE_LUA = """
+for _, journal in ipairs(redis.call('smembers', KEYS[2])) do
+    if redis.call('exists', journal) == 1 then
+        if ARGV[2] == 'remove' then
+            redis.call('hset', journal, 'rm:' .. ARGV[1], 1)
+        else
+            redis.call('hincrby', journal, ARGV[1], ARGV[2])
+        end
+    else
+        redis.call('srem', KEYS[2], journal)
+    end
+end
+"""
+
+# Приращение счетчика в существующем sorted set; счетчик <= 0 удаляется.
+# Отсутствующий набор не создается: его целиком строит replace_sorted_set
+_INCREMENT_SORTED_SET_SCRIPT = _JOURNAL_CHANGE_LUA + """
+if redis.call('exists', KEYS[1]) == 0 then
+    return false
+end
+local score = tonumber(redis.call('zincrby', KEYS[1], ARGV[2], ARGV[1]))
+if score <= 0 then
+    redis.call('zrem', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# Удаление участника (ARGV[2] = 'remove' для журналов)
+_REMOVE_FROM_SORTED_SET_SCRIPT = _JOURNAL_CHANGE_LUA + """
+redis.call('zrem', KEYS[1], ARGV[1])
+return 1
+"""
+
+# Завершение перестроения: изменения из журнала применяются к новому набору
+# (KEYS[1]), затем он атомарно заменяет текущий (KEYS[2]). Если журнал истек,
+# изменения за время перестроения неизвестны - новый набор отбрасывается
+_FINISH_SORTED_SET_REBUILD_SCRIPT = """
+if redis.call('exists', KEYS[4]) == 0 then
+    redis.call('del', KEYS[1])
+    redis.call('srem', KEYS[3], KEYS[4])
+    return 0
+end
+local entries = redis.call('hgetall', KEYS[4])
+for i = 1, #entries, 2 do
+    local field, value = entries[i], entries[i + 1]
+    if string.sub(field, 1, 3) == 'rm:' then
+        redis.call('zrem', KEYS[1], string.sub(field, 4))
+    elseif field ~= '__started' then
+        local score = tonumber(redis.call('zincrby', KEYS[1], value, field))
+        if score <= 0 then
+            redis.call('zrem', KEYS[1], field)
+        end
+    end
+end
+redis.call('del', KEYS[4])
+redis.call('srem', KEYS[3], KEYS[4])
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rename', KEYS[1], KEYS[2])
+else
+    redis.call('del', KEYS[2])
+end
+return 1
+"""
+
+# Диапазон по убыванию счетчика; false, если набора нет (нужно построить)
+_SORTED_SET_RANGE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return false
+end
+return redis.call('zrevrange', KEYS[1], ARGV[1], ARGV[2], 'withscores')
+"""
+
+
+def _sorted_set_journals_key(set_key: str) -> str:
+    return f"{set_key}:journals"
+
+
+async def increment_sorted_set(set_key: str, member: str, amount: int) -> bool:
+    """
+    Изменить счетчик участника sorted set (ZINCRBY), если набор уже построен
+
+    Приращение записывается и в журналы идущих перестроений набора.
+
+    Returns:
+        bool: Приращение применено (False - набора нет или Redis недоступен)
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return False
+    try:
+        return bool(await redis.eval(_INCREMENT_SORTED_SET_SCRIPT, 2, set_key,
+                                     _sorted_set_journals_key(set_key), member, amount))
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось изменить {set_key}: {e}")
+        _report_redis_error(e)
+        return False
+
+
+async def get_sorted_set_range(set_key: str, start: int, stop: int) -> list[tuple[str, int]] | None:
+    """
+    Участники sorted set с позиции start по stop (включительно) по убыванию счетчика
+
+    Returns:
+        list | None: [(участник, счетчик)]; None, если набор не построен или Redis недоступен
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return None
+    try:
+        data = await redis.eval(_SORTED_SET_RANGE_SCRIPT, 1, set_key, start, stop)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось прочитать {set_key}: {e}")
+        _report_redis_error(e)
+        return None
+    if data is None:
+        return None
+    return [(data[i].decode(), int(float(data[i + 1]))) for i in range(0, len(data), 2)]
+
+
+async def remove_from_sorted_set(set_key: str, *members: str) -> bool:
+    """Удалить участников из sorted set (ZREM) и из наборов идущих перестроений"""
+    redis = await get_redis_client()
+    if not redis or not members:
+        return False
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for member in members:
+                pipe.eval(_REMOVE_FROM_SORTED_SET_SCRIPT, 2, set_key,
+                          _sorted_set_journals_key(set_key), member, 'remove')
+            await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось изменить {set_key}: {e}")
+        _report_redis_error(e)
+        return False
+
+
+async def begin_sorted_set_rebuild(set_key: str, ttl: int) -> str | None:
+    """
+    Начать перестроение sorted set: завести журнал изменений
+
+    Вызывается до чтения данных из базы. Пока журнал существует (не дольше
+    ttl секунд), increment_sorted_set и remove_from_sorted_set пишут в него
+    свои изменения, а replace_sorted_set применяет их к новому набору -
+    изменения, сделанные после чтения базы, не теряются.
+
+    Returns:
+        str | None: Ключ журнала для replace_sorted_set (None без Redis)
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return None
+    journal_key = f"{set_key}:journal:{uuid.uuid4().hex}"
+    journals_key = _sorted_set_journals_key(set_key)
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(journal_key, '__started', 0)
+            pipe.expire(journal_key, ttl)
+            pipe.sadd(journals_key, journal_key)
+            pipe.expire(journals_key, ttl)
+            await pipe.execute()
+        return journal_key
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось начать перестроение {set_key}: {e}")
+        _report_redis_error(e)
+        return None
+
+
+async def replace_sorted_set(set_key: str, scores: dict[str, int], journal_key: str) -> bool:
+    """
+    Атомарно заменить sorted set целиком
+
+    Набор собирается во временном ключе, к нему применяются изменения из
+    журнала begin_sorted_set_rebuild, и он переименовывается (RENAME): читатели
+    не видят частично заполненный набор, а приращения за время перестроения
+    не теряются.
+
+    Returns:
+        bool: Удалось ли заменить (False - Redis недоступен или журнал истек)
+    """
+    redis = await get_redis_client()
+    if not redis:
+        return False
+    tmp_key = f"{set_key}:rebuild:{uuid.uuid4().hex}"
+    try:
+        if scores:
+            await redis.zadd(tmp_key, scores)
+        replaced = await redis.eval(_FINISH_SORTED_SET_REBUILD_SCRIPT, 4, tmp_key, set_key,
+                                    _sorted_set_journals_key(set_key), journal_key)
+        if not replaced:
+            logger.warning(f"⚠️ Журнал перестроения {set_key} истек, набор не заменен")
+        return bool(replaced)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось перестроить {set_key}: {e}")
+        _report_redis_error(e)
+        try:
+            await redis.delete(tmp_key)
+        except Exception:
+            pass
+        return False
+
+
+async def invalidate_tags(*tags: str, keys: Iterable[str] = ()) -> int:
+    """
+    Удалить все ключи, зарегистрированные под тегами
+    
+    SUNION множеств тегов и UNLINK ключей выполняются одним Lua скриптом
+    (один запрос в Redis, без SCAN по всему keyspace).
+    
+    Args:
+        tags: Теги, например "feed:popular" или "user:{username}"
+        keys: Дополнительные ключи, которые нужно удалить вместе с тегами
+    
+    Returns:
+        int: Количество удаленных ключей
+    """
+    keys = list(keys)
+    redis = await get_redis_client()
+    if not redis or not (tags or keys):
+        if keys:
+            await publish_cache_invalidation(*(_escape_glob(key) for key in keys))
+        return 0
+    
+    deleted_keys = []
+    try:
+        tag_keys = [f"{CACHE_TAG_PREFIX}{tag}" for tag in tags]
+        deleted_keys = [
+            key.decode() for key in
+            await redis.eval(_INVALIDATE_TAGS_SCRIPT, len(tag_keys), *tag_keys, *keys)
+        ]
+        logger.debug(f"🗑️ Invalidated {len(deleted_keys)} cache keys for tags: {', '.join(tags)}")
+    except Exception as e:
+        logger.error(f"❌ Failed to invalidate cache tags {tags}: {e}")
+        _report_redis_error(e)
+        deleted_keys = keys
+    
+    record_invalidation(deleted_keys)
+    if deleted_keys:
+        await publish_cache_invalidation(*(_escape_glob(key) for key in deleted_keys))
+    return len(deleted_keys)
+
+
+def _resolve_tags(tags: Iterable[str], signature: inspect.Signature, args: tuple, kwargs: dict) -> tuple[str, ...]:
+    """
+    Подставить аргументы вызова в шаблоны тегов
+    
+    Шаблоны - обычные format-строки по именам параметров функции,
+    например "anime:{anime_id}" или "user:{username}".
+    """
+    if not tags:
+        return ()
+    try:
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        return tuple(tag.format(**bound.arguments) for tag in tags)
+    except (TypeError, KeyError, AttributeError, IndexError) as e:
+        logger.warning(f"⚠️ Не удалось вычислить теги кэша {tags}: {e}")
+        return ()
+
+
 async def clear_cache_pattern(pattern: str):
     """Очистить кэш по паттерну"""
     redis = await get_redis_client()
@@ -70,8 +633,10 @@ async def clear_cache_pattern(pattern: str):
             
             if keys:
                 await redis.delete(*keys)
+                record_invalidation([key.decode() for key in keys])
         except Exception as e:
             logger.error(f"Failed to clear cache pattern {pattern}: {e}")
+    await publish_cache_invalidation(pattern)
 
 
 async def clear_all_cache():
@@ -82,6 +647,7 @@ async def clear_all_cache():
             await redis.flushdb()
         except Exception as e:
             logger.error(f"Failed to clear all cache: {e}")
+    await publish_cache_invalidation("*")
 
 
 async def get_cache_info() -> dict:
@@ -97,18 +663,25 @@ async def get_cache_info() -> dict:
                 "memory_used": info.get("used_memory_human", "N/A"),
                 "keyspace_hits": info.get("keyspace_hits", 0),
                 "keyspace_misses": info.get("keyspace_misses", 0),
+                "prefixes": get_cache_metrics(),
+                "local": local_cache.info(),
+                "breaker": redis_breaker.info(),
             }
         except Exception as e:
             logger.error(f"Failed to get cache info: {e}")
-            return {"connected": False, "error": str(e)}
+            _report_redis_error(e)
+            return {"connected": False, "error": str(e), "breaker": redis_breaker.info()}
 
-    return {"connected": False, "error": "Redis client not initialized"}
+    return {"connected": False, "error": "Redis client not available", "breaker": redis_breaker.info()}
 
 
 async def clear_user_profile_cache(username: str, user_id: int = None):
     """
     Очистить кэш профиля пользователя
     
+    Удаляет все ключи с тегом user:{username} и сам ключ профиля
+    (на случай записей, сохраненных без тега).
+    
     Args:
         username: Имя пользователя
         user_id: ID пользователя (опционально, для дополнительной очистки)
@@ -116,54 +689,56 @@ async def clear_user_profile_cache(username: str, user_id: int = None):
     Returns:
         int: Количество удаленных ключей кэша
     """
-    redis = await get_redis_client()
-    if not redis:
-        return 0
-    
     try:
-        total_deleted = 0
-        
-        # Очищаем основной кэш профиля по username (точный ключ)
-        cache_key = get_user_profile_cache_key(username)
-        deleted = await redis.delete(cache_key)
-        if deleted:
-            total_deleted += deleted
-            logger.debug(f"🗑️ Cleared profile cache for user: {username} (key: {cache_key})")
-        
-        # Также очищаем кэш по паттерну (на случай других ключей)
-        pattern_username = f"user_profile:*{username}*"
-        keys_username = []
-        async for key in redis.scan_iter(match=pattern_username):
-            if key != cache_key:  # Уже удалили основной ключ
-                keys_username.append(key)
-        
-        if keys_username:
-            deleted_count = await redis.delete(*keys_username)
-            total_deleted += deleted_count
-        
-        # Также очищаем кэш настроек профиля
-        settings_pattern = f"user_profile_settings:*{username}*"
-        keys_settings = []
-        async for key in redis.scan_iter(match=settings_pattern):
-            keys_settings.append(key)
-        
-        if keys_settings:
-            deleted_count = await redis.delete(*keys_settings)
-            total_deleted += deleted_count
-            logger.debug(f"🗑️ Cleared {deleted_count} settings cache keys for user: {username}")
-        
-        if total_deleted > 0:
-            logger.info(f"✅ Cleared {total_deleted} cache keys for user: {username}")
-        else:
-            logger.debug(f"ℹ️ No cache keys found to clear for user: {username}")
-        
+        total_deleted = await invalidate_tags(
+            get_user_cache_tag(username), keys=[get_user_profile_cache_key(username)]
+        )
+        logger.debug(f"🗑️ Cleared profile cache for user: {username}")
         return total_deleted
-                
     except Exception as e:
         logger.error(f"❌ Failed to clear user profile cache for {username}: {e}")
         return 0
 
 
+def get_user_cache_tag(username: str) -> str:
+    """Получить тег кэша для данных пользователя"""
+    return f"user:{username}"
+
+
+MOST_FAVORITED_CACHE_TAG = "feed:most_favorited"
+
+
+def get_anime_detail_cache_key(anime_id: int) -> str:
+    """
+    Получить ключ кэша детальной страницы аниме
+    
+    Тем же значением называется тег аниме: под ним зарегистрированы
+    страница и карточки аниме в лентах.
+    """
+    return f"anime:{anime_id}"
+
+
+async def clear_anime_detail_cache(anime_id: int):
+    """Очистить кэш детальной страницы аниме (карточки в лентах не затрагиваются)"""
+    await invalidate_tags(keys=[get_anime_detail_cache_key(anime_id)])
+
+
+def get_user_principal_cache_key(user_id: int) -> str:
+    """Получить ключ кэша принципала пользователя (см. users.get_user_principal)"""
+    return f"user_principal:{user_id}"
+
+
+async def clear_user_principal_cache(*user_ids: int):
+    """
+    Очистить кэш принципала пользователей
+
+    Вызывается при изменении блокировки, роли, премиума или имени -
+    иначе get_current_user до истечения TTL видел бы старые данные.
+    """
+    if user_ids:
+        await invalidate_tags(keys=[get_user_principal_cache_key(user_id) for user_id in user_ids])
+
+
 def get_user_profile_cache_key(username: str) -> str:
     """
     Получить ключ кэша для профиля пользователя
@@ -181,18 +756,7 @@ async def clear_most_favorited_cache():
     """
     Очистить кэш топ коллекционеров (most favorited users)
     """
-    redis = await get_redis_client()
-    if redis:
-        try:
-            pattern = "most_favorited_users:*"
-            keys = []
-            async for key in redis.scan_iter(match=pattern):
-                keys.append(key)
-            
-                if keys:
-                    await redis.delete(*keys)
-        except Exception as e:
-            logger.error(f"Ошибка при очистке кэша топ коллекционеров: {e}")
+    await invalidate_tags(MOST_FAVORITED_CACHE_TAG)
 
 
 def serialize_sqlalchemy_obj(obj):
@@ -215,18 +779,23 @@ def serialize_sqlalchemy_obj(obj):
         # Это объект SQLAlchemy модели
         result = {}
         try:
-            for column in obj.__table__.columns:
-                value = getattr(obj, column.name, None)
+            state = sa_inspect(obj)
+            for attr in state.mapper.column_attrs:
+                # Отложенные колонки (например, AnimeModel.search_vector) не загружены
+                # и при обращении падают из-за raiseload - в кэш они не попадают
+                if attr.key in state.unloaded:
+                    continue
+                value = getattr(obj, attr.key, None)
                 # Обрабатываем datetime и другие специальные типы
                 if hasattr(value, 'isoformat'):
-                    result[column.name] = value.isoformat()
+                    result[attr.key] = value.isoformat()
                 elif isinstance(value, (int, float, str, bool)):
-                    result[column.name] = value
+                    result[attr.key] = value
                 elif value is None:
-                    result[column.name] = None
+                    result[attr.key] = None
                 else:
                     # Для других типов используем строковое представление
-                    result[column.name] = str(value)
+                    result[attr.key] = str(value)
             return result
         except Exception as e:
             logger.warning(f"Ошибка при сериализации объекта SQLAlchemy: {e}")
@@ -254,20 +823,337 @@ def serialize_for_cache(data):
         return serialize_sqlalchemy_obj(data)
 
 
-def redis_cached(prefix: str, ttl: int = 300):
+# Настройки защиты от "cache stampede" (одновременный пересчет одного ключа)
+# CACHE_LOCK_TTL_MS - сколько живет распределенная блокировка пересчета в Redis
+# CACHE_LOCK_WAIT_SECONDS - сколько остальные воркеры ждут результат лидера
+CACHE_LOCK_TTL_MS = int(os.getenv("CACHE_LOCK_TTL_MS", "10000"))
+CACHE_LOCK_WAIT_SECONDS = float(os.getenv("CACHE_LOCK_WAIT_SECONDS", "5"))
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+# Пересчеты, которые уже выполняются в этом воркере: ключ кэша -> future с результатом
+_inflight: dict[str, asyncio.Future] = {}
+
+# Удаляем блокировку, только если она все еще принадлежит нам
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def build_cache_key(prefix: str, args: tuple, kwargs: dict) -> str:
+    """
+    Построить ключ кэша на основе префикса и аргументов функции
+    
+    AsyncSession игнорируется - сессия не влияет на результат кэшируемых функций.
+    Для объектов с атрибутами (например, PaginatorData) используется короткий хэш.
+    """
+    cache_key_parts = [prefix]
+    
+    # Добавляем аргументы в ключ кэша
+    for arg in args:
+        if isinstance(arg, AsyncSession):
+            continue
+        elif hasattr(arg, 'id'):
+            cache_key_parts.append(str(arg.id))
+        elif isinstance(arg, (int, str, float, bool)):
+            cache_key_parts.append(str(arg))
+        elif hasattr(arg, '__dict__'):
+            # Для объектов с атрибутами создаем хэш
+            arg_str = json.dumps(vars(arg), default=str, sort_keys=True)
+            arg_hash = hashlib.md5(arg_str.encode()).hexdigest()[:8]
+            cache_key_parts.append(arg_hash)
+    
+    # Добавляем kwargs (исключая сессии)
+    if kwargs:
+        filtered_kwargs = {
+            k: v for k, v in kwargs.items() 
+            if not isinstance(v, AsyncSession)
+        }
+        if filtered_kwargs:
+            kwargs_str = json.dumps(filtered_kwargs, default=str, sort_keys=True)
+            kwargs_hash = hashlib.md5(kwargs_str.encode()).hexdigest()[:8]
+            cache_key_parts.append(kwargs_hash)
+    
+    return ":".join(cache_key_parts)
+
+
+async def _read_cache(redis_client: redis.Redis, cache_key: str, func_name: str,
+                      soft_ttl: int | None = None, local_ttl: float | None = None) -> tuple[bool, Any, bool]:
+    """
+    Прочитать значение из кэша
+    
+    Значение в старом или поврежденном формате отбрасывается по заголовку
+    конверта и удаляется из Redis. Если задан soft_ttl, значение старше
+    soft_ttl секунд (по времени создания из конверта) считается устаревшим.
+    Если задан local_ttl, свежее значение сохраняется в локальный кэш воркера.
+    
+    Returns:
+        tuple: (найдено ли значение, значение, устарело ли значение)
+    """
+    try:
+        cached_data = await redis_client.get(cache_key)
+        redis_breaker.record_success()
+        if cached_data is None:
+            return False, None, False
+        try:
+            value, created_at = decode_cache_value(cached_data)
+        except CacheFormatError as e:
+            logger.warning(f"⚠️ Некорректный формат кэша для {func_name} ({e}), очищаем ключ: {cache_key}")
+            await redis_client.delete(cache_key)
+            return False, None, False
+        
+        is_stale = bool(soft_ttl) and time.time() - created_at > soft_ttl
+        if local_ttl and not is_stale:
+            local_cache.set(cache_key, value, local_ttl, len(cached_data))
+        return True, value, is_stale
+    except Exception as e:
+        logger.error(f"Redis cache error for {func_name}: {e}")
+        _report_redis_error(e)
+        return False, None, False
+
+
+async def _write_cache(redis_client: redis.Redis, cache_key: str, value, ttl: int, func_name: str,
+                       local_ttl: float | None = None, tags: Iterable[str] = ()):
+    """
+    Сохранить уже сериализуемое значение в кэш
+    
+    Ключ регистрируется в тегах тем же pipeline, а при заданном local_ttl
+    значение кладется и в локальный кэш воркера.
+    """
+    try:
+        serialized_result = encode_cache_value(value)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.setex(cache_key, ttl, serialized_result)
+            _register_tags(pipe, cache_key, tags, ttl)
+            await pipe.execute()
+        observe_payload_size(key_prefix(cache_key), len(serialized_result))
+        if local_ttl:
+            local_cache.set(cache_key, value, local_ttl, len(serialized_result))
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to cache result for {func_name}: {e}")
+        _report_redis_error(e)
+
+
+async def _acquire_recompute_lock(redis_client: redis.Redis, cache_key: str) -> str | None:
+    """
+    Попытаться захватить распределенную блокировку пересчета ключа
+    
+    Returns:
+        Токен блокировки, None если блокировка занята другим воркером,
+        или пустая строка, если Redis недоступен (пересчитываем без блокировки)
+    """
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis_client.set(f"lock:{cache_key}", token, nx=True, px=CACHE_LOCK_TTL_MS)
+        return token if acquired else None
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось захватить блокировку для {cache_key}: {e}")
+        _report_redis_error(e)
+        return ""
+
+
+async def _release_recompute_lock(redis_client: redis.Redis, cache_key: str, token: str):
+    """Освободить блокировку пересчета ключа"""
+    try:
+        await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{cache_key}", token)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось освободить блокировку для {cache_key}: {e}")
+
+
+async def _wait_for_recompute(redis_client: redis.Redis, cache_key: str, func_name: str) -> tuple[bool, Any]:
+    """
+    Дождаться, пока другой воркер пересчитает ключ
+    
+    Ждем не дольше CACHE_LOCK_WAIT_SECONDS. Если блокировка пропала, а значения
+    так и нет (лидер упал с ошибкой), прекращаем ожидание.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CACHE_LOCK_WAIT_SECONDS
+    while loop.time() < deadline:
+        await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+        found, value, _ = await _read_cache(redis_client, cache_key, func_name)
+        if found:
+            return True, value
+        try:
+            if not await redis_client.exists(f"lock:{cache_key}"):
+                break
+        except Exception:
+            break
+    logger.debug(f"⏳ Не дождались пересчета {cache_key}, считаем сами")
+    return False, None
+
+
+async def _single_flight(cache_key: str, loader: Callable):
+    """
+    Выполнить loader не более одного раза на ключ внутри воркера
+    
+    loader возвращает (результат для вызывающего, сериализованное значение).
+    Лидер получает исходный результат функции, остальные конкурентные вызовы
+    с тем же ключом - сериализованное значение (как при попадании в кэш).
+    """
+    future = _inflight.get(cache_key)
+    if future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # Лидер был отменен - считаем сами
+            result, _ = await loader()
+            return result
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        result, shared_value = await loader()
+        future.set_result(shared_value)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Помечаем исключение как полученное, даже если ожидающих нет
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(cache_key, None)
+
+
+async def _recompute(redis_client: redis.Redis, cache_key: str, ttl: int,
+                     func: Callable, args: tuple, kwargs: dict, prepare: Callable | None = None,
+                     local_ttl: float | None = None, tags: Iterable[str] = ()):
+    """
+    Пересчитать значение с распределенной блокировкой и сохранить в кэш
+    
+    Если ключ уже пересчитывает другой воркер, ждем его результат из Redis.
+    prepare - функция, которая отбирает часть результата для сохранения в кэш.
+    local_ttl - сколько секунд держать значение в локальном кэше воркера.
+    tags - теги, под которыми регистрируется ключ.
+    
+    Returns:
+        tuple: (результат для вызывающего, сериализованное значение для ожидающих)
+    """
+    token = await _acquire_recompute_lock(redis_client, cache_key)
+    if token is None:
+        found, value = await _wait_for_recompute(redis_client, cache_key, func.__name__)
+        if found:
+            return value, value
+    
+    try:
+        started = time.perf_counter()
+        result = await func(*args, **kwargs)
+        observe_recompute(key_prefix(cache_key), time.perf_counter() - started)
+        # Сериализуем SQLAlchemy объекты в словари перед сохранением
+        serializable_result = serialize_for_cache(result)
+        cache_value = prepare(serializable_result) if prepare else serializable_result
+        await _write_cache(redis_client, cache_key, cache_value, ttl, func.__name__, local_ttl, tags)
+        return result, serializable_result
+    finally:
+        if token:
+            await _release_recompute_lock(redis_client, cache_key, token)
+
+
+# Фоновые обновления устаревших ключей, запущенные в этом воркере
+_refreshing: set[str] = set()
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _schedule_refresh(cache_key: str, ttl: int, func: Callable, args: tuple, kwargs: dict,
+                      prepare: Callable | None = None, tags: Iterable[str] = ()):
+    """
+    Запланировать фоновое обновление устаревшего ключа (не более одного на ключ)
+    
+    Внутри воркера повтор отсекается по _refreshing, между воркерами -
+    той же блокировкой пересчета, что и при промахе.
+    """
+    if cache_key in _refreshing or cache_key in _inflight:
+        return
+    _refreshing.add(cache_key)
+    task = asyncio.create_task(_refresh_in_background(cache_key, ttl, func, args, kwargs, prepare, tags))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _refresh_in_background(cache_key: str, ttl: int, func: Callable, args: tuple, kwargs: dict,
+                                 prepare: Callable | None = None, tags: Iterable[str] = ()):
+    """
+    Пересчитать значение в фоне и перезаписать ключ
+    
+    Сессия запроса к этому моменту уже закрыта, поэтому AsyncSession
+    в аргументах заменяется новой сессией (реплика, если она не отстает).
+    """
+    try:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        token = await _acquire_recompute_lock(redis_client, cache_key)
+        if token is None:
+            # Ключ уже обновляет другой воркер
+            return
+        try:
+            async with read_session() as session:
+                refresh_args = tuple(session if isinstance(arg, AsyncSession) else arg for arg in args)
+                refresh_kwargs = {
+                    k: session if isinstance(v, AsyncSession) else v
+                    for k, v in kwargs.items()
+                }
+                started = time.perf_counter()
+                result = await func(*refresh_args, **refresh_kwargs)
+                observe_recompute(key_prefix(cache_key), time.perf_counter() - started)
+            serializable_result = serialize_for_cache(result)
+            cache_value = prepare(serializable_result) if prepare else serializable_result
+            await _write_cache(redis_client, cache_key, cache_value, ttl, func.__name__, tags=tags)
+            logger.debug(f"🔄 Кэш обновлен в фоне: {cache_key}")
+        finally:
+            if token:
+                await _release_recompute_lock(redis_client, cache_key, token)
+    except Exception as e:
+        logger.warning(f"⚠️ Фоновое обновление кэша {cache_key} не удалось: {e}")
+    finally:
+        _refreshing.discard(cache_key)
+
+
+def redis_cached(prefix: str, ttl: int = 300, stale_ttl: int | None = None,
+                 local_ttl: float | None = None, tags: Iterable[str] = ()):
     """
     Декоратор для кэширования результатов async функций в Redis
     
+    Конкурентные промахи по одному ключу объединяются: внутри воркера функцию
+    выполняет только первый вызов, между воркерами - владелец блокировки в Redis.
+    
+    Режим stale-while-revalidate (stale_ttl): ключ живет ttl + stale_ttl секунд.
+    После ttl (по времени создания значения) значение считается устаревшим, но все еще отдается сразу,
+    а обновление запускается в фоне (одно на ключ).
+    
+    Локальный кэш (local_ttl): свежее значение дополнительно держится в памяти
+    воркера (LRU), попадание в него не обращается к Redis. Инвалидации
+    (invalidate_tags, clear_cache_pattern и др.) рассылаются всем воркерам через pub/sub.
+    Значения из локального кэша общие - их нельзя изменять.
+    
+    Теги (tags): ключ регистрируется под тегами для invalidate_tags. Теги - format-строки
+    по параметрам функции, например ("feed:popular",) или ("anime:{anime_id}",).
+    
     Args:
         prefix: Префикс для ключа кэша
         ttl: Время жизни кэша в секундах (по умолчанию 300 секунд = 5 минут)
+        stale_ttl: Сколько секунд после ttl можно отдавать устаревшее значение
+        local_ttl: Сколько секунд держать значение в локальном кэше воркера
+        tags: Шаблоны тегов для инвалидации
     
     Usage:
-        @redis_cached(prefix="popular", ttl=300)
+        @redis_cached(prefix="popular", ttl=300, tags=("feed:popular",))
         async def get_popular_anime(...):
             ...
     """
+    storage_ttl = ttl + (stale_ttl or 0)
+    soft_ttl = ttl if stale_ttl else None
+    
     def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             # Получаем клиент Redis
@@ -277,97 +1163,44 @@ def redis_cached(prefix: str, ttl: int = 300):
             if not redis_client:
                 return await func(*args, **kwargs)
             
-            # Создаем ключ кэша на основе префикса и аргументов функции
-            # Для сессий и других несериализуемых объектов используем их id или строковое представление
-            cache_key_parts = [prefix]
+            cache_key = build_cache_key(prefix, args, kwargs)
             
-            # Добавляем аргументы в ключ кэша
-            for arg in args:
-                # Игнорируем AsyncSession - сессия не влияет на результат кэшируемых функций
-                if isinstance(arg, AsyncSession):
-                    continue
-                elif hasattr(arg, 'id'):
-                    cache_key_parts.append(str(arg.id))
-                elif isinstance(arg, (int, str, float, bool)):
-                    cache_key_parts.append(str(arg))
-                elif hasattr(arg, '__dict__'):
-                    # Для объектов с атрибутами создаем хэш
-                    arg_str = json.dumps(vars(arg), default=str, sort_keys=True)
-                    arg_hash = hashlib.md5(arg_str.encode()).hexdigest()[:8]
-                    cache_key_parts.append(arg_hash)
-            
-            # Добавляем kwargs (исключая сессии)
-            if kwargs:
-                # Фильтруем kwargs, исключая AsyncSession
-                filtered_kwargs = {
-                    k: v for k, v in kwargs.items() 
-                    if not isinstance(v, AsyncSession)
-                }
-                if filtered_kwargs:
-                    kwargs_str = json.dumps(filtered_kwargs, default=str, sort_keys=True)
-                    kwargs_hash = hashlib.md5(kwargs_str.encode()).hexdigest()[:8]
-                    cache_key_parts.append(kwargs_hash)
+            # Сначала локальный кэш воркера
+            if local_ttl:
+                found, cached_value = local_cache.get(cache_key)
+                if found:
+                    record_cache_event(prefix, CACHE_LOCAL_HIT)
+                    return cached_value
             
-            cache_key = ":".join(cache_key_parts)
+            # Пытаемся получить данные из кэша
+            found, cached_value, is_stale = await _read_cache(
+                redis_client, cache_key, func.__name__, soft_ttl, local_ttl
+            )
+            if found:
+                if is_stale:
+                    record_cache_event(prefix, CACHE_STALE)
+                    _schedule_refresh(cache_key, storage_ttl, func, args, kwargs,
+                                      tags=_resolve_tags(tags, signature, args, kwargs))
+                else:
+                    record_cache_event(prefix, CACHE_HIT)
+                return cached_value
             
-            try:
-                # Пытаемся получить данные из кэша
-                cached_data = await redis_client.get(cache_key)
-                if cached_data is not None:
-                    try:
-                        deserialized = json.loads(cached_data)
-                        # Проверяем, что данные корректны (не строки с объектами)
-                        is_valid = True
-                        if isinstance(deserialized, list):
-                            # Проверяем все элементы списка
-                            for item in deserialized:
-                                if isinstance(item, str) and ('object at 0x' in item or 'AnimeModel' in item or 'Model' in item):
-                                    is_valid = False
-                                    break
-                                # Проверяем, что это словарь (правильный формат) или объект SQLAlchemy
-                                if not isinstance(item, dict) and not hasattr(item, '__table__'):
-                                    if isinstance(item, str):
-                                        is_valid = False
-                                        break
-                        elif isinstance(deserialized, str):
-                            # Если это строка с объектом - некорректно
-                            if 'object at 0x' in deserialized or 'AnimeModel' in deserialized:
-                                is_valid = False
-                        
-                        if not is_valid:
-                            logger.warning(f"⚠️ Обнаружены некорректные данные в кэше (старый формат), очищаем ключ: {cache_key}")
-                            await redis_client.delete(cache_key)
-                            # Продолжаем выполнение функции для получения свежих данных (не возвращаем)
-                        else:
-                            return deserialized
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"⚠️ Ошибка десериализации кэша для {func.__name__}: {e}, очищаем ключ: {cache_key}")
-                        await redis_client.delete(cache_key)
-                
-                # Кэш промах - выполняем функцию
-                result = await func(*args, **kwargs)
-                
-                # Сохраняем результат в кэш
-                try:
-                    # Сериализуем SQLAlchemy объекты в словари перед сохранением
-                    serializable_result = serialize_for_cache(result)
-                    serialized_result = json.dumps(serializable_result, default=str)
-                    await redis_client.setex(cache_key, ttl, serialized_result)
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to cache result for {func.__name__}: {e}")
-                
-                return result
-                
-            except Exception as e:
-                logger.error(f"Redis cache error for {func.__name__}: {e}")
-                # В случае ошибки просто выполняем функцию без кэша
-                return await func(*args, **kwargs)
+            # Кэш промах - пересчитываем (один раз на ключ)
+            record_cache_event(prefix, CACHE_MISS)
+            return await _single_flight(
+                cache_key,
+                lambda: _recompute(redis_client, cache_key, storage_ttl, func, args, kwargs,
+                                   local_ttl=local_ttl, tags=_resolve_tags(tags, signature, args, kwargs))
+            )
         
         return wrapper
     return decorator
 
 
-def redis_cached_limited(prefix: str, ttl: int = 300, max_cache_items: int = 18):
+def redis_cached_limited(prefix: str, ttl: int = 300, max_cache_items: int = 18,
+                         stale_ttl: int | None = None, local_ttl: float | None = None,
+                         tags: Iterable[str] = (), block_size: int | None = None,
+                         card_prefix: str = "anime_card", card_tags: Iterable[str] = ("anime:{id}",)):
     """
     Декоратор для кэширования результатов async функций в Redis с ограничением количества элементов
     
@@ -379,18 +1212,47 @@ def redis_cached_limited(prefix: str, ttl: int = 300, max_cache_items: int = 18)
     - В кэш сохраняется только первые max_cache_items элементов
     - При запросе с offset=0 и limit <= max_cache_items, используется кэш
     - При запросе с offset > 0 или limit > max_cache_items, кэш не используется
+    - Конкурентные промахи по одному ключу объединяются (как в redis_cached)
+    - stale_ttl включает режим stale-while-revalidate (как в redis_cached)
+    - local_ttl включает локальный кэш воркера перед Redis (как в redis_cached)
+    - tags регистрирует ключ под тегами для invalidate_tags (как в redis_cached)
+    
+    Оконный режим (block_size): вместо первой страницы кэшируются блоки id фиксированного
+    размера (0..block_size-1, block_size..2*block_size-1, ...) для каждого набора
+    аргументов (сортировки), а сами элементы - в общих карточках {card_prefix}:{id}.
+    Любая пара (limit, offset) собирается из блоков, поэтому из кэша отдаются все
+    страницы, а одно и то же аниме хранится один раз. max_cache_items и stale_ttl
+    в этом режиме не используются; функция должна возвращать элементы с полем id
+    в стабильном порядке.
     
     Args:
         prefix: Префикс для ключа кэша
         ttl: Время жизни кэша в секундах (по умолчанию 300 секунд = 5 минут)
         max_cache_items: Максимальное количество элементов для кэширования (по умолчанию 18)
+        stale_ttl: Сколько секунд после ttl можно отдавать устаревшее значение
+        local_ttl: Сколько секунд держать значение в локальном кэше воркера
+        tags: Шаблоны тегов для инвалидации
+        block_size: Размер блока id для оконного режима
+        card_prefix: Префикс ключей карточек в оконном режиме
+        card_tags: Шаблоны тегов карточек (format по полям элемента)
     
     Usage:
         @redis_cached_limited(prefix="anime_paginated", ttl=300, max_cache_items=18)
         async def pagination_get_anime(paginator_data: PaginatorData, ...):
             ...
     """
+    storage_ttl = ttl + (stale_ttl or 0)
+    soft_ttl = ttl if stale_ttl else None
+    
+    def prepare(serializable_result):
+        # Сохраняем только первые max_cache_items элементов
+        if isinstance(serializable_result, list):
+            return serializable_result[:max_cache_items]
+        return serializable_result
+    
     def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             # Получаем клиент Redis
@@ -400,135 +1262,234 @@ def redis_cached_limited(prefix: str, ttl: int = 300, max_cache_items: int = 18)
             if not redis_client:
                 return await func(*args, **kwargs)
             
-            # Извлекаем offset и limit из аргументов
-            offset = 0
-            limit = None
-            
-            # Сначала проверяем позиционные аргументы для функций типа get_anime_sorted_by_score(limit, offset, ...)
-            # Это должно быть сделано до проверки объектов, так как int может быть передан первым
-            if len(args) > 0:
-                # Проверяем, не являются ли первые два аргумента limit и offset
-                if isinstance(args[0], int) and not hasattr(args[0], '__dict__'):
-                    if len(args) > 1 and isinstance(args[1], int) and not hasattr(args[1], '__dict__'):
-                        # Вероятно, это limit и offset
-                        limit = args[0]
-                        offset = args[1]
-            
-            # Если не нашли в позиционных аргументах, ищем объект PaginatorData в args
-            if limit is None:
-                for arg in args:
-                    if hasattr(arg, 'offset') and hasattr(arg, 'limit'):
-                        # Это объект PaginatorData или подобный
-                        offset = getattr(arg, 'offset', 0)
-                        limit = getattr(arg, 'limit', None)
-                        break
+            limit, offset = _extract_limit_offset(signature, args, kwargs)
             
-            # Если все еще не нашли, проверяем kwargs (для функций с именованными параметрами)
-            if limit is None:
-                if 'offset' in kwargs:
-                    offset = kwargs['offset']
-                if 'limit' in kwargs:
-                    limit = kwargs.get('limit')
+            if block_size and limit is not None:
+                return await _get_window(
+                    redis_client, prefix, func, signature, args, kwargs, limit, offset, ttl, block_size,
+                    card_prefix, card_tags, _resolve_tags(tags, signature, args, kwargs), local_ttl
+                )
             
             # Кэшируем только для offset=0 и limit <= max_cache_items
             should_cache = offset == 0 and (limit is None or limit <= max_cache_items)
+            if not should_cache:
+                return await func(*args, **kwargs)
             
-            # Создаем ключ кэша на основе префикса и аргументов функции
-            # Для сессий и других несериализуемых объектов используем их id или строковое представление
-            cache_key_parts = [prefix]
+            cache_key = build_cache_key(prefix, args, kwargs)
             
-            # Добавляем аргументы в ключ кэша
-            for arg in args:
-                # Игнорируем AsyncSession - сессия не влияет на результат кэшируемых функций
-                if isinstance(arg, AsyncSession):
-                    continue
-                elif hasattr(arg, 'id'):
-                    cache_key_parts.append(str(arg.id))
-                elif isinstance(arg, (int, str, float, bool)):
-                    cache_key_parts.append(str(arg))
-                elif hasattr(arg, '__dict__'):
-                    # Для объектов с атрибутами создаем хэш
-                    arg_str = json.dumps(vars(arg), default=str, sort_keys=True)
-                    arg_hash = hashlib.md5(arg_str.encode()).hexdigest()[:8]
-                    cache_key_parts.append(arg_hash)
+            # Сначала локальный кэш воркера
+            found = False
+            if local_ttl:
+                found, cached_result = local_cache.get(cache_key)
+                if found:
+                    record_cache_event(prefix, CACHE_LOCAL_HIT)
             
-            # Добавляем kwargs (исключая сессии)
-            if kwargs:
-                # Фильтруем kwargs, исключая AsyncSession
-                filtered_kwargs = {
-                    k: v for k, v in kwargs.items() 
-                    if not isinstance(v, AsyncSession)
-                }
-                if filtered_kwargs:
-                    kwargs_str = json.dumps(filtered_kwargs, default=str, sort_keys=True)
-                    kwargs_hash = hashlib.md5(kwargs_str.encode()).hexdigest()[:8]
-                    cache_key_parts.append(kwargs_hash)
+            if not found:
+                found, cached_result, is_stale = await _read_cache(
+                    redis_client, cache_key, func.__name__, soft_ttl, local_ttl
+                )
+                if found:
+                    if is_stale:
+                        record_cache_event(prefix, CACHE_STALE)
+                        _schedule_refresh(cache_key, storage_ttl, func, args, kwargs, prepare,
+                                          _resolve_tags(tags, signature, args, kwargs))
+                    else:
+                        record_cache_event(prefix, CACHE_HIT)
             
-            cache_key = ":".join(cache_key_parts)
+            if found:
+                # Если запрошено меньше элементов, чем в кэше, обрезаем
+                if isinstance(cached_result, list) and limit is not None and limit < len(cached_result):
+                    return cached_result[:limit]
+                return cached_result
             
-            try:
-                # Пытаемся получить данные из кэша только если должны кэшировать
-                if should_cache:
-                    cached_data = await redis_client.get(cache_key)
-                    if cached_data is not None:
-                        try:
-                            cached_result = json.loads(cached_data)
-                            # Проверяем, что данные корректны (не строки с объектами)
-                            is_valid = True
-                            if isinstance(cached_result, list):
-                                # Проверяем все элементы списка
-                                for item in cached_result:
-                                    if isinstance(item, str) and ('object at 0x' in item or 'AnimeModel' in item or 'Model' in item):
-                                        is_valid = False
-                                        break
-                                    # Проверяем, что это словарь (правильный формат) или объект SQLAlchemy
-                                    if not isinstance(item, dict) and not hasattr(item, '__table__'):
-                                        if isinstance(item, str):
-                                            is_valid = False
-                                            break
-                            elif isinstance(cached_result, str):
-                                # Если это строка с объектом - некорректно
-                                if 'object at 0x' in cached_result or 'AnimeModel' in cached_result:
-                                    is_valid = False
-                            
-                            if not is_valid:
-                                logger.warning(f"⚠️ Обнаружены некорректные данные в кэше (старый формат), очищаем ключ: {cache_key}")
-                                await redis_client.delete(cache_key)
-                                # Продолжаем выполнение функции для получения свежих данных (не возвращаем)
-                            else:
-                                remaining_ttl = await redis_client.ttl(cache_key)
-                                # Если запрошено меньше элементов, чем в кэше, обрезаем
-                                if isinstance(cached_result, list) and limit is not None and limit < len(cached_result):
-                                    return cached_result[:limit]
-                                return cached_result
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"⚠️ Ошибка десериализации кэша для {func.__name__}: {e}, очищаем ключ: {cache_key}")
-                            await redis_client.delete(cache_key)
-                
-                # Кэш промах или не должны кэшировать - выполняем функцию
-                result = await func(*args, **kwargs)
-                
-                # Сохраняем в кэш только если должны кэшировать и результат - список
-                if should_cache and isinstance(result, list):
-                    # Сохраняем только первые max_cache_items элементов
-                    cache_data = result[:max_cache_items] if len(result) > max_cache_items else result
-                    
-                    # Сохраняем результат в кэш
-                    try:
-                        # Сериализуем SQLAlchemy объекты в словари перед сохранением
-                        serializable_cache_data = serialize_for_cache(cache_data)
-                        serialized_result = json.dumps(serializable_cache_data, default=str)
-                        await redis_client.setex(cache_key, ttl, serialized_result)
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to cache result for {func.__name__}: {e}")
-                
-                # Возвращаем полный результат (не обрезанный)
-                return result
-                
-            except Exception as e:
-                logger.error(f"Redis cache error for {func.__name__}: {e}")
-                # В случае ошибки просто выполняем функцию без кэша
-                return await func(*args, **kwargs)
+            # Возвращаем полный результат (не обрезанный)
+            record_cache_event(prefix, CACHE_MISS)
+            return await _single_flight(
+                cache_key,
+                lambda: _recompute(redis_client, cache_key, storage_ttl, func, args, kwargs,
+                                   prepare, local_ttl, _resolve_tags(tags, signature, args, kwargs))
+            )
         
         return wrapper
     return decorator
+
+
+def _replace_limit_offset(signature: inspect.Signature, args: tuple, kwargs: dict,
+                          limit: int, offset: int) -> tuple[tuple, dict]:
+    """Подставить limit и offset в аргументы пагинируемой функции (обратное _extract_limit_offset)"""
+    bound = signature.bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    
+    for name, value in bound.arguments.items():
+        if hasattr(value, 'offset') and hasattr(value, 'limit'):
+            if hasattr(value, 'model_copy'):
+                replaced = value.model_copy(update={'limit': limit, 'offset': offset})
+            else:
+                replaced = copy.copy(value)
+                replaced.limit = limit
+                replaced.offset = offset
+            bound.arguments[name] = replaced
+            return bound.args, bound.kwargs
+    
+    bound.arguments['limit'] = limit
+    bound.arguments['offset'] = offset
+    return bound.args, bound.kwargs
+
+
+async def _mget_cached(redis_client: redis.Redis, cache_keys: list[str],
+                       local_ttl: float | None = None) -> dict[str, Any]:
+    """
+    Прочитать несколько ключей: сначала из локального кэша, остальные одним MGET
+    
+    Returns:
+        dict: {ключ: значение} только для найденных ключей
+    """
+    values = {}
+    missing = []
+    for cache_key in cache_keys:
+        if local_ttl:
+            found, value = local_cache.get(cache_key)
+            if found:
+                values[cache_key] = value
+                continue
+        missing.append(cache_key)
+    
+    if missing:
+        for cache_key, data in zip(missing, await redis_client.mget(missing)):
+            if data is None:
+                continue
+            try:
+                value, _ = decode_cache_value(data)
+            except CacheFormatError:
+                continue
+            values[cache_key] = value
+            if local_ttl:
+                local_cache.set(cache_key, value, local_ttl, len(data))
+    return values
+
+
+async def _read_block(redis_client: redis.Redis, block_key: str, card_prefix: str,
+                      local_ttl: float | None = None) -> list | None:
+    """
+    Прочитать блок: список id и карточки для них
+    
+    Returns:
+        Карточки блока или None, если блока или хотя бы одной карточки нет в кэше
+    """
+    try:
+        blocks = await _mget_cached(redis_client, [block_key], local_ttl)
+        if block_key not in blocks:
+            return None
+        card_keys = [f"{card_prefix}:{item_id}" for item_id in blocks[block_key]]
+        cards = await _mget_cached(redis_client, card_keys, local_ttl)
+        if len(cards) < len(card_keys):
+            return None
+        return [cards[card_key] for card_key in card_keys]
+    except Exception as e:
+        logger.error(f"Redis cache error for block {block_key}: {e}")
+        _report_redis_error(e)
+        return None
+
+
+async def _load_block(redis_client: redis.Redis, block_key: str, func: Callable,
+                      signature: inspect.Signature, args: tuple, kwargs: dict,
+                      block_start: int, block_size: int, ttl: int, card_prefix: str,
+                      card_tags: Iterable[str], tags: Iterable[str], local_ttl: float | None = None):
+    """
+    Загрузить блок из БД и сохранить id блока и карточки одним pipeline
+    
+    Returns:
+        tuple: (карточки блока, карточки блока) - в формате loader для _single_flight
+    """
+    token = await _acquire_recompute_lock(redis_client, block_key)
+    if token is None:
+        found, _ = await _wait_for_recompute(redis_client, block_key, func.__name__)
+        if found:
+            cards = await _read_block(redis_client, block_key, card_prefix, local_ttl)
+            if cards is not None:
+                return cards, cards
+    
+    try:
+        block_args, block_kwargs = _replace_limit_offset(signature, args, kwargs, block_size, block_start)
+        started = time.perf_counter()
+        cards = serialize_for_cache(await func(*block_args, **block_kwargs)) or []
+        observe_recompute(key_prefix(block_key), time.perf_counter() - started)
+        try:
+            payload_sizes = []
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for card in cards:
+                    card_key = f"{card_prefix}:{card['id']}"
+                    serialized_card = encode_cache_value(card)
+                    payload_sizes.append((card_prefix, len(serialized_card)))
+                    pipe.setex(card_key, ttl, serialized_card)
+                    _register_tags(pipe, card_key, [tag.format(**card) for tag in card_tags], ttl)
+                serialized_block = encode_cache_value([card['id'] for card in cards])
+                payload_sizes.append((key_prefix(block_key), len(serialized_block)))
+                pipe.setex(block_key, ttl, serialized_block)
+                _register_tags(pipe, block_key, tags, ttl)
+                await pipe.execute()
+            for prefix, size in payload_sizes:
+                observe_payload_size(prefix, size)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to cache block {block_key}: {e}")
+            _report_redis_error(e)
+        return cards, cards
+    finally:
+        if token:
+            await _release_recompute_lock(redis_client, block_key, token)
+
+
+async def _get_window(redis_client: redis.Redis, prefix: str, func: Callable,
+                      signature: inspect.Signature, args: tuple, kwargs: dict,
+                      limit: int, offset: int, ttl: int, block_size: int, card_prefix: str,
+                      card_tags: Iterable[str], tags: Iterable[str], local_ttl: float | None = None) -> list:
+    """Собрать страницу (limit, offset) из закэшированных блоков (оконный режим redis_cached_limited)"""
+    if limit <= 0:
+        return []
+    
+    # Ключ набора аргументов без учета страницы (сортировка, фильтры)
+    window_args, window_kwargs = _replace_limit_offset(signature, args, kwargs, block_size, 0)
+    window_key = build_cache_key(f"{prefix}:window", window_args, window_kwargs)
+    
+    first_block = offset // block_size
+    last_block = (offset + limit - 1) // block_size
+    items = []
+    all_cached = True
+    for block_index in range(first_block, last_block + 1):
+        block_key = f"{window_key}:block:{block_index}"
+        cards = await _read_block(redis_client, block_key, card_prefix, local_ttl)
+        if cards is None:
+            all_cached = False
+            cards = await _single_flight(
+                block_key,
+                lambda block_key=block_key, block_index=block_index: _load_block(
+                    redis_client, block_key, func, signature, args, kwargs, block_index * block_size, block_size,
+                    ttl, card_prefix, card_tags, tags, local_ttl
+                )
+            )
+        items.extend(cards)
+        if len(cards) < block_size:
+            # Последний блок - дальше данных нет
+            break
+    
+    record_cache_event(prefix, CACHE_HIT if all_cached else CACHE_MISS)
+    start = offset - first_block * block_size
+    return items[start:start + limit]
+
+
+def _extract_limit_offset(signature: inspect.Signature, args: tuple, kwargs: dict) -> tuple[int | None, int]:
+    """
+    Извлечь limit и offset из аргументов пагинируемой функции
+    
+    Сначала ищем объект PaginatorData (или подобный) среди аргументов,
+    затем параметры с именами limit и offset.
+    """
+    bound = signature.bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    
+    for value in bound.arguments.values():
+        if hasattr(value, 'offset') and hasattr(value, 'limit'):
+            # Это объект PaginatorData или подобный
+            return getattr(value, 'limit', None), getattr(value, 'offset', 0) or 0
+    
+    return bound.arguments.get('limit'), bound.arguments.get('offset') or 0
@@ -0,0 +1,66 @@
+"""
+Счетчики профиля пользователя (таблица user_stats)
+
+Профиль раньше загружал все избранное, оценки, комментарии и историю
+просмотров пользователя вместе с аниме только ради len(). Теперь счетчики
+хранятся в user_stats и читаются одним запросом по первичному ключу.
+
+Пути записи вызывают change_user_stats до commit, поэтому счетчик меняется
+в той же транзакции, что и сама запись. Строки для существующих
+пользователей создает и сверяет migrations/create_user_stats.sql.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.user_stats import UserStatsModel
+
+
+USER_STATS_FIELDS = (
+    'favorites_count',
+    'ratings_count',
+    'comments_count',
+    'watch_history_count',
+    'unique_watched_anime',
+)
+
+
+async def change_user_stats(user_id: int, session: AsyncSession, **deltas: int):
+    """
+    Изменить счетчики пользователя (в текущей транзакции, без commit)
+
+    Строка создается при первом изменении (INSERT ... ON CONFLICT DO UPDATE).
+
+    Example:
+        await change_user_stats(user_id, session, favorites_count=1)
+    """
+    deltas = {field: amount for field, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    stmt = insert(UserStatsModel).values(user_id=user_id, **{
+        field: max(amount, 0) for field, amount in deltas.items()
+    })
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[UserStatsModel.user_id],
+        set_={
+            **{field: func.greatest(getattr(UserStatsModel, field) + amount, 0) for field, amount in deltas.items()},
+            'updated_at': func.now(),
+        },
+    ))
+
+
+async def get_user_stats(user_id: int, session: AsyncSession) -> dict:
+    """
+    Счетчики профиля пользователя
+
+    Returns:
+        dict: {'favorites_count': ..., 'ratings_count': ..., ...};
+        нули, если у пользователя еще нет строки
+    """
+    row = (await session.execute(
+        select(*(getattr(UserStatsModel, field) for field in USER_STATS_FIELDS))
+        .where(UserStatsModel.user_id == user_id)
+    )).first()
+    if not row:
+        return {field: 0 for field in USER_STATS_FIELDS}
+    return dict(zip(USER_STATS_FIELDS, row))
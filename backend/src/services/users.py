@@ -1,3 +1,5 @@
+import os
+import time
 from fastapi import HTTPException, status, Response, Request
 from sqlalchemy import select, delete, func, desc
 from datetime import datetime
@@ -20,6 +22,13 @@ from src.schemas.user import (CreateNewUser, CreateUserComment,
 from src.auth.auth import (add_token_in_cookie, hashed_password,
                            get_token, password_verification)
 from src.services.animes import get_anime_by_id
+from src.services.redis_cache import redis_cached, clear_user_principal_cache
+from src.services.local_cache import local_cache
+from src.db.loaders import USER_CARD, USER_BEST_ANIME
+from src.services.collector_leaderboard import get_top_collectors, change_favorites_count
+from src.services.user_stats import change_user_stats
+from src.services.entity_counters import change_counter, ANIME_COMMENTS, ANIME_FAVORITES
+from src.utils.cursor import encode_cursor, decode_cursor, cursor_id
 from src.services.email import (generate_verification_token, 
                                 get_verification_token_expires,
                                 send_verification_email)
@@ -311,25 +320,42 @@ async def get_user_by_id(user_id: int, session: AsyncSession):
     )
 
 
+# Кэш принципала (данных для авторизации запроса): короткий, т.к. блокировка
+# и смена роли должны применяться быстро, даже если инвалидация не дошла
+USER_PRINCIPAL_CACHE_TTL = int(os.getenv("USER_PRINCIPAL_CACHE_TTL", "60"))
+USER_PRINCIPAL_LOCAL_TTL = float(os.getenv("USER_PRINCIPAL_LOCAL_TTL", "5"))
+
+
+@redis_cached(prefix="user_principal", ttl=USER_PRINCIPAL_CACHE_TTL, local_ttl=USER_PRINCIPAL_LOCAL_TTL)
+async def get_user_principal(user_id: int, session: AsyncSession) -> dict:
+    '''Получить принципал пользователя (только колонки, без связей)
+
+    В отличие от get_user_by_id не загружает избранное, оценки, комментарии
+    и остальные selectin-связи UserModel - один SELECT по первичному ключу.
+    Ключ кэша - user_principal:{user_id} (см. clear_user_principal_cache),
+    поэтому вызывать нужно с позиционными аргументами.
+    '''
+
+    principal = (await session.execute(
+        select(UserModel.id, UserModel.username, UserModel.type_account,
+               UserModel.is_blocked, UserModel.premium_expires_at)
+        .filter_by(id=user_id)
+    )).mappings().one_or_none()
+    if principal:
+        return dict(principal)
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f'Пользователь не найден или вы не в системе'
+    )
+
+
 async def get_user_by_username(username: str, session: AsyncSession):
-    '''Получить пользователя из базы по username с загрузкой связанных данных'''
-    from sqlalchemy.orm import selectinload
-    from src.models.favorites import FavoriteModel
-    from src.models.anime import AnimeModel
-    from src.models.watch_history import WatchHistoryModel
-    from src.models.ratings import RatingModel
-    from src.models.comments import CommentModel
+    '''Получить пользователя из базы по username (без связанных данных)
+
+    Счетчики профиля - get_user_stats, избранное - get_user_favorites_page.
+    '''
     
-    user = (await session.execute(
-        select(UserModel)
-            .options(
-                selectinload(UserModel.favorites).selectinload(FavoriteModel.anime),
-                selectinload(UserModel.ratings).selectinload(RatingModel.anime),
-                selectinload(UserModel.comments).selectinload(CommentModel.anime),
-                selectinload(UserModel.watch_history).selectinload(WatchHistoryModel.anime)
-            )
-            .filter_by(username=username)
-    )).scalar_one_or_none()
+    user = (await session.execute(_user_by_username_query(username))).scalar_one_or_none()
     if user:
         return user
     raise HTTPException(
@@ -338,11 +364,26 @@ async def get_user_by_username(username: str, session: AsyncSession):
     )
 
 
+def _user_by_username_query(username: str):
+    '''Пользователь по username (без связанных данных)'''
+    return select(UserModel).options(*USER_CARD).filter_by(username=username)
+
+
+
+def _last_comment_query(user_id: int):
+    '''Последний комментарий пользователя (защита от спама)'''
+    return (
+        select(CommentModel)
+        .where(CommentModel.user_id == user_id)
+        .order_by(desc(CommentModel.created_at))
+        .limit(1)
+    )
+
 
 async def create_comment(comment_data: CreateUserComment, user_id: int, 
                          session: AsyncSession):
     '''Создать комментарий к аниме'''
-    from src.services.redis_cache import clear_user_profile_cache, clear_cache_pattern
+    from src.services.redis_cache import clear_user_profile_cache, invalidate_tags, clear_anime_detail_cache
     
     # Проверяем существование пользователя и аниме
     user = await get_user_by_id(user_id, session)
@@ -350,13 +391,7 @@ async def create_comment(comment_data: CreateUserComment, user_id: int,
 
     # Проверка защиты от спама: пользователь может отправлять комментарий раз в 60 секунд
     COMMENT_COOLDOWN_SECONDS = 60
-    query_last_comment = (
-        select(CommentModel)
-        .where(CommentModel.user_id == user_id)
-        .order_by(desc(CommentModel.created_at))
-        .limit(1)
-    )
-    result = await session.execute(query_last_comment)
+    result = await session.execute(_last_comment_query(user_id))
     last_comment = result.scalar_one_or_none()
     
     if last_comment and last_comment.created_at:
@@ -378,6 +413,8 @@ async def create_comment(comment_data: CreateUserComment, user_id: int,
     
     session.add(new_comment)
     await session.flush()  # Получаем ID перед commit
+    await change_user_stats(user_id, session, comments_count=1)
+    await change_counter(ANIME_COMMENTS, session, 1, entity_id=comment_data.anime_id)
     await session.commit()
     # Обновляем объект из БД для получения актуальных данных (created_at и т.д.)
     await session.refresh(new_comment)
@@ -387,13 +424,14 @@ async def create_comment(comment_data: CreateUserComment, user_id: int,
         await clear_user_profile_cache(user.username, user.id)
     
     # Очищаем кэш популярных аниме, так как комментарии влияют на популярность
-    await clear_cache_pattern("popular:*")
+    await invalidate_tags("feed:popular")
+    await clear_anime_detail_cache(comment_data.anime_id)
     
     return new_comment
 
 async def create_rating(rating_data: CreateUserRating, user_id: int, session: AsyncSession):
     '''Создать или обновить рейтинг аниме'''
-    from src.services.redis_cache import clear_user_profile_cache, clear_cache_pattern
+    from src.services.redis_cache import clear_user_profile_cache, invalidate_tags
     
     # Получаем пользователя для очистки кэша
     user = await get_user_by_id(user_id, session)
@@ -424,9 +462,7 @@ async def create_rating(rating_data: CreateUserRating, user_id: int, session: As
         if user and user.username:
             await clear_user_profile_cache(user.username, user.id)
         # Очищаем кэш аниме, так как рейтинг влияет на score и популярность
-        await clear_cache_pattern("popular:*")
-        await clear_cache_pattern("anime_paginated:*")
-        await clear_cache_pattern("anime_by_score:*")
+        await invalidate_tags("feed:popular", "feed:catalog", "feed:score")
         return 'Оценка обновлена'
     else:
         # Создаем новую оценку
@@ -437,6 +473,7 @@ async def create_rating(rating_data: CreateUserRating, user_id: int, session: As
         )
         session.add(new_rating)
         await session.flush()  # Используем flush для получения ID
+        await change_user_stats(user_id, session, ratings_count=1)
         await session.commit()
         # Обновляем объект из БД для получения актуальных данных (created_at и т.д.)
         await session.refresh(new_rating)
@@ -444,9 +481,7 @@ async def create_rating(rating_data: CreateUserRating, user_id: int, session: As
         if user and user.username:
             await clear_user_profile_cache(user.username, user.id)
         # Очищаем кэш аниме, так как рейтинг влияет на score и популярность
-        await clear_cache_pattern("popular:*")
-        await clear_cache_pattern("anime_paginated:*")
-        await clear_cache_pattern("anime_by_score:*")
+        await invalidate_tags("feed:popular", "feed:catalog", "feed:score")
         return 'Оценка создана'
 
 
@@ -454,13 +489,71 @@ async def get_user_anime(user_id: str, session: AsyncSession):
     '''Получить избранные аниме пользователя'''
 
     user = (await session.execute(
-        select(UserModel).filter_by(id=int(user_id))
+        select(UserModel).options(selectinload(UserModel.favorites)).filter_by(id=int(user_id))
     )).scalar_one_or_none()
     if user:
         return user.favorites if len(user.favorites) else 'Пусто'
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден')
 
 
+FAVORITES_CURSOR = "favorites"
+# Сколько избранных аниме отдается вместе с профилем
+PROFILE_FAVORITES_LIMIT = int(os.getenv("PROFILE_FAVORITES_LIMIT", "24"))
+
+
+async def get_user_favorites_page(user_id: int, limit: int, session: AsyncSession,
+                                  cursor: str | None = None) -> tuple[list[dict], str | None]:
+    '''
+    Страница избранного пользователя, от новых к старым
+
+    Следующая страница выбирается по курсору (id последней записи избранного),
+    по индексу favorites(user_id, id).
+
+    Returns:
+        tuple: (список аниме, курсор следующей страницы или None)
+    '''
+    last_id = None
+    if cursor:
+        (last_id,) = decode_cursor(cursor, FAVORITES_CURSOR, cursor_id)
+    
+    rows = (await session.execute(_favorites_page_query(user_id, limit, last_id))).all()
+    anime_list = [
+        {
+            'id': anime.id,
+            'title': anime.title,
+            'title_original': anime.title_original,
+            'poster_url': anime.poster_url,
+            'description': anime.description,
+            'year': anime.year,
+            'type': anime.type,
+            'episodes_count': anime.episodes_count,
+            'rating': anime.rating,
+            'score': anime.score,
+            'studio': anime.studio,
+            'status': anime.status,
+        }
+        for _, anime in rows
+    ]
+    next_cursor = encode_cursor(FAVORITES_CURSOR, rows[-1][0]) if rows and len(rows) == limit else None
+    return anime_list, next_cursor
+
+
+def _favorites_page_query(user_id: int, limit: int, last_id: int | None = None):
+    '''Страница избранного пользователя: (id записи избранного, AnimeModel), от новых к старым'''
+    from src.models.anime import AnimeModel
+    
+    query = (
+        select(FavoriteModel.id, AnimeModel)
+        .join(AnimeModel, AnimeModel.id == FavoriteModel.anime_id)
+        .where(FavoriteModel.user_id == user_id)
+        .order_by(FavoriteModel.id.desc())
+        .limit(limit)
+    )
+    if last_id is not None:
+        query = query.where(FavoriteModel.id < last_id)
+    return query
+
+
 async def get_user_favorites(user_id: int, session: AsyncSession):
     '''Получить все избранные аниме пользователя с полными данными'''
     
@@ -535,7 +628,10 @@ async def toggle_favorite(favorite_data: CreateUserFavorite, user_id: int,
                 FavoriteModel.anime_id == favorite_data.anime_id
             )
         )
+        await change_user_stats(user_id, session, favorites_count=-1)
+        await change_counter(ANIME_FAVORITES, session, -1, entity_id=favorite_data.anime_id)
         await session.commit()
+        await change_favorites_count(user_id, -1)
         # Очищаем кэш топ пользователей, так как количество избранного изменилось
         await clear_most_favorited_cache()
         # Очищаем кэш профиля пользователя, так как избранное изменилось
@@ -550,8 +646,11 @@ async def toggle_favorite(favorite_data: CreateUserFavorite, user_id: int,
             anime_id=favorite_data.anime_id
         )
         session.add(new_favorite)
+        await change_user_stats(user_id, session, favorites_count=1)
+        await change_counter(ANIME_FAVORITES, session, 1, entity_id=favorite_data.anime_id)
         await session.commit()
         await session.refresh(new_favorite)
+        await change_favorites_count(user_id, 1)
         # Очищаем кэш топ пользователей, так как количество избранного изменилось
         await clear_most_favorited_cache()
         # Очищаем кэш профиля пользователя, так как избранное изменилось
@@ -563,35 +662,38 @@ async def toggle_favorite(favorite_data: CreateUserFavorite, user_id: int,
 async def check_favorite(anime_id: int, user_id: int, session: AsyncSession):
     '''Проверить, есть ли аниме в избранном у пользователя'''
     
-    favorite = (await session.execute(
-        select(FavoriteModel).filter_by(
-            user_id=user_id,
-            anime_id=anime_id
-        )
-    )).scalar_one_or_none()
+    favorite = (await session.execute(_favorite_query(user_id, anime_id))).scalar_one_or_none()
     
     return favorite is not None
 
 
+def _favorite_query(user_id: int, anime_id: int):
+    '''Запись избранного пользователя для аниме'''
+    return select(FavoriteModel).filter_by(user_id=user_id, anime_id=anime_id)
+
+
 async def check_rating(anime_id: int, user_id: int, session: AsyncSession):
     '''Получить оценку пользователя для аниме (возвращает оценку или None)'''
     
     # Получаем последнюю оценку (по ID, так как ID автоинкрементный)
-    rating = (await session.execute(
-        select(RatingModel)
-        .filter_by(
-            user_id=user_id,
-            anime_id=anime_id
-        )
-        .order_by(RatingModel.id.desc())  # Сортируем по ID в убывающем порядке
-        .limit(1)  # Берем только первую (последнюю) запись
-    )).scalar_one_or_none()
+    rating = (await session.execute(_user_rating_query(user_id, anime_id))).scalar_one_or_none()
     
     if rating:
         return int(rating.rating)  # Возвращаем оценку как целое число
     return None
 
 
+def _user_rating_query(user_id: int, anime_id: int):
+    '''Последняя оценка пользователя для аниме'''
+    # Последняя - с наибольшим ID, так как ID автоинкрементный
+    return (
+        select(RatingModel)
+        .filter_by(user_id=user_id, anime_id=anime_id)
+        .order_by(RatingModel.id.desc())
+        .limit(1)
+    )
+
+
 async def change_username(new_name: str, request:Request,
                            session: AsyncSession):
     user = await get_user_by_token(request, session)
@@ -602,6 +704,7 @@ async def change_username(new_name: str, request:Request,
         await session.commit()
         # Обновляем объект из БД для получения актуальных данных
         await session.refresh(user)
+        await clear_user_principal_cache(user.id)
         return 'Имя изменено'
     return 'Не удалось изменить имя'
 
@@ -809,9 +912,69 @@ async def add_new_user_photo(user_id: int, s3_url: str, session: AsyncSession):
     return 'Аватар успешно изменен'
 
 
+# Ключ текущего цикла конкурса в локальном кэше воркера
+CURRENT_CYCLE_CACHE_KEY = "collector_cycle:current"
+
+
+async def get_user_most_favorited_cached(limit=6, offset=0, session: AsyncSession = None) -> dict:
+    '''Получить топ коллекционеров с кэшированием в Redis (15 минут)
+
+    В кэше хранится только список пользователей, информация о цикле
+    всегда берется из БД.
+
+    Returns:
+        dict: {'users': [...], 'cycle_info': {...} | None}
+    '''
+    from src.services.redis_cache import cache_get, cache_set, MOST_FAVORITED_CACHE_TAG
+    from src.services.cache_metrics import observe_recompute, key_prefix
+    
+    cache_ttl = 900  # 15 минут
+    cache_key = f"most_favorited_users:limit:{limit}:offset:{offset}"
+    
+    found, users_list = await cache_get(cache_key)
+    if not found:
+        logger.debug(f"💨 Cache MISS: most favorited users (limit: {limit}, offset: {offset})")
+        started = time.perf_counter()
+        resp = await get_user_most_favorited(limit=limit, offset=offset, session=session)
+        observe_recompute(key_prefix(cache_key), time.perf_counter() - started)
+        
+        # Сохраняем в кэш только список пользователей (для обратной совместимости)
+        if await cache_set(cache_key, resp['users'], cache_ttl, tags=[MOST_FAVORITED_CACHE_TAG]):
+            logger.debug(f"💾 Cached most favorited users (TTL: {cache_ttl}s, limit: {limit}, offset: {offset})")
+        return resp
+    
+    # Данные из кэша - информация о цикле из локального кэша воркера или БД
+    logger.debug(f"🎯 Cache HIT: most favorited users (limit: {limit}, offset: {offset})")
+    return {'users': users_list, 'cycle_info': await get_current_cycle_info(session)}
+
+
+async def get_current_cycle_info(session: AsyncSession) -> dict | None:
+    '''Информация о текущем цикле конкурса коллекционеров
+
+    Активный цикл не меняется до cycle_end_date (новый создает
+    get_or_create_current_cycle после его окончания), поэтому воркер держит
+    его в локальном кэше до конца цикла: ответ топа из кэша не обращается к базе.
+    '''
+    found, cycle_info = local_cache.get(CURRENT_CYCLE_CACHE_KEY)
+    if found:
+        return cycle_info
+    current_cycle = await get_or_create_current_cycle(session)
+    if not current_cycle:
+        return None
+    cycle_info = {
+        'cycle_id': current_cycle.id,
+        'leader_user_id': current_cycle.leader_user_id,
+        'cycle_start_date': current_cycle.cycle_start_date.isoformat(),
+        'cycle_end_date': current_cycle.cycle_end_date.isoformat(),
+        'is_active': current_cycle.is_active
+    }
+    ttl = (current_cycle.cycle_end_date - datetime.now(timezone.utc)).total_seconds()
+    if ttl > 0:
+        local_cache.set(CURRENT_CYCLE_CACHE_KEY, cycle_info, ttl, len(str(cycle_info)))
+    return cycle_info
+
+
 async def get_user_most_favorited(limit=6, offset=0, session: AsyncSession = None):
-    from sqlalchemy.orm import selectinload
-    from src.models.best_user_anime import BestUserAnimeModel
     
     # Получаем или создаем текущий активный цикл
     current_cycle = await get_or_create_current_cycle(session)
@@ -822,18 +985,15 @@ async def get_user_most_favorited(limit=6, offset=0, session: AsyncSession = Non
     
     # Получаем топ пользователей (6 конкурентов)
     # Включаем лидера цикла и его ближайших конкурентов
-    stmt = (
-        select(UserModel)
-        .options(
-            selectinload(UserModel.best_anime).selectinload(BestUserAnimeModel.anime)
-        )
-        .outerjoin(FavoriteModel, FavoriteModel.user_id == UserModel.id)
-        .group_by(UserModel.id)
-        .order_by(desc(func.count(FavoriteModel.id)))
-        .limit(limit)
-        .offset(offset))
-    
-    resp = (await session.execute(stmt)).scalars().all()
+    # Позиции и количество избранного - из рейтинга коллекционеров (Redis sorted set)
+    top = await get_top_collectors(limit, offset, session)
+    favorites_amount = dict(top)
+    users = (await session.execute(
+        select(UserModel).options(*USER_BEST_ANIME).where(UserModel.id.in_(favorites_amount))
+    )).scalars().all() if top else []
+    users_by_id = {user.id: user for user in users}
+    # Пользователь мог быть удален после последнего обновления рейтинга
+    resp = [users_by_id[user_id] for user_id, _ in top if user_id in users_by_id]
 
     six_users = []
     
@@ -880,7 +1040,7 @@ async def get_user_most_favorited(limit=6, offset=0, session: AsyncSession = Non
         _user = {
             'id': user.id,
             'username': user.username,
-            'amount': len(user.favorites),
+            'amount': favorites_amount[user.id],
             'favorite': best_anime_list,
             'avatar_url': user.avatar_url,
             'background_image_url': user.background_image_url,
@@ -1082,26 +1242,17 @@ async def get_or_create_current_cycle(session: AsyncSession) -> CollectorCompeti
         await session.flush()
     
     # Определяем нового лидера (топ-1 на текущий момент)
-    top_user_stmt = (
-        select(UserModel)
-        .outerjoin(FavoriteModel, FavoriteModel.user_id == UserModel.id)
-        .group_by(UserModel.id)
-        .order_by(desc(func.count(FavoriteModel.id)))
-        .limit(1)
-    )
-    
-    top_user_result = await session.execute(top_user_stmt)
-    top_user = top_user_result.scalar_one_or_none()
-    
-    if not top_user:
+    top = await get_top_collectors(1, 0, session)
+    if not top:
         return None
+    top_user_id, _ = top[0]
     
     # Создаем новый цикл
     cycle_start = now
     cycle_end = cycle_start + timedelta(weeks=1)
     
     new_cycle = CollectorCompetitionCycleModel(
-        leader_user_id=top_user.id,
+        leader_user_id=top_user_id,
         cycle_start_date=cycle_start,
         cycle_end_date=cycle_end,
         is_active=True,
@@ -1143,6 +1294,7 @@ async def activate_premium(user_id: int, days: int, session: AsyncSession):
     
     await session.commit()
     await session.refresh(user)
+    await clear_user_principal_cache(user.id)
     
     logger.info(f"Премиум подписка активирована для пользователя {user.username} (ID: {user.id}) до {user.premium_expires_at}")
     return user
@@ -1169,6 +1321,7 @@ async def check_premium_status(user_id: int, session: AsyncSession) -> dict:
                 user.premium_expires_at = None
                 await session.commit()
                 await session.refresh(user)
+                await clear_user_principal_cache(user.id)
                 logger.info(f"Премиум подписка истекла для пользователя {user.username} (ID: {user.id})")
     
     # Проверяем также type_account (для admin и owner всегда премиум)
@@ -1197,6 +1350,7 @@ async def update_premium_status_if_expired(user_id: int, session: AsyncSession):
             user.premium_expires_at = None
             await session.commit()
             await session.refresh(user)
+            await clear_user_principal_cache(user.id)
             logger.info(f"Премиум подписка истекла для пользователя {user.username} (ID: {user.id}), type_account обновлен на 'base'")
     
     return user
\ No newline at end of file
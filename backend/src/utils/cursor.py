@@ -0,0 +1,90 @@
+"""
+Утилиты для курсорной (keyset) пагинации
+
+Курсор - непрозрачная для клиента строка с ключом сортировки последнего
+элемента страницы, например (score, id) или (created_at, id). Следующая
+страница выбирается условием "после этого ключа", поэтому ее стоимость
+не зависит от номера страницы (в отличие от OFFSET).
+"""
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Any, Callable
+from fastapi import HTTPException, status
+
+
+def encode_cursor(kind: str, *values: Any) -> str:
+    """
+    Упаковать ключ сортировки в курсор
+
+    Args:
+        kind: Вид списка и сортировки (например, "score:desc") - курсор
+              одного списка нельзя передать в другой
+        values: Значения ключа сортировки последнего элемента страницы
+
+    Returns:
+        str: Курсор (base64url без выравнивания)
+    """
+    payload = json.dumps([kind, *values], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+# Наибольшее значение BIGINT: id больше этого база не примет
+MAX_CURSOR_ID = 2 ** 63 - 1
+
+
+def cursor_id(value: Any) -> int:
+    """Поле курсора - id записи (целое в диапазоне BIGINT)"""
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_CURSOR_ID:
+        raise ValueError(f"id курсора: {value!r}")
+    return value
+
+
+def cursor_score(value: Any) -> float:
+    """Поле курсора - оценка (конечное число)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"оценка курсора: {value!r}")
+    return float(value)
+
+
+def cursor_optional_score(value: Any) -> float | None:
+    """Поле курсора - оценка или None (аниме без оценки)"""
+    return None if value is None else cursor_score(value)
+
+
+def cursor_timestamp(value: Any) -> datetime:
+    """Поле курсора - дата и время в ISO формате"""
+    if not isinstance(value, str):
+        raise ValueError(f"дата курсора: {value!r}")
+    return datetime.fromisoformat(value)
+
+
+def decode_cursor(cursor: str, kind: str, *fields: Callable[[Any], Any]) -> list:
+    """
+    Распаковать курсор
+
+    Args:
+        cursor: Курсор из запроса
+        kind: Ожидаемый вид списка и сортировки
+        fields: Проверка каждого значения ключа (cursor_id, cursor_score, ...):
+                возвращает значение нужного типа или бросает ValueError
+
+    Returns:
+        list: Значения ключа сортировки
+
+    Raises:
+        HTTPException: 400, если курсор поврежден, относится к другому списку
+                       или значения ключа не того типа
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        decoded_kind, *values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if decoded_kind != kind or len(values) != len(fields):
+            raise ValueError(f"вид курсора: {decoded_kind!r}")
+        return [field(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Некорректный курсор пагинации'
+        )
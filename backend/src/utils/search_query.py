@@ -0,0 +1,49 @@
+"""
+Утилиты для нормализации поисковых запросов
+"""
+import re
+import unicodedata
+
+
+# Латинские буквы, совпадающие по написанию с кириллическими, и наоборот
+_LATIN_TO_CYRILLIC = str.maketrans("aceopxykmhtb", "асеорхукмнтв")
+_CYRILLIC_TO_LATIN = str.maketrans("асеорхукмнтв", "aceopxykmhtb")
+
+_CYRILLIC_RE = re.compile(r"[а-я]")
+_LATIN_RE = re.compile(r"[a-z]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _fold_word(word: str) -> str:
+    """
+    Привести смешанное написание слова к одному алфавиту
+
+    Слово, набранное вперемешку кириллицей и латиницей ("наруто" с латинской "а"),
+    приводится к алфавиту, букв которого в слове больше.
+    """
+    cyrillic = len(_CYRILLIC_RE.findall(word))
+    latin = len(_LATIN_RE.findall(word))
+    if not cyrillic or not latin:
+        return word
+    if cyrillic >= latin:
+        return word.translate(_LATIN_TO_CYRILLIC)
+    return word.translate(_CYRILLIC_TO_LATIN)
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    Нормализовать поисковый запрос
+
+    Приводит к нижнему регистру, заменяет "ё" на "е", схлопывает пробелы
+    и выравнивает смешанное кириллическое/латинское написание слов.
+    Запросы, отличающиеся только этим, дают одинаковый результат.
+
+    Args:
+        query: Исходный запрос
+
+    Returns:
+        str: Нормализованный запрос
+    """
+    query = unicodedata.normalize("NFKC", query).lower().replace("ё", "е")
+    words = _WHITESPACE_RE.split(query.strip())
+    return " ".join(_fold_word(word) for word in words if word)